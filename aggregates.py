@@ -0,0 +1,177 @@
+from sqlalchemy import func
+from models import db, Expense, ExpenseRollup, expense_list_columns
+import search
+
+
+# ================= FILTERS =================
+def expense_filters(user_id, *criteria, **filters):
+    """Build the WHERE clause shared by every aggregate query.
+
+    ``filters`` behave like ``filter_by`` (``event_id=None`` means IS NULL)
+    plus ``since``/``before`` date bounds; ``criteria`` are extra SQLAlchemy
+    expressions such as a search clause.
+    """
+    clauses = [Expense.user_id == user_id]
+
+    clauses.extend(_column_filters(Expense, filters))
+
+    clauses.extend(criteria)
+    return clauses
+
+
+def _column_filters(model, filters):
+    for name, value in filters.items():
+        if name == "since":
+            yield model.date >= value
+        elif name == "before":
+            yield model.date < value
+        else:
+            yield getattr(model, name) == value
+
+
+def rollup_filters(user_id, **filters):
+    clauses = [ExpenseRollup.user_id == user_id]
+
+    clauses.extend(_column_filters(ExpenseRollup, filters))
+
+    return clauses
+
+
+def search_filter(user_id, search_query):
+    """Full-text criterion (see search.py) usable as an aggregate ``criteria``."""
+    return search.expense_filter(user_id, search_query)
+
+
+# Queries without extra ``criteria`` are answered from the pre-summed
+# ``expense_rollup`` table; anything else (e.g. a text search) falls back
+# to grouping the raw expense rows.
+
+# ================= TOTALS =================
+def totals_by_type(user_id, *criteria, **filters):
+    """Return ``[(transaction_type, total, count), ...]``."""
+    if not criteria:
+        return db.session.query(
+            ExpenseRollup.transaction_type,
+            func.coalesce(func.sum(ExpenseRollup.total), 0),
+            func.coalesce(func.sum(ExpenseRollup.count), 0)
+        ).filter(
+            *rollup_filters(user_id, **filters)
+        ).group_by(ExpenseRollup.transaction_type).all()
+
+    return db.session.query(
+        Expense.transaction_type,
+        func.coalesce(func.sum(Expense.amount), 0),
+        func.count(Expense.id)
+    ).filter(
+        *expense_filters(user_id, *criteria, **filters)
+    ).group_by(Expense.transaction_type).all()
+
+
+def type_summary(user_id, *criteria, **filters):
+    """Return ``(total_expense, total_income, transaction_count)``."""
+    total_expense = total_income = 0
+    count = 0
+
+    for transaction_type, total, rows in totals_by_type(user_id, *criteria, **filters):
+        if transaction_type == "expense":
+            total_expense = total
+        elif transaction_type == "income":
+            total_income = total
+        count += rows
+
+    return total_expense, total_income, count
+
+
+# ================= GROUPS =================
+def category_totals(user_id, *criteria, **filters):
+    """Return ``[(category, total), ...]`` for expense transactions."""
+    if not criteria:
+        return db.session.query(
+            ExpenseRollup.category,
+            func.sum(ExpenseRollup.total)
+        ).filter(
+            *rollup_filters(user_id, **filters),
+            ExpenseRollup.transaction_type == "expense"
+        ).group_by(ExpenseRollup.category).order_by(ExpenseRollup.category).all()
+
+    return db.session.query(
+        Expense.category,
+        func.sum(Expense.amount)
+    ).filter(
+        *expense_filters(user_id, *criteria, **filters),
+        Expense.transaction_type == "expense"
+    ).group_by(Expense.category).order_by(Expense.category).all()
+
+
+def daily_totals(user_id, *criteria, **filters):
+    """Return ``[(date, total), ...]`` for expense transactions, oldest first."""
+    if not criteria:
+        return db.session.query(
+            ExpenseRollup.date,
+            func.sum(ExpenseRollup.total)
+        ).filter(
+            *rollup_filters(user_id, **filters),
+            ExpenseRollup.transaction_type == "expense",
+            ExpenseRollup.date.isnot(None)
+        ).group_by(ExpenseRollup.date).order_by(ExpenseRollup.date).all()
+
+    return db.session.query(
+        Expense.date,
+        func.sum(Expense.amount)
+    ).filter(
+        *expense_filters(user_id, *criteria, **filters),
+        Expense.transaction_type == "expense",
+        Expense.date.isnot(None)
+    ).group_by(Expense.date).order_by(Expense.date).all()
+
+
+def monthly_totals(user_id, *criteria, **filters):
+    """Return ``[("YYYY-MM", total), ...]`` for expense transactions, oldest first."""
+    if not criteria:
+        month = func.strftime("%Y-%m", ExpenseRollup.date)
+        return db.session.query(
+            month,
+            func.sum(ExpenseRollup.total)
+        ).filter(
+            *rollup_filters(user_id, **filters),
+            ExpenseRollup.transaction_type == "expense",
+            ExpenseRollup.date.isnot(None)
+        ).group_by(month).order_by(month).all()
+
+    month = func.strftime("%Y-%m", Expense.date)
+    return db.session.query(
+        month,
+        func.sum(Expense.amount)
+    ).filter(
+        *expense_filters(user_id, *criteria, **filters),
+        Expense.transaction_type == "expense",
+        Expense.date.isnot(None)
+    ).group_by(month).order_by(month).all()
+
+
+def categories(user_id):
+    return [
+        category for (category,) in db.session.query(ExpenseRollup.category)
+        .filter(ExpenseRollup.user_id == user_id)
+        .distinct().order_by(ExpenseRollup.category)
+    ]
+
+
+# ================= ALERTS =================
+def has_expense_above(amount, user_id, *criteria, **filters):
+    return db.session.query(
+        db.session.query(Expense.id).filter(
+            *expense_filters(user_id, *criteria, **filters),
+            Expense.transaction_type == "expense",
+            Expense.amount > amount
+        ).exists()
+    ).scalar()
+
+
+def recent_expenses(limit, user_id, *criteria, **filters):
+    """Return the latest ``limit`` rows, oldest first (insertion order)."""
+    rows = Expense.query.options(expense_list_columns()).filter(
+        *expense_filters(user_id, *criteria, **filters)
+    ).order_by(Expense.id.desc()).limit(limit).all()
+    rows.reverse()
+    return rows
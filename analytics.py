@@ -0,0 +1,355 @@
+from sqlalchemy import func, select, literal, null, cast, union_all, Date
+from models import db, Expense, ExpenseRollup, BudgetMonth
+from aggregates import expense_filters, rollup_filters, monthly_totals
+from dates import add_months
+
+# One round trip per view, folded into a Summary.
+# dashboard, event_analytics and set_budget all read their totals, charts
+# and highlights from here, and share the scoring rules below.
+
+
+class Summary:
+    """Totals for one filtered set of transactions.
+
+    ``category_totals`` (by category) and ``daily_totals`` (oldest first)
+    cover expense transactions only, matching the old per-view loops.
+    """
+
+    def __init__(self):
+        self.total_expense = 0
+        self.total_income = 0
+        self.transactions = 0
+        self.category_totals = {}
+        self.daily_totals = {}
+
+    # ===== HIGHLIGHTS =====
+    @property
+    def highest_category(self):
+        totals = self.category_totals
+        return max(totals, key=totals.get) if totals else None
+
+    @property
+    def highest_category_amount(self):
+        return self.category_totals.get(self.highest_category, 0)
+
+    @property
+    def highest_day(self):
+        totals = self.daily_totals
+        return max(totals, key=totals.get) if totals else None
+
+    @property
+    def highest_day_amount(self):
+        return self.daily_totals.get(self.highest_day, 0)
+
+    @property
+    def average_expense(self):
+        return self.total_expense / self.transactions if self.transactions else 0
+
+    @property
+    def average_daily_expense(self):
+        totals = self.daily_totals
+        return round(sum(totals.values()) / len(totals), 2) if totals else 0
+
+    @property
+    def spending_spike(self):
+        """Latest day above 1.5x the average of the days before it."""
+        values = list(self.daily_totals.values())
+        if len(values) < 2:
+            return False
+        return values[-1] > (sum(values[:-1]) / max(len(values[:-1]), 1)) * 1.5
+
+    def budget_percentage(self, limit):
+        return (self.total_expense / limit) * 100 if limit > 0 else 0
+
+
+# ================= LOADING =================
+def _scope(user_id, *criteria, **filters):
+    """The filtered rows as ``(transaction_type, category, date, total, count)``."""
+    if not criteria:
+        return select(
+            ExpenseRollup.transaction_type,
+            ExpenseRollup.category,
+            ExpenseRollup.date,
+            ExpenseRollup.total,
+            ExpenseRollup.count
+        ).where(*rollup_filters(user_id, **filters))
+
+    return select(
+        Expense.transaction_type,
+        Expense.category,
+        Expense.date,
+        Expense.amount.label("total"),
+        literal(1).label("count")
+    ).where(*expense_filters(user_id, *criteria, **filters))
+
+
+def summarize(user_id, *criteria, **filters):
+    """Build a Summary in one round trip (rollups unless ``criteria`` are given).
+
+    The scope is a CTE that SQLite materialises once; the three small
+    GROUP BYs over it come back together as one UNION ALL result.
+    """
+    scope = _scope(user_id, *criteria, **filters).cte("scope")
+    expense = scope.c.transaction_type == "expense"
+    no_day = cast(null(), Date)
+
+    by_type = select(
+        literal("type"), scope.c.transaction_type, no_day,
+        func.sum(scope.c.total), func.sum(scope.c.count)
+    ).group_by(scope.c.transaction_type)
+
+    by_category = select(
+        literal("category"), scope.c.category, no_day,
+        func.sum(scope.c.total), literal(0)
+    ).where(expense).group_by(scope.c.category)
+
+    by_day = select(
+        literal("day"), null(), scope.c.date,
+        func.sum(scope.c.total), literal(0)
+    ).where(expense, scope.c.date.isnot(None)).group_by(scope.c.date)
+
+    summary = Summary()
+    for kind, label, day, total, count in db.session.execute(union_all(by_type, by_category, by_day)):
+        total = total or 0
+        if kind == "type":
+            summary.transactions += count or 0
+            if label == "expense":
+                summary.total_expense = total
+            elif label == "income":
+                summary.total_income = total
+        elif kind == "category":
+            summary.category_totals[label] = total
+        else:
+            summary.daily_totals[day] = total
+
+    summary.category_totals = dict(sorted(
+        summary.category_totals.items(), key=lambda item: (item[0] is not None, item[0] or "")
+    ))
+    summary.daily_totals = dict(sorted(summary.daily_totals.items()))
+    return summary
+
+
+# ================= SCORING =================
+class Assessment:
+    """Insight text, health score and recommendations for a Summary."""
+
+    def __init__(self):
+        self.insight = ""
+        self.health_score = 100
+        self.health_label = "Excellent"
+        self.performance_score = 100
+        self.recommendations = []
+
+
+def _label(score):
+    if score < 40:
+        return "Risky"
+    if score < 70:
+        return "Moderate"
+    if score < 90:
+        return "Good"
+    return "Excellent"
+
+
+def assess_personal(summary, monthly_limit, large_expense=False, spending_spike=None):
+    """The dashboard's rules for the user's personal budget.
+
+    ``spending_spike`` overrides the Summary's simple last-day test.
+    """
+    result = Assessment()
+    percentage = summary.budget_percentage(monthly_limit)
+    spent, income = summary.total_expense, summary.total_income
+
+    # ===== INSIGHT =====
+    result.insight = "Your finances are stable."
+    if monthly_limit > 0:
+        if percentage > 100:
+            result.insight = "⚠️ You exceeded your monthly budget."
+        elif percentage > 80:
+            result.insight = "⚠️ You are close to your budget limit."
+        elif percentage < 50:
+            result.insight = "✅ Spending is well under control."
+
+        if income > spent:
+            result.insight += " You are saving money."
+    elif spent > income:
+        result.insight = "Expenses are higher than income."
+
+    # ===== HEALTH SCORE =====
+    score = 100
+    if percentage > 100:
+        score -= 30
+    elif percentage > 80:
+        score -= 15
+
+    if income > 0:
+        ratio = spent / income
+        if ratio > 1:
+            score -= 25
+        elif ratio > 0.8:
+            score -= 10
+
+    if summary.spending_spike if spending_spike is None else spending_spike:
+        score -= 10
+
+    result.health_score = max(0, round(score, 2))
+    result.health_label = _label(result.health_score)
+
+    # ===== RECOMMENDATIONS =====
+    tips = result.recommendations
+    if percentage > 100:
+        tips.append("You exceeded your monthly budget. Reduce non-essential spending.")
+    elif percentage > 80:
+        tips.append("You are close to your budget limit. Be cautious with new expenses.")
+
+    if summary.highest_category and summary.highest_category_amount > spent * 0.4:
+        tips.append(f"Your highest spending is on {summary.highest_category}. Consider reducing it.")
+
+    if income > 0 and spent > income:
+        tips.append("Your expenses exceed your income. This is financially risky.")
+
+    if large_expense:
+        tips.append("Some recent transactions are unusually large for their category. Review them.")
+
+    if not tips:
+        tips.append("Your finances look healthy. Keep it up.")
+
+    return result
+
+
+def assess_event(summary, budget):
+    """The event analytics rules; ``budget`` is the event's limit."""
+    result = Assessment()
+    percentage = round(summary.budget_percentage(budget), 2)
+    spent = summary.total_expense
+    overspent = spent > budget if budget > 0 else False
+    highest, highest_amount = summary.highest_category, summary.highest_category_amount
+
+    # ===== SUMMARY =====
+    result.insight = "This event is within budget."
+    if overspent:
+        result.insight = "This event exceeded its budget."
+    elif percentage > 80:
+        result.insight = "This event is close to its budget limit."
+
+    if highest:
+        result.insight += f" Most spending was on {highest}."
+
+    # ===== PERFORMANCE SCORE =====
+    performance = 100
+    if percentage > 100:
+        performance -= 40
+    elif percentage > 90:
+        performance -= 25
+    elif percentage > 75:
+        performance -= 15
+
+    if highest_amount > spent * 0.5:
+        performance -= 10
+
+    if summary.transactions < 3:
+        performance -= 5
+
+    result.performance_score = max(0, performance)
+
+    # ===== HEALTH SCORE =====
+    score = 100
+    if budget > 0:
+        if percentage > 100:
+            score -= 30
+        elif percentage > 80:
+            score -= 15
+
+    if summary.average_expense > 5000:
+        score -= 10
+
+    result.health_score = max(0, round(score, 2))
+    result.health_label = _label(result.health_score)
+
+    # ===== RECOMMENDATIONS =====
+    tips = result.recommendations
+    if overspent:
+        tips.append("Event exceeded budget. Reduce future spending.")
+    elif percentage > 80:
+        tips.append("Event is close to budget limit.")
+
+    if highest and highest_amount > spent * 0.4:
+        tips.append(f"Most spending is on {highest}.")
+
+    if not tips:
+        tips.append("Event spending is well managed.")
+
+    return result
+
+
+# ================= BUDGET HISTORY =================
+def limits_by_month(budget, months):
+    """The limit in force for each month, from the budget's BudgetMonth rows.
+
+    A month uses the latest row on or before it; months before the first
+    row use the earliest one, and a budget without rows its current limit.
+    """
+    if budget is None:
+        return [0] * len(months)
+
+    recorded = db.session.query(BudgetMonth.month, BudgetMonth.monthly_limit).filter(
+        BudgetMonth.budget_id == budget.id,
+        BudgetMonth.month <= months[-1]
+    ).order_by(BudgetMonth.month).all()
+
+    if not recorded:
+        return [budget.monthly_limit] * len(months)
+
+    limits = []
+    position = 0
+    current = recorded[0][1]
+    for month in months:
+        while position < len(recorded) and recorded[position][0] <= month:
+            current = recorded[position][1]
+            position += 1
+        limits.append(current)
+    return limits
+
+
+def month_status(spent, limit):
+    if limit > 0 and spent > limit:
+        return "Exceeded"
+    if limit > 0 and spent >= limit * 0.8:
+        return "Near Limit"
+    return "Healthy"
+
+
+def budget_history(user_id, budget, months, **filters):
+    """Spent vs limit per month (``months`` are month firsts, oldest first).
+
+    One grouped query over the rollups covers the whole range.
+    """
+    if not months:
+        return []
+
+    spent = dict(monthly_totals(
+        user_id,
+        since=months[0],
+        before=add_months(months[-1], 1),
+        **filters
+    ))
+
+    return [
+        {
+            "start": month,
+            "month": month.strftime("%B %Y"),
+            "budget": limit,
+            "spent": spent.get(month.strftime("%Y-%m"), 0),
+            "status": month_status(spent.get(month.strftime("%Y-%m"), 0), limit),
+        }
+        for month, limit in zip(months, limits_by_month(budget, months))
+    ]
+
+
+def budget_insight(usage_percent):
+    """set_budget's headline and whether to show the alert banner."""
+    if usage_percent > 90:
+        return "⚠️ You are about to exceed your budget", True
+    if usage_percent > 75:
+        return "⚠️ You are close to your budget limit", True
+    return "Budget healthy", False
@@ -0,0 +1,226 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, insert, delete, update as sql_update, func, or_
+
+from models import db, Expense, Anomaly, CategoryStats, AnomalyScan
+from aggregates import expense_filters
+import cache
+
+# Per-user, per-category outlier detection with the robust z-score
+#
+#     z = 0.6745 * (x - median) / MAD,   x = log(1 + amount)
+#
+# (Iglewicz & Hoaglin). Spending is roughly log-normal, so on the raw
+# scale every category's long right tail would be "unusual"; on the log
+# scale a flag means the amount is several typical spreads above normal.
+#
+# Median and MAD live in ``category_stats`` and are only recomputed when a
+# category has grown by REFIT_GROWTH since its last fit; in between, new
+# expenses are scored against the stored values. ``anomaly_scan`` keeps
+# the highest expense id already scored, so each update reads only the
+# rows added since the previous one (plus any category being refitted).
+
+THRESHOLD = 3.5
+MIN_SAMPLES = 10
+REFIT_GROWTH = 0.1
+MIN_MAD = 0.05  # ~5%: a category of identical amounts still flags a jump
+MAD_SCALE = 0.6745
+
+
+# ================= STATISTICS =================
+def robust_stats(values):
+    """``(median, mad)`` of log-scale ``values``."""
+    median = float(np.median(values))
+    mad = float(np.median(np.abs(values - median)))
+    return median, max(mad, MIN_MAD)
+
+
+def scores(values, median, mad):
+    return MAD_SCALE * (values - median) / mad
+
+
+def _log(amounts):
+    return np.log1p(np.maximum(amounts, 0))
+
+
+def _in_categories(column, categories):
+    named = [c for c in categories if c is not None]
+    clause = column.in_(named)
+    return or_(clause, column.is_(None)) if None in categories else clause
+
+
+def _groups(codes):
+    """Row indexes per category code, from one stable sort."""
+    order = np.argsort(codes, kind="stable")
+    bounds = np.cumsum(np.bincount(codes))[:-1]
+    return np.split(order, bounds)
+
+
+# ================= UPDATING =================
+def _new_counts(user_id, watermark):
+    return dict(db.session.query(Expense.category, func.count(Expense.id)).filter(
+        Expense.id > watermark,
+        *expense_filters(user_id, transaction_type="expense")
+    ).group_by(Expense.category).all())
+
+
+def _load(user_id, watermark, refit):
+    """``(ids, codes, categories, amounts)`` for new rows and ``refit`` categories."""
+    scope = Expense.id > watermark
+    if refit:
+        scope = or_(scope, _in_categories(Expense.category, refit))
+
+    result = db.session.connection().execute(
+        select(Expense.id, Expense.category, Expense.amount).where(
+            scope, *expense_filters(user_id, transaction_type="expense")
+        )
+    )
+    # Plain DBAPI tuples, as in columnar.load; from_records builds the
+    # columns in C, which beats transposing a million tuples in Python.
+    frame = pd.DataFrame.from_records(result.cursor.fetchall(), columns=["id", "category", "amount"])
+    result.close()
+
+    codes, labels = pd.factorize(frame["category"], use_na_sentinel=False)
+    categories = [None if pd.isna(label) else label for label in labels]
+
+    return (
+        frame["id"].to_numpy(np.int64),
+        codes,
+        categories,
+        frame["amount"].to_numpy(np.float64),
+    )
+
+
+def update(user_id):
+    """Score expenses added since the last run. Returns the number flagged."""
+    scan = AnomalyScan.query.filter_by(user_id=user_id).first()
+    if scan is None:
+        scan = AnomalyScan(user_id=user_id, last_expense_id=0)
+        db.session.add(scan)
+    watermark = scan.last_expense_id or 0
+
+    added = _new_counts(user_id, watermark)
+    if not added:
+        db.session.commit()
+        return 0
+
+    stats = {
+        s.category: s for s in CategoryStats.query.filter(
+            CategoryStats.user_id == user_id,
+            _in_categories(CategoryStats.category, list(added))
+        )
+    }
+    for category in added:
+        if category not in stats:
+            stats[category] = CategoryStats(user_id=user_id, category=category, count=0, fitted_count=0)
+            db.session.add(stats[category])
+
+    # ===== STATS: refit only the categories that grew enough =====
+    refit = [
+        category for category, count in added.items()
+        if stats[category].count + count > stats[category].fitted_count * (1 + REFIT_GROWTH)
+    ]
+
+    ids, codes, categories, amounts = _load(user_id, watermark, refit)
+    values = _log(amounts)
+    is_new = ids > watermark
+    now = datetime.now()
+    flagged = []
+
+    for code, rows in enumerate(_groups(codes)):
+        entry = stats[categories[code]]
+
+        if entry.category in refit:
+            entry.median, entry.mad = robust_stats(values[rows])
+            entry.count = entry.fitted_count = len(rows)
+            entry.updated_at = now
+        else:
+            entry.count += added[entry.category]
+
+        # ===== SCORE the new rows against the category's stats =====
+        rows = rows[is_new[rows]]
+        if entry.fitted_count < MIN_SAMPLES or not len(rows):
+            continue
+
+        z = scores(values[rows], entry.median, entry.mad)
+        typical = float(np.expm1(entry.median))
+        for index, score in zip(rows[z > THRESHOLD], z[z > THRESHOLD]):
+            flagged.append({
+                "user_id": user_id,
+                "expense_id": int(ids[index]),
+                "category": entry.category,
+                "amount": float(amounts[index]),
+                "score": float(score),
+                "median": typical,
+                "created_at": now,
+            })
+
+    # An edit may already have flagged a row this run is scoring.
+    db.session.execute(delete(Anomaly).where(
+        Anomaly.user_id == user_id, Anomaly.expense_id > watermark
+    ))
+    if flagged:
+        db.session.execute(insert(Anomaly), flagged)
+
+    scan.last_expense_id = int(ids[is_new].max())
+    cache.bump_insights(user_id)
+    db.session.commit()
+    return len(flagged)
+
+
+def rescore(expense):
+    """Re-check one edited expense against the stored stats (caller commits)."""
+    db.session.execute(delete(Anomaly).where(Anomaly.expense_id == expense.id))
+
+    if expense.transaction_type != "expense":
+        return
+
+    entry = CategoryStats.query.filter_by(user_id=expense.user_id, category=expense.category).first()
+    if entry is None or entry.fitted_count < MIN_SAMPLES:
+        return
+
+    amount = float(expense.amount or 0)
+    score = float(scores(_log(amount), entry.median, entry.mad))
+    if score > THRESHOLD:
+        db.session.add(Anomaly(
+            user_id=expense.user_id,
+            expense_id=expense.id,
+            category=expense.category,
+            amount=amount,
+            score=score,
+            median=float(np.expm1(entry.median)),
+            created_at=datetime.now()
+        ))
+
+
+def rewind():
+    """Keep watermarks below ids SQLite may hand out again (caller commits).
+
+    Deleting the newest expense frees its id for the next insert, from any
+    user; a watermark above the highest remaining id would skip that row.
+    """
+    highest = db.session.query(func.max(Expense.id)).scalar() or 0
+    db.session.execute(
+        sql_update(AnomalyScan)
+        .where(AnomalyScan.last_expense_id > highest)
+        .values(last_expense_id=highest)
+    )
+
+
+def schedule(user_id):
+    """Queue an update unless one is already pending."""
+    import jobs
+    return jobs.enqueue_unique("detect_anomalies", user_id)
+
+
+# ================= READING =================
+def recent(user_id, limit, *criteria, **filters):
+    """Latest flagged ``(anomaly, expense)`` pairs within the usual filters."""
+    return db.session.query(Anomaly, Expense).join(
+        Expense, Expense.id == Anomaly.expense_id
+    ).filter(
+        Anomaly.user_id == user_id,
+        *expense_filters(user_id, *criteria, **filters)
+    ).order_by(Anomaly.expense_id.desc()).limit(limit).all()
@@ -0,0 +1,310 @@
+import gzip
+import math
+
+from flask import request, jsonify
+from sqlalchemy import insert
+
+from models import db, Expense, Event
+from dates import parse_date
+import category_model
+import dedup
+import rollups
+
+# Request parsing, field selection and response helpers for the /api/v1
+# JSON routes in app.py. Bad input raises ApiError, which app.py turns
+# into ``{"error": ..., "fields": {...}}`` with the error's status code.
+
+BATCH_LIMIT = 10_000
+MAX_REPORTED_ERRORS = 100
+GZIP_MIN_BYTES = 1024
+
+TRANSACTION_TYPES = ("expense", "income")
+BUDGET_TYPES = ("personal", "event")
+
+# Fields each resource returns, in order; ?fields= picks a subset.
+EXPENSE_FIELDS = (
+    "id", "event_id", "amount", "category", "description", "date",
+    "transaction_type", "account", "notes", "tags", "receipt",
+)
+EVENT_FIELDS = ("id", "name", "description", "date", "budget_limit", "created_at")
+BUDGET_FIELDS = ("id", "budget_type", "event_id", "monthly_limit")
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, fields=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.fields = fields
+
+    def response(self):
+        body = {"error": self.message}
+        if self.fields:
+            body["fields"] = self.fields
+        return jsonify(body), self.status
+
+
+# ================= INPUT =================
+def _number(value):
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("must be a number")
+    if not math.isfinite(number):
+        raise ValueError("must be a finite number")
+    return number
+
+
+def _text(limit):
+    def convert(value):
+        if value is None:
+            return None
+        if not isinstance(value, str):
+            raise ValueError("must be a string")
+        if limit and len(value) > limit:
+            raise ValueError(f"must be at most {limit} characters")
+        return value.strip()
+    return convert
+
+
+def _required_text(limit):
+    convert = _text(limit)
+
+    def required(value):
+        value = convert(value)
+        if not value:
+            raise ValueError("must not be empty")
+        return value
+    return required
+
+
+def _date(value):
+    parsed = parse_date(value) if isinstance(value, str) else None
+    if parsed is None:
+        raise ValueError("must be a date (YYYY-MM-DD)")
+    return parsed
+
+
+def _optional_date(value):
+    return None if value in (None, "") else _date(value)
+
+
+def _optional_id(value):
+    if value in (None, ""):
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError("must be an integer id or null")
+    return value
+
+
+def _choice(*options):
+    def convert(value):
+        if value not in options:
+            raise ValueError(f"must be one of {', '.join(options)}")
+        return value
+    return convert
+
+
+# resource -> ({field: converter}, required fields for a create)
+INPUTS = {
+    "expense": ({
+        "event_id": _optional_id,
+        "amount": _number,
+        "category": _text(100),
+        "description": _text(200),
+        "date": _date,
+        "transaction_type": _choice(*TRANSACTION_TYPES),
+        "account": _text(50),
+        "notes": _text(None),
+        "tags": _text(200),
+    }, ("amount", "date")),
+    "event": ({
+        "name": _required_text(150),
+        "description": _text(300),
+        "date": _optional_date,
+        "budget_limit": _number,
+    }, ("name",)),
+    "budget": ({
+        "monthly_limit": _number,
+        "budget_type": _choice(*BUDGET_TYPES),
+        "event_id": _optional_id,
+        "month": _date,
+    }, ("monthly_limit",)),
+}
+
+
+def json_body():
+    data = request.get_json(silent=True)
+    if data is None:
+        raise ApiError(400, "Expected a JSON request body")
+    return data
+
+
+def parse(resource, data, partial=False):
+    """Validate one JSON object into column values; ApiError(422) on failure."""
+    values, errors = _convert(resource, data, partial)
+    if errors:
+        raise ApiError(422, f"Invalid {resource}", errors)
+    return values
+
+
+def _convert(resource, data, partial):
+    converters, required = INPUTS[resource]
+    if not isinstance(data, dict):
+        return None, {"_": "must be a JSON object"}
+
+    values, errors = {}, {}
+    for name, value in data.items():
+        if name not in converters:
+            errors[name] = "unknown field"
+            continue
+        try:
+            values[name] = converters[name](value)
+        except (TypeError, ValueError) as err:
+            errors[name] = str(err)
+
+    if not partial:
+        for name in required:
+            if name not in data:
+                errors.setdefault(name, "is required")
+
+    return values, errors
+
+
+def check_events(user_id, event_ids):
+    """ApiError(422) unless every id in ``event_ids`` is one of the user's events."""
+    event_ids = {event_id for event_id in event_ids if event_id is not None}
+    if not event_ids:
+        return
+
+    owned = {
+        event_id for (event_id,) in db.session.query(Event.id).filter(
+            Event.id.in_(event_ids), Event.created_by == user_id
+        )
+    }
+    missing = sorted(event_ids - owned)
+    if missing:
+        raise ApiError(422, "Unknown event_id", {"event_id": f"no such event: {missing}"})
+
+
+# ================= OUTPUT =================
+def requested_fields(allowed):
+    """``?fields=a,b`` as a tuple (``id`` always included); all fields by default."""
+    value = request.args.get("fields")
+    if not value:
+        return allowed
+
+    fields = [name.strip() for name in value.split(",") if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        raise ApiError(400, "Unknown fields", {"fields": ", ".join(unknown)})
+
+    return tuple(name for name in allowed if name == "id" or name in fields)
+
+
+def serialize(obj, fields):
+    item = {}
+    for name in fields:
+        value = getattr(obj, name)
+        item[name] = value.isoformat() if hasattr(value, "isoformat") else value
+    return item
+
+
+def compress(response):
+    """gzip /api/ responses for clients that accept it (after_request)."""
+    if (
+        not request.path.startswith("/api/")
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or not request.accept_encodings["gzip"]
+    ):
+        return response
+
+    body = response.get_data()
+    if len(body) < GZIP_MIN_BYTES:
+        return response
+
+    response.set_data(gzip.compress(body, compresslevel=6))
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+# ================= BATCH =================
+def insert_expenses(user_id, items):
+    """Validate and insert a list of expenses in one go; returns their ids.
+
+    All or nothing: any invalid item fails the batch with per-index errors.
+    Rows go in as one multi-row INSERT ... RETURNING (split only where
+    SQLite's bound-parameter limit requires), with one rollup update for
+    the whole batch. The caller bumps the cache and commits.
+    """
+    if not isinstance(items, list) or not items:
+        raise ApiError(400, "Expected a non-empty JSON array of expenses")
+    if len(items) > BATCH_LIMIT:
+        raise ApiError(413, f"At most {BATCH_LIMIT:,} expenses per batch")
+
+    records, errors = [], {}
+    for index, item in enumerate(items):
+        values, problems = _convert("expense", item, partial=False)
+        if problems:
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors[str(index)] = problems
+            continue
+        records.append(values)
+
+    if errors:
+        raise ApiError(422, f"{len(items) - len(records)} invalid expenses; nothing was inserted", errors)
+
+    check_events(user_id, (record.get("event_id") for record in records))
+
+    rows = expense_rows(user_id, records)
+    # Not sort_by_parameter_order: without a sentinel column SQLAlchemy
+    # falls back to an INSERT per row for that. SQLite hands out each new
+    # rowid as max + 1, in VALUES order, inside the one write transaction,
+    # so ascending ids are already in request order.
+    ids = sorted(db.session.execute(insert(Expense).returning(Expense.id), rows).scalars())
+
+    rollups.add_expenses(Expense(**row) for row in rows)
+    return ids
+
+
+def expense_rows(user_id, records):
+    """Complete parsed expenses into insertable rows (defaults, categories).
+
+    Defaults are filled in here rather than left to the column defaults so
+    the rollup key is right before the row is flushed. Uncategorised rows
+    are classified with one predict call, as in imports, and every row
+    gets its fingerprint from one lookup.
+    """
+    unknown = [record for record in records if not record.get("category")]
+    if unknown:
+        labels = category_model.classify_many(user_id, [record.get("description") or "" for record in unknown])
+        for record, label in zip(unknown, labels):
+            record["category"] = label
+
+    rows = [
+        {
+            "user_id": user_id,
+            "event_id": record.get("event_id"),
+            "amount": record["amount"],
+            "category": record["category"],
+            "description": record.get("description"),
+            "date": record["date"],
+            "transaction_type": record.get("transaction_type") or "expense",
+            "account": record.get("account") or "Cash",
+            "notes": record.get("notes"),
+            "tags": record.get("tags"),
+        }
+        for record in records
+    ]
+
+    fingerprints = dedup.new_fingerprints(
+        user_id, [(row["date"], row["amount"], row["description"], row["account"]) for row in rows]
+    )
+    for row, fingerprint in zip(rows, fingerprints):
+        row["fingerprint"] = fingerprint
+    return rows
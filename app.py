@@ -1,66 +1,98 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file
-from models import db, User, Expense, Budget, Event
-from flask_login import LoginManager, login_user, login_required, logout_user, current_user
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, send_file, send_from_directory, jsonify, abort, stream_with_context
+from models import db, User, Expense, Budget, BudgetMonth, Event, Job, CategoryRule, expense_list_columns
+import aggregates
+import analytics
+import forecasting
+import anomalies
+import rollups
+import dedup
+import migrations
+import jobs
+import pagination
+import exports
+import api
+import receipts
+import search
+import cache
+import querycount
+import metrics
+from dates import parse_date, range_filters, describe_range, iso_labels, month_bounds, month_start, month_range
+import category_model
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user, login_url
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-from collections import defaultdict
-import os, io
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+import os
 from forms import LoginForm
-from sqlalchemy import event
-from sqlalchemy.engine import Engine
-import sqlite3
-
-@event.listens_for(Engine, "connect")
-def enable_sqlite_foreign_key(dbapi_connection, connection_record):
-    if isinstance(dbapi_connection, sqlite3.Connection):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA foreign_keys=ON;")
-        cursor.close()
+import database
+from sqlalchemy.orm import load_only
+import click
+from flask.cli import AppGroup
 
 app = Flask(__name__)
+app.config.from_object("config")  # database URI and SQLite profile
 
 app.config["SECRET_KEY"] = "super-secret-key-change-this"
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///database.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config["UPLOAD_FOLDER"] = "static/uploads"
-
-db.init_app(app)
+app.config["UPLOAD_FOLDER"] = "static/uploads"  # receipts saved before the receipt store
+app.config["IMPORT_CHUNK_ROWS"] = 20_000
+app.config["EXPENSES_PAGE_SIZE"] = 50
+app.config["EXPENSES_MAX_PAGE_SIZE"] = 500
+app.config["JOB_WORKERS"] = int(os.environ.get("JOB_WORKERS", 2))
+# Per-user page cache; set RESPONSE_CACHE_DIR to share it between gunicorn workers.
+app.config["RESPONSE_CACHE_SIZE"] = 256
+app.config["RESPONSE_CACHE_TTL"] = 600
+app.config["RESPONSE_CACHE_DIR"] = os.environ.get("RESPONSE_CACHE_DIR")
+# SQL statements a request may run before it is reported (raises under TESTING).
+app.config["QUERY_BUDGET"] = 20
+# /metrics needs "Authorization: Bearer <token>" when METRICS_TOKEN is set.
+app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+# Log statements slower than this (with their query plan); unset disables it.
+app.config["SLOW_QUERY_MS"] = float(os.environ["SLOW_QUERY_MS"]) if os.environ.get("SLOW_QUERY_MS") else None
+app.config["SLOW_QUERY_LOG"] = os.environ.get("SLOW_QUERY_LOG")
+
+database.init_app(app)
 with app.app_context():
-    db.create_all()
+    migrations.upgrade()
+
+jobs.init_app(app)
+receipts.init_app(app)
+cache.init_app(app)
+querycount.init_app(app)
+metrics.init_app(app)
+app.after_request(api.compress)
 
 login_manager = LoginManager()
 login_manager.login_view = "login"
 login_manager.init_app(app)
 
 
+@login_manager.unauthorized_handler
+def unauthorized():
+    # API clients get a 401 rather than a redirect to the login page.
+    if request.path.startswith("/api/"):
+        return jsonify({"error": "Authentication required"}), 401
+
+    flash(login_manager.login_message, login_manager.login_message_category)
+    return redirect(login_url(login_manager.login_view, request.url))
+
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
 
-# ================= AUTO CATEGORY =================
-def detect_category(description):
-    if not description:
-        return "Other"
-
-    description = description.lower()
+def refresh_insights(user_id):
+    """Queue the background refreshes that follow a change to expenses."""
+    forecasting.schedule(user_id)
+    anomalies.schedule(user_id)
 
-    keywords = {
-        "Food": ["swiggy", "zomato", "restaurant", "cafe", "food"],
-        "Transport": ["uber", "ola", "bus", "train", "petrol"],
-        "Shopping": ["amazon", "flipkart", "mall"],
-        "Entertainment": ["netflix", "movie", "spotify"],
-        "Bills": ["electricity", "water", "rent"],
-        "Study": ["book", "course"]
-    }
 
-    for category, words in keywords.items():
-        if any(word in description for word in words):
-            return category
+# ================= METRICS =================
+@app.route("/metrics")
+def prometheus_metrics():
+    token = app.config["METRICS_TOKEN"]
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        abort(401)
 
-    return "Other"
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 
 # ================= HOME =================
@@ -111,34 +143,84 @@ def login():
 @app.route("/export_dashboard_pdf")
 @login_required
 def export_dashboard_pdf():
+    """Queue a full statement for ?month= or ?start=&end=, optionally one ?event_id=."""
+    filters = range_filters(request.args)
+    payload = {name: value.isoformat() for name, value in filters.items()}
+    payload["title"] = "Expense Statement"
+    payload["period"] = describe_range(filters)
+
+    event_id = request.args.get("event_id", type=int)
+    if event_id:
+        event = db.session.get(Event, event_id)
+        if event is None or event.created_by != current_user.id:
+            abort(404)
+        payload["event_id"] = event_id
+        payload["title"] = f"{event.name} Statement"
+
+    # Same range and data version -> the already generated file.
+    job = jobs.enqueue_cached("dashboard_pdf", current_user.id, version=current_user.data_version or 0, **payload)
+    return redirect(url_for("job_status", job_id=job.id))
+
+
+# ================= BACKGROUND JOBS =================
+def _own_job(job_id):
+    job = db.session.get(Job, job_id)
+    if job is None or job.user_id != current_user.id:
+        abort(404)
+    return job
+
+
+@app.route("/jobs/<int:job_id>")
+@login_required
+def job_json(job_id):
+    job = _own_job(job_id)
+    status = jobs.status_of(job)
+    status["download_url"] = url_for("download_job", job_id=job.id) if status["ready"] else None
+    return jsonify(status)
 
-    expenses = Expense.query.filter_by(user_id=current_user.id).all()
 
-    total_expense = sum(e.amount for e in expenses if e.transaction_type == "expense")
-    total_income = sum(e.amount for e in expenses if e.transaction_type == "income")
-    net_balance = total_income - total_expense
+@app.route("/jobs/<int:job_id>/status")
+@login_required
+def job_status(job_id):
+    job = _own_job(job_id)
+
+    titles = {
+        "import_csv": "Import CSV",
+        "dashboard_pdf": "Expense Statement",
+        "rebuild_rollups": "Recalculate Totals",
+        "receipt_images": "Receipt Thumbnails",
+    }
 
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
+    return render_template(
+        "job_status.html",
+        job=job,
+        result=jobs.result_of(job),
+        stale=jobs.is_stale(job),
+        title=titles.get(job.kind, "Background Job")
+    )
 
-    p.drawString(200, 750, "Smart Expense Tracker Report")
-    p.drawString(100, 700, f"Total Expense: ₹ {total_expense}")
-    p.drawString(100, 680, f"Total Income: ₹ {total_income}")
-    p.drawString(100, 660, f"Net Balance: ₹ {net_balance}")
 
-    y = 620
-    for exp in expenses[:10]:
-        y -= 20
-        p.drawString(100, y, f"{exp.date} — {exp.description} — ₹ {exp.amount}")
+@app.route("/jobs/<int:job_id>/download")
+@login_required
+def download_job(job_id):
+    job = _own_job(job_id)
 
-    p.save()
-    buffer.seek(0)
+    if job.status != "done" or not job.result_path:
+        flash("This file is not ready yet", "info")
+        return redirect(url_for("job_status", job_id=job.id))
 
-    return send_file(buffer, as_attachment=True,
-                     download_name="dashboard_report.pdf",
+    return send_file(job.result_path, as_attachment=True,
+                     download_name="expense_statement.pdf",
                      mimetype="application/pdf")
 
 
+@app.route("/rebuild_rollups", methods=["POST"])
+@login_required
+def rebuild_rollups():
+    job = jobs.enqueue("rebuild_rollups", current_user.id)
+    return redirect(url_for("job_status", job_id=job.id))
+
+
 # ================= CREATE EVENT =================
 @app.route("/create_event", methods=["GET", "POST"])
 @login_required
@@ -148,12 +230,13 @@ def create_event():
         event = Event(
             name=request.form.get("name"),
             description=request.form.get("description"),
-            date=request.form.get("date"),
+            date=parse_date(request.form.get("date")),
             budget_limit=float(request.form.get("budget_limit") or 0),
             created_by=current_user.id
         )
 
         db.session.add(event)
+        cache.bump(current_user.id)
         db.session.commit()
 
         flash("Event created successfully")
@@ -169,8 +252,12 @@ def delete_event(event_id):
     event = Event.query.get(event_id)
 
     if event and event.created_by == current_user.id:
+        rollups.remove_event(event.id)
         db.session.delete(event)
+        anomalies.rewind()
+        cache.bump(current_user.id)
         db.session.commit()
+        refresh_insights(current_user.id)
 
     return redirect(url_for("events"))    
 
@@ -178,101 +265,26 @@ def delete_event(event_id):
 # ================= EVENT ANALYTICS =================
 @app.route("/event/<int:event_id>")
 @login_required
+@querycount.budget(5)
+@cache.cached
 def event_analytics(event_id):
 
     event = Event.query.get_or_404(event_id)
 
-    expenses = Expense.query.filter_by(user_id=current_user.id, event_id=event_id).all()
+    expenses = Expense.query.options(expense_list_columns())\
+        .filter_by(user_id=current_user.id, event_id=event_id).all()
 
-    total_spent = sum(e.amount for e in expenses if e.transaction_type == "expense")
-    total_income = sum(e.amount for e in expenses if e.transaction_type == "income")
-    net_balance = total_income - total_spent
+    # ONE GROUPED QUERY -> totals, charts and highlights
+    summary = analytics.summarize(current_user.id, event_id=event_id)
+    total_spent = summary.total_expense
 
     budget = event.budget_limit or 0
 
     remaining_budget = budget - total_spent
-    budget_percentage = round((total_spent / budget) * 100, 2) if budget > 0 else 0
+    budget_percentage = round(summary.budget_percentage(budget), 2)
     overspent = total_spent > budget if budget > 0 else False
 
-    # CATEGORY TOTALS
-    category_totals = defaultdict(float)
-    trend_data = defaultdict(float)
-
-    for e in expenses:
-        if e.transaction_type == "expense":
-            category_totals[e.category] += e.amount
-            if e.date:
-                trend_data[e.date] += e.amount
-
-    highest_category = max(category_totals, key=category_totals.get) if category_totals else None
-    highest_category_amount = category_totals.get(highest_category, 0)
-
-    highest_day = max(trend_data, key=trend_data.get) if trend_data else None
-    highest_day_amount = trend_data.get(highest_day, 0)
-
-    total_transactions = len(expenses)
-    avg_expense = total_spent / total_transactions if total_transactions else 0
-
-    health_score = max(0, 100 - budget_percentage)
-
-    event_summary = "This event is within budget."
-    if overspent:
-        event_summary = "This event exceeded its budget."
-    elif budget_percentage > 80:
-        event_summary = "This event is close to its budget limit."
-
-    if highest_category:
-        event_summary += f" Most spending was on {highest_category}."
-
-    # ===== EVENT PERFORMANCE SCORE =====
-
-    performance_score = 100
-
-    if budget_percentage > 100:
-       performance_score -= 40
-    elif budget_percentage > 90:
-         performance_score -= 25
-    elif budget_percentage > 75:
-         performance_score -= 15
-
-    if highest_category_amount > (total_spent * 0.5):
-       performance_score -= 10
-
-    if total_transactions < 3:
-       performance_score -= 5
-
-    performance_score = max(0, performance_score)
-    
-
-    # ===== EVENT HEALTH SCORE =====
-    health_score = 100
-
-    if budget > 0:
-       if budget_percentage > 100:
-          health_score -= 30
-       elif budget_percentage > 80:
-             health_score -= 15
-
-    avg_expense = total_spent / total_transactions if total_transactions else 0
-
-    if avg_expense > 5000:
-       health_score -= 10
-
-    health_score = max(0, round(health_score, 2))
-
-    recommendations = []
-
-    if overspent:
-       recommendations.append("Event exceeded budget. Reduce future spending.")
-
-    elif budget_percentage > 80:
-         recommendations.append("Event is close to budget limit.")
-
-    if highest_category and highest_category_amount > total_spent * 0.4:
-       recommendations.append(f"Most spending is on {highest_category}.")
-
-    if not recommendations:
-       recommendations.append("Event spending is well managed.")
+    assessment = analytics.assess_event(summary, budget)
 
     return render_template(
         "event_analytics.html",
@@ -282,22 +294,22 @@ def event_analytics(event_id):
         remaining_budget=remaining_budget,
         budget_percentage=budget_percentage,
         overspent=overspent,
-        chart_labels=list(category_totals.keys()),
-        chart_values=list(category_totals.values()),
-        trend_labels=list(trend_data.keys()),
-        trend_values=list(trend_data.values()),
-        highest_category=highest_category,
-        highest_category_amount=highest_category_amount,
-        highest_day=highest_day,
-        highest_day_amount=highest_day_amount,
-        total_transactions=total_transactions,
-        avg_expense=avg_expense,
-        health_score=round(health_score, 2),
-        event_summary=event_summary,
-        total_income=total_income,
-        net_balance=net_balance,
-        performance_score=performance_score,
-        recommendations=recommendations,
+        chart_labels=list(summary.category_totals.keys()),
+        chart_values=list(summary.category_totals.values()),
+        trend_labels=iso_labels(summary.daily_totals.keys()),
+        trend_values=list(summary.daily_totals.values()),
+        highest_category=summary.highest_category,
+        highest_category_amount=summary.highest_category_amount,
+        highest_day=summary.highest_day,
+        highest_day_amount=summary.highest_day_amount,
+        total_transactions=summary.transactions,
+        avg_expense=summary.average_expense,
+        health_score=assessment.health_score,
+        event_summary=assessment.insight,
+        total_income=summary.total_income,
+        net_balance=summary.total_income - total_spent,
+        performance_score=assessment.performance_score,
+        recommendations=assessment.recommendations,
 
 
     )
@@ -306,6 +318,7 @@ def event_analytics(event_id):
 # ================= EVENTS LIST =================
 @app.route("/events")
 @login_required
+@querycount.budget(4)
 def events():
 
     search_query = request.args.get("search")
@@ -313,9 +326,12 @@ def events():
     query = Event.query.filter_by(created_by=current_user.id)
 
     if search_query:
-        query = query.filter(Event.name.ilike(f"%{search_query}%"))
+        # best match first
+        query = search.ranked_events(query, current_user.id, search_query)
+    else:
+        query = query.order_by(Event.id.desc())
 
-    events = query.order_by(Event.id.desc()).all()
+    events = query.all()
 
     # ===== KPIs =====
     total_allocated = sum(e.budget_limit or 0 for e in events)
@@ -352,9 +368,10 @@ def edit_event(event_id):
     if request.method == "POST":
         event.name = request.form.get("name")
         event.description = request.form.get("description")
-        event.date = request.form.get("date")
+        event.date = parse_date(request.form.get("date"))
         event.budget_limit = float(request.form.get("budget_limit") or 0)
 
+        cache.bump(current_user.id)
         db.session.commit()
         flash("Event updated successfully", "success")
         return redirect(url_for("events"))
@@ -364,186 +381,152 @@ def edit_event(event_id):
 # ================= DASHBOARD =================
 @app.route("/dashboard")
 @login_required
+@querycount.budget(10)
+@cache.cached
 def dashboard():
 
     search_query = request.args.get("search")
 
-    expenses_query = Expense.query.filter_by(user_id=current_user.id)
-
+    criteria = []
     if search_query:
-       expenses_query = expenses_query.filter(
-          (Expense.description.ilike(f"%{search_query}%")) |
-          (Expense.category.ilike(f"%{search_query}%"))
-    )
+        criteria.append(aggregates.search_filter(current_user.id, search_query))
 
-    expenses = expenses_query.all()
-    recent_expenses = expenses[-5:]
+    # ?month=YYYY-MM or ?start=&end= narrow every aggregate to a date range
+    filters = range_filters(request.args)
 
-    total_expense = sum(e.amount for e in expenses if e.transaction_type == "expense")
-    total_income = sum(e.amount for e in expenses if e.transaction_type == "income")
-    budget = Budget.query.filter_by(user_id=current_user.id).first()
-    monthly_limit = budget.monthly_limit if budget else 0
+    # ===== ONE GROUPED QUERY (totals, categories, daily trend) =====
+    summary = analytics.summarize(current_user.id, *criteria, **filters)
+    total_expense = summary.total_expense
+    total_income = summary.total_income
 
-    net_balance = monthly_limit - total_expense
-    total_transactions = len(expenses)
+    if search_query:
+        # most relevant matches rather than the latest rows
+        recent_expenses = search.ranked_expenses(
+            Expense.query.options(expense_list_columns())
+            .filter(*aggregates.expense_filters(current_user.id, **filters)),
+            current_user.id,
+            search_query
+        ).limit(5).all()
+    else:
+        recent_expenses = aggregates.recent_expenses(5, current_user.id, **filters)
 
     # ===== GET PERSONAL BUDGET =====
     budget = Budget.query.filter_by(
-    user_id=current_user.id,
-    event_id=None
-   ).first()
+        user_id=current_user.id,
+        event_id=None
+    ).first()
 
     monthly_limit = float(budget.monthly_limit) if budget else 0
 
+    net_balance = monthly_limit - total_expense
     remaining_budget = monthly_limit - total_expense
-    budget_percentage = (total_expense / monthly_limit) * 100 if monthly_limit > 0 else 0
+    budget_percentage = summary.budget_percentage(monthly_limit)
     overspent = total_expense > monthly_limit if monthly_limit > 0 else False
 
-    category_totals = defaultdict(float)
-    trend_data = defaultdict(float)
-
-    for e in expenses:
-        if e.transaction_type == "expense":
-            category_totals[e.category] += e.amount
-            if e.date:
-                trend_data[e.date] += e.amount
-
-    # ===== HIGHEST CATEGORY =====
-    highest_category = max(category_totals, key=category_totals.get) if category_totals else None
-    highest_category_amount = category_totals.get(highest_category, 0)
-
-    # ===== HIGHEST DAY =====
-    highest_day = max(trend_data, key=trend_data.get) if trend_data else None
-    highest_day_amount = trend_data.get(highest_day, 0)
-
-    # ===== TOTAL CATEGORIES =====
-    total_categories = len(category_totals)
-
     # ===== INCOME EXPENSE RATIO =====
     income_expense_ratio = round(total_income / total_expense, 2) if total_expense > 0 else 0
 
-    # ===== PREDICTION =====
-    predicted_expense = round(sum(trend_data.values()) / len(trend_data), 2) if trend_data else 0
-
-    # ===== SMART INSIGHT =====
-    insight_message = "Your finances are stable."
-
-    if monthly_limit > 0:
-        if budget_percentage > 100:
-            insight_message = "⚠️ You exceeded your monthly budget."
-        elif budget_percentage > 80:
-            insight_message = "⚠️ You are close to your budget limit."
-        elif budget_percentage < 50:
-            insight_message = "✅ Spending is well under control."
-
-        if total_income > total_expense:
-            insight_message += " You are saving money."
-    else:
-        if total_expense > total_income:
-            insight_message = "Expenses are higher than income."
-
     # ===== ALERTS =====
-    large_expense_alert = any(e.amount > 5000 for e in expenses if e.transaction_type == "expense")
-
-    spending_spike_alert = False
-    if len(trend_data) >= 2:
-        values = list(trend_data.values())
-        if values[-1] > (sum(values[:-1]) / max(len(values[:-1]), 1)) * 1.5:
-            spending_spike_alert = True
+    # Flagged by the detect_anomalies job (robust z-score per category).
+    unusual_expenses = anomalies.recent(current_user.id, 5, *criteria, **filters)
+    large_expense_alert = bool(unusual_expenses)
 
     near_budget_alert = budget_percentage >= 80 and budget_percentage < 100
     overspent_alert = budget_percentage >= 100
 
-    # ===== HEALTH SCORE =====
-    health_score = 100
-
-    if budget_percentage > 100:
-        health_score -= 30
-    elif budget_percentage > 80:
-        health_score -= 15
-
-    if total_income > 0:
-        ratio = total_expense / total_income
-        if ratio > 1:
-            health_score -= 25
-        elif ratio > 0.8:
-            health_score -= 10
-
-    if spending_spike_alert:
-        health_score -= 10
-
-    health_score = max(0, round(health_score, 2))
-
-    # ===== HEALTH LABEL =====
-    health_label = "Excellent"
-
-    if health_score < 40:
-        health_label = "Risky"
-    elif health_score < 70:
-        health_label = "Moderate"
-    elif health_score < 90:
-        health_label = "Good"
-
-    # ===== RECOMMENDATIONS =====
-    recommendations = []
+    # ===== FORECAST (fitted by the update_forecast job, only read here) =====
+    forecast = forecasting.current(current_user.id)
 
-    if budget_percentage > 100:
-        recommendations.append("You exceeded your monthly budget. Reduce non-essential spending.")
-    elif budget_percentage > 80:
-        recommendations.append("You are close to your budget limit. Be cautious with new expenses.")
-
-    if highest_category and highest_category_amount > (total_expense * 0.4):
-        recommendations.append(f"Your highest spending is on {highest_category}. Consider reducing it.")
-
-    if total_income > 0 and total_expense > total_income:
-        recommendations.append("Your expenses exceed your income. This is financially risky.")
-
-    if large_expense_alert:
-        recommendations.append("Large transactions detected recently. Review them.")
-
-    if not recommendations:
-        recommendations.append("Your finances look healthy. Keep it up.")
+    predicted_expense = forecast.total if forecast else summary.average_daily_expense
 
+    # The model's spike test covers all spending; keep the simple one for filtered views.
+    if forecast and not criteria and not filters:
+        spending_spike_alert = forecast.spike
+    else:
+        spending_spike_alert = summary.spending_spike
 
-        
+    # ===== INSIGHT, HEALTH SCORE, RECOMMENDATIONS =====
+    assessment = analytics.assess_personal(
+        summary, monthly_limit, large_expense_alert, spending_spike_alert
+    )
 
     return render_template(
         "dashboard.html",
         total_expense=total_expense,
         total_income=total_income,
         net_balance=net_balance,
-        total_transactions=total_transactions,
+        total_transactions=summary.transactions,
         monthly_limit=monthly_limit,
         remaining_budget=remaining_budget,
         overspent=overspent,
-        chart_labels=list(category_totals.keys()),
-        chart_values=list(category_totals.values()),
-        trend_labels=list(trend_data.keys()),
-        trend_values=list(trend_data.values()),
+        chart_labels=list(summary.category_totals.keys()),
+        chart_values=list(summary.category_totals.values()),
+        trend_labels=iso_labels(summary.daily_totals.keys()),
+        trend_values=list(summary.daily_totals.values()),
         budget_percentage=budget_percentage,
         predicted_expense=predicted_expense,
-        insight_message=insight_message,
+        forecast=forecast,
+        insight_message=assessment.insight,
         large_expense_alert=large_expense_alert,
+        unusual_expenses=unusual_expenses,
         spending_spike_alert=spending_spike_alert,
         near_budget_alert=near_budget_alert,
         overspent_alert=overspent_alert,
-        health_score=health_score,
-        health_label=health_label,
-        recommendations=recommendations,
-        highest_category=highest_category,
-        highest_category_amount=highest_category_amount,
-        highest_day=highest_day,
-        highest_day_amount=highest_day_amount,
-        total_categories=total_categories,
+        health_score=assessment.health_score,
+        health_label=assessment.health_label,
+        recommendations=assessment.recommendations,
+        highest_category=summary.highest_category,
+        highest_category_amount=summary.highest_category_amount,
+        highest_day=summary.highest_day,
+        highest_day_amount=summary.highest_day_amount,
+        total_categories=len(summary.category_totals),
         income_expense_ratio=income_expense_ratio,
-        recent_expenses=recent_expenses
+        recent_expenses=recent_expenses,
+        filters=request.args
     )
     
 
 
 # ================= SET BUDGET =================
+def save_budget(user_id, limit, budget_type, event_id, month):
+    """Set the limit of the user's budget for ``event_id`` (None: personal) in ``month``.
+
+    Creates the budget if needed; returns ``(budget, created)``. The current
+    limit only changes for the current month, but every month keeps its own
+    BudgetMonth row for the history. The caller commits.
+    """
+    # IMPORTANT: check by user_id + event_id
+    budget = Budget.query.filter_by(user_id=user_id, event_id=event_id).first()
+    created = budget is None
+
+    if created:
+        budget = Budget(
+            user_id=user_id,
+            monthly_limit=limit,
+            budget_type=budget_type,
+            event_id=event_id
+        )
+        db.session.add(budget)
+        db.session.flush()
+    else:
+        if month == month_start():
+            budget.monthly_limit = limit
+        budget.budget_type = budget_type
+
+    # ===== PER-MONTH LIMIT (drives the history) =====
+    record = BudgetMonth.query.filter_by(budget_id=budget.id, month=month).first()
+    if record:
+        record.monthly_limit = limit
+    else:
+        db.session.add(BudgetMonth(budget_id=budget.id, month=month, monthly_limit=limit))
+
+    return budget, created
+
+
 @app.route("/set_budget", methods=["GET", "POST"])
 @login_required
+@querycount.budget(14)
+@cache.cached
 def set_budget():
 
     # ===== MODE SWITCH (NEW) =====
@@ -565,24 +548,12 @@ def set_budget():
         else:
             event_id = int(event_id) if event_id else None
 
-        # IMPORTANT: check by user_id + event_id
-        existing = Budget.query.filter_by(
-            user_id=current_user.id,
-            event_id=event_id
-        ).first()
-
-        if existing:
-            existing.monthly_limit = limit
-            existing.budget_type = budget_type
-        else:
-            new_budget = Budget(
-                user_id=current_user.id,
-                monthly_limit=limit,
-                budget_type=budget_type,
-                event_id=event_id
-            )
-            db.session.add(new_budget)
+        # ?month=YYYY-MM sets an earlier month's limit; default is this month
+        month = month_bounds(request.form.get("month"))
+        month = month[0] if month else month_start()
 
+        save_budget(current_user.id, limit, budget_type, event_id, month)
+        cache.bump(current_user.id)
         db.session.commit()
 
     # ===== GET BUDGET BASED ON MODE =====
@@ -597,11 +568,8 @@ def set_budget():
 
         monthly_limit = budget.monthly_limit if budget else 0
 
-        expenses = Expense.query.filter_by(
-            user_id=current_user.id,
-            event_id=selected_event_id,
-            transaction_type="expense"
-        ).all()
+        summary = analytics.summarize(current_user.id, event_id=selected_event_id)
+        scope = {"event_id": selected_event_id}
 
     else:
         # PERSONAL MODE
@@ -612,70 +580,32 @@ def set_budget():
 
         monthly_limit = budget.monthly_limit if budget else 0
 
-        expenses = Expense.query.filter_by(
-            user_id=current_user.id,
-            event_id=None,
-            transaction_type="expense"
-        ).all()
+        summary = analytics.summarize(current_user.id, event_id=None)
+        scope = {"event_id": None}
 
     # ===== CALCULATIONS =====
-    total_spent = sum(e.amount for e in expenses)
+    total_spent = summary.total_expense
 
     remaining_budget = monthly_limit - total_spent
 
-    usage_percent = (total_spent / monthly_limit * 100) if monthly_limit > 0 else 0
+    usage_percent = summary.budget_percentage(monthly_limit)
 
     # ===== CATEGORY BREAKDOWN =====
-    from collections import defaultdict
-    category_totals = defaultdict(float)
+    breakdown_labels = list(summary.category_totals.keys())
+    breakdown_values = list(summary.category_totals.values())
 
-    for e in expenses:
-        category_totals[e.category] += e.amount
-
-    breakdown_labels = list(category_totals.keys())
-    breakdown_values = list(category_totals.values())
+    # ===== MONTHLY HISTORY (?history_start=&history_end=, YYYY-MM) =====
+    history = analytics.budget_history(
+        current_user.id, budget, month_range(request.args), **scope
+    )
 
-    # ===== TREND MOCK (kept same logic) =====
-    months = ["July", "Aug", "Sept", "Oct"]
-    trend_budget = [monthly_limit] * 4
-    trend_spent = [
-        total_spent * 0.5,
-        total_spent * 0.7,
-        total_spent * 0.9,
-        total_spent
-    ]
+    months = [item["start"].strftime("%b %Y") for item in history]
+    trend_budget = [item["budget"] for item in history]
+    trend_spent = [item["spent"] for item in history]
 
     # ===== INSIGHT =====
-    insight = "Budget healthy"
-
-    if usage_percent > 90:
-        insight = "⚠️ You are about to exceed your budget"
-    elif usage_percent > 75:
-        insight = "⚠️ You are close to your budget limit"
-
-    alert = usage_percent > 75
-
-    # ===== HISTORY =====
-    history = [
-        {
-            "month": "September 2023",
-            "budget": monthly_limit,
-            "spent": total_spent,
-            "status": "Healthy" if usage_percent < 80 else "Near Limit"
-        },
-        {
-            "month": "August 2023",
-            "budget": monthly_limit * 0.9,
-            "spent": total_spent * 0.8,
-            "status": "Near Limit"
-        },
-        {
-            "month": "July 2023",
-            "budget": monthly_limit * 0.8,
-            "spent": total_spent * 0.9,
-            "status": "Exceeded"
-        }
-    ]
+    insight, alert = analytics.budget_insight(usage_percent)
+
 
     return render_template(
         "budget.html",
@@ -690,11 +620,12 @@ def set_budget():
         months=months,
         trend_budget=trend_budget,
         trend_spent=trend_spent,
-        history=history,
+        history=history[::-1],
         events=events,
         mode=mode,
         event_id=selected_event_id,
-        expenses=expenses
+        history_start=history[0]["start"].strftime("%Y-%m") if history else "",
+        history_end=history[-1]["start"].strftime("%Y-%m") if history else ""
     )
 # ================= ADD EXPENSE =================
 @app.route("/add_expense", methods=["GET", "POST"])
@@ -706,36 +637,79 @@ def add_expense():
     if request.method == "POST":
 
         receipt_file = request.files.get("receipt")
-        filename = None
+        receipt = None
 
         if receipt_file and receipt_file.filename:
-            filename = secure_filename(receipt_file.filename)
-            os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
-            receipt_file.save(os.path.join(app.config["UPLOAD_FOLDER"], filename))
+            try:
+                receipt = receipts.store(receipt_file.stream, receipt_file.filename)
+            except ValueError as err:
+                flash(str(err), "danger")
+                return redirect(url_for("add_expense"))
 
         expense = Expense(
             user_id=current_user.id,
             event_id=request.form.get("event_id") or None,
             amount=float(request.form.get("amount") or 0),
-            category=detect_category(request.form.get("description")),
+            category=category_model.classify(current_user.id, request.form.get("description")),
             description=request.form.get("description"),
-            date=request.form.get("date"),
+            date=parse_date(request.form.get("date")),
             transaction_type=request.form.get("transaction_type"),
             notes=request.form.get("notes"),
             tags=request.form.get("tags"),
             account=request.form.get("account"),
-            receipt=filename
+            receipt=receipt
         )
+        expense.fingerprint = dedup.new_fingerprints(
+            current_user.id, [(expense.date, expense.amount, expense.description, expense.account)]
+        )[0]
 
         db.session.add(expense)
+        rollups.add_expense(expense)
+        cache.bump(current_user.id)
         db.session.commit()
+        refresh_insights(current_user.id)
+
+        if receipt:
+            receipts.schedule(current_user.id, receipt)
 
         return redirect(url_for("dashboard"))
 
     return render_template("add_expense.html", events=events)
 
 
-# ================= IMPORT CSV =================
+# ================= RECEIPTS =================
+RECEIPT_MAX_AGE = 365 * 24 * 3600
+
+
+@app.route("/receipts/<key>")
+@app.route("/receipts/<key>/<variant>")
+@login_required
+def receipt_file(key, variant=None):
+    if variant is not None and variant not in receipts.VARIANTS:
+        abort(404)
+
+    owned = db.session.query(Expense.id).filter_by(user_id=current_user.id, receipt=key).first()
+    if owned is None:
+        abort(404)
+
+    if not receipts.is_key(key):
+        # Saved before the receipt store, under the uploaded file name.
+        return send_from_directory(app.config["UPLOAD_FOLDER"], key)
+
+    path = receipts.path_for(key, variant)
+    if variant and not os.path.exists(path):
+        # Not drawn yet (or a PDF): the original, revalidated every time so
+        # the variant replaces it once the job has run.
+        return send_file(receipts.path_for(key), max_age=0)
+
+    # Content-addressed: the bytes behind this URL never change.
+    response = send_file(path, max_age=RECEIPT_MAX_AGE, etag=f"{key}.{variant or 'original'}")
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = True
+    return response
+
+
 # ================= IMPORT CSV =================
 @app.route("/import_csv", methods=["GET", "POST"])
 @login_required
@@ -749,136 +723,187 @@ def import_csv():
             flash("No file uploaded", "danger")
             return redirect(url_for("import_csv"))
 
-        import pandas as pd
-        from datetime import datetime
+        # ===== HAND OFF TO A WORKER (streams in chunks, resumes a failed upload) =====
+        path = jobs.job_path(".csv")
+        file.save(path)
 
-        try:
-            # ===== READ CSV =====
-            df = pd.read_csv(file)
-
-            # ===== NORMALIZE COLUMN NAMES =====
-            df.columns = (
-                df.columns
-                .str.strip()
-                .str.lower()
-                .str.replace(" ", "_")
-            )
+        job = jobs.enqueue(
+            "import_csv",
+            current_user.id,
+            path=path,
+            filename=file.filename,
+            chunk_rows=app.config["IMPORT_CHUNK_ROWS"]
+        )
+        return redirect(url_for("job_status", job_id=job.id))
+
+    return render_template("import_csv.html")
 
-            # ===== REQUIRED COLUMNS =====
-            required_columns = {"amount", "category", "description", "date"}
-
-            if not required_columns.issubset(df.columns):
-                flash("CSV missing required columns", "danger")
-                print("CSV columns found:", df.columns.tolist())
-                return redirect(url_for("import_csv"))
-
-            count = 0
-
-            # ===== LOOP ROWS =====
-            for _, row in df.iterrows():
-
-                try:
-                    # Handle date safely
-                    try:
-                        parsed_date = datetime.strptime(
-                            str(row.get("date")), "%Y-%m-%d"
-                        )
-                    except Exception:
-                        # Try alternate format
-                        parsed_date = datetime.strptime(
-                            str(row.get("date")), "%d-%m-%Y"
-                        )
-
-                    expense = Expense(
-                        user_id=current_user.id,
-                        amount=float(row.get("amount", 0)),
-                        category=row.get("category", "Other"),
-                        description=row.get("description", ""),
-                        date=parsed_date,
-                        transaction_type=row.get("transaction_type") or "expense",
-                        account=row.get("account", "Bank")
-                    )
-
-                    db.session.add(expense)
-                    count += 1
-
-                except Exception as err:
-                    print("ROW ERROR:", err)
-                    continue
+# ================= CATEGORY RULES =================
+@app.route("/category_rules", methods=["GET", "POST"])
+@login_required
+def category_rules():
 
+    if request.method == "POST":
+        keyword = (request.form.get("keyword") or "").strip()
+        category = (request.form.get("category") or "").strip()
+
+        if keyword and category:
+            db.session.add(CategoryRule(
+                user_id=current_user.id,
+                keyword=keyword,
+                category=category
+            ))
             db.session.commit()
+            flash("Rule added", "success")
+        else:
+            flash("Keyword and category are required", "danger")
 
-            flash(f"CSV imported successfully ✅ ({count} rows)", "success")
-            return redirect(url_for("dashboard"))
+        return redirect(url_for("category_rules"))
 
-        except Exception as e:
-            print("IMPORT ERROR:", e)
-            flash("Import failed — check CSV format", "danger")
-            return redirect(url_for("import_csv"))
+    rules = CategoryRule.query.filter_by(user_id=current_user.id)\
+        .order_by(CategoryRule.id).all()
 
-    return render_template("import_csv.html")
+    return render_template("category_rules.html", rules=rules)
 
-# ================= VIEW EXPENSES =================
-@app.route("/expenses")
+
+@app.route("/category_rules/<int:rule_id>/delete")
 @login_required
-def view_expenses():
+def delete_category_rule(rule_id):
 
+    rule = CategoryRule.query.get_or_404(rule_id)
+
+    if rule.user_id == current_user.id:
+        db.session.delete(rule)
+        db.session.commit()
+
+    return redirect(url_for("category_rules"))
+
+
+# ================= VIEW EXPENSES =================
+def _expense_list_filters():
+    """Turn /expenses query args into ``(criteria, filters)`` for aggregates."""
     search_query = request.args.get("search")
     category_filter = request.args.get("category")
     date_filter = request.args.get("date")
 
-    # BASE QUERY
-    expenses_query = Expense.query.filter_by(user_id=current_user.id)
+    criteria = []
+    filters = {}
 
-    # FILTERS
     if search_query:
-        expenses_query = expenses_query.filter(
-            Expense.description.ilike(f"%{search_query}%")
-        )
+        criteria.append(aggregates.search_filter(current_user.id, search_query))
 
     if category_filter:
-        expenses_query = expenses_query.filter_by(category=category_filter)
+        filters["category"] = category_filter
 
     if date_filter:
-        expenses_query = expenses_query.filter_by(date=date_filter)
+        filters["date"] = parse_date(date_filter)
 
-    # ORDER
-    expenses = expenses_query.order_by(Expense.date.desc()).all()
+    # RANGE (?month=YYYY-MM or ?start=&end=) -> index range scan on (user_id, date)
+    filters.update(range_filters(request.args))
 
-    # ================= TOTALS =================
+    return criteria, filters
 
-    total_expense = sum(e.amount for e in expenses if e.transaction_type == "expense")
-    total_income = sum(e.amount for e in expenses if e.transaction_type == "income")
 
-    # ================= CATEGORY LIST =================
+def _expense_page(criteria, filters, *options):
+    page_size = request.args.get("page_size", app.config["EXPENSES_PAGE_SIZE"], type=int)
+    page_size = max(1, min(page_size, app.config["EXPENSES_MAX_PAGE_SIZE"]))
 
-    categories = db.session.query(Expense.category)\
-        .filter_by(user_id=current_user.id)\
-        .distinct().all()
+    query = Expense.query.options(*options).filter(
+        *aggregates.expense_filters(current_user.id, *criteria, **filters)
+    )
+    return pagination.keyset_page(query, request.args.get("after"), page_size)
 
-    categories = [c[0] for c in categories]
 
-    # ================= TREND DATA =================
+@app.route("/expenses")
+@login_required
+@querycount.budget(6)
+@cache.cached
+def view_expenses():
+
+    criteria, filters = _expense_list_filters()
 
-    trend_data = defaultdict(float)
+    # ONE PAGE, keyset-ordered by (date, id), only the columns the table shows
+    expenses, next_cursor = _expense_page(criteria, filters, expense_list_columns())
 
-    for e in expenses:
-        if e.transaction_type == "expense" and e.date:
-            trend_data[e.date] += e.amount
+    # ================= TOTALS (whole filtered set, not just this page) =================
 
-    trend_labels = list(trend_data.keys())
+    total_expense, total_income, total_transactions = aggregates.type_summary(
+        current_user.id, *criteria, **filters
+    )
+
+    # ================= CATEGORY LIST =================
+
+    categories = aggregates.categories(current_user.id)
+
+    # ================= TREND DATA =================
+
+    trend_data = dict(aggregates.daily_totals(current_user.id, *criteria, **filters))
+
+    trend_labels = iso_labels(trend_data.keys())
     trend_values = list(trend_data.values())
 
     # ================= RETURN =================
 
+    next_args = request.args.to_dict()
+    next_args["after"] = next_cursor
+
     return render_template(
         "expenses.html",
         expenses=expenses,
         categories=categories,
         total_expense=total_expense,
         total_income=total_income,
+        total_transactions=total_transactions,
         trend_labels=trend_labels,
-        trend_values=trend_values
+        trend_values=trend_values,
+        filters=request.args,
+        next_url=url_for("view_expenses", **next_args) if next_cursor else None
+    )
+
+
+@app.route("/expenses.json")
+@login_required
+@querycount.budget(4)
+@cache.cached
+def view_expenses_json():
+
+    criteria, filters = _expense_list_filters()
+    expenses, next_cursor = _expense_page(criteria, filters)
+
+    response = {
+        "items": [e.to_dict() for e in expenses],
+        "next_cursor": next_cursor,
+    }
+
+    # Totals only on the first page; later pages just append rows.
+    if not request.args.get("after"):
+        total_expense, total_income, total_transactions = aggregates.type_summary(
+            current_user.id, *criteria, **filters
+        )
+        response["totals"] = {
+            "expense": total_expense,
+            "income": total_income,
+            "transactions": total_transactions,
+        }
+
+    return jsonify(response)
+
+
+# ================= BULK EXPORT =================
+@app.route("/export/<dataset>.<fmt>")
+@login_required
+def export_data(dataset, fmt):
+    """Stream expenses (with the /expenses filters), events or budgets."""
+    if dataset not in exports.DATASETS or fmt not in exports.FORMATS:
+        abort(404)
+
+    criteria, filters = _expense_list_filters() if dataset == "expenses" else ([], {})
+    chunks = exports.stream(dataset, fmt, current_user.id, *criteria, **filters)
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=exports.FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={dataset}.{fmt}"}
     )
 
 
@@ -888,10 +913,15 @@ def view_expenses():
 def edit_expense(expense_id):
     expense = Expense.query.get_or_404(expense_id)
     if request.method == "POST":
+        rollups.remove_expense(expense)
         expense.amount = request.form.get("amount")
         expense.description = request.form.get("description")
         expense.category = request.form.get("category")
+        rollups.add_expense(expense)
+        anomalies.rescore(expense)
+        cache.bump(expense.user_id)
         db.session.commit()
+        refresh_insights(expense.user_id)
         return redirect(url_for("view_expenses"))
     return render_template("edit_expense.html", expense=expense)  
 
@@ -908,13 +938,372 @@ def delete_expense(expense_id):
         flash("Unauthorized action", "danger")
         return redirect(url_for("view_expenses"))
 
+    rollups.remove_expense(expense)
     db.session.delete(expense)
+    anomalies.rewind()
+    cache.bump(current_user.id)
     db.session.commit()
+    refresh_insights(current_user.id)
 
     flash("Expense deleted successfully", "success")
     return redirect(url_for("view_expenses"))
 
 
+# ================= JSON API (v1) =================
+# Session-authenticated like the pages (POST /api/v1/session to log in);
+# errors and 401s are JSON. Lists accept ?fields=a,b, responses are gzipped
+# for clients that send Accept-Encoding: gzip (api.compress).
+
+@app.errorhandler(api.ApiError)
+def api_error(err):
+    return err.response()
+
+
+@app.route("/api/v1/session", methods=["POST", "DELETE"])
+def api_session():
+    if request.method == "DELETE":
+        logout_user()
+        return "", 204
+
+    data = api.json_body()
+    user = User.query.filter_by(email=data.get("email")).first() if isinstance(data, dict) else None
+
+    if user is None or not check_password_hash(user.password, str(data.get("password") or "")):
+        raise api.ApiError(401, "Invalid email or password")
+
+    login_user(user)
+    return jsonify({"id": user.id, "username": user.username})
+
+
+def _api_own(model, object_id, owner_column):
+    obj = db.session.get(model, object_id)
+    if obj is None or getattr(obj, owner_column) != current_user.id:
+        raise api.ApiError(404, f"{model.__name__} not found")
+    return obj
+
+
+# ===== EXPENSES =====
+@app.route("/api/v1/expenses")
+@login_required
+@querycount.budget(4)
+@cache.cached
+def api_expenses():
+    # Same filters and keyset cursor as /expenses.json, only the asked-for columns.
+    fields = api.requested_fields(api.EXPENSE_FIELDS)
+    criteria, filters = _expense_list_filters()
+    columns = [getattr(Expense, name) for name in fields] + [Expense.date]
+    expenses, next_cursor = _expense_page(criteria, filters, load_only(*columns, raiseload=True))
+
+    return jsonify({
+        "items": [api.serialize(expense, fields) for expense in expenses],
+        "next_cursor": next_cursor,
+    })
+
+
+@app.route("/api/v1/expenses", methods=["POST"])
+@login_required
+def api_create_expense():
+    values = api.parse("expense", api.json_body())
+    api.check_events(current_user.id, [values.get("event_id")])
+
+    expense = Expense(**api.expense_rows(current_user.id, [values])[0])
+    db.session.add(expense)
+    rollups.add_expense(expense)
+    cache.bump(current_user.id)
+    db.session.commit()
+    refresh_insights(current_user.id)
+
+    return jsonify(api.serialize(expense, api.EXPENSE_FIELDS)), 201
+
+
+@app.route("/api/v1/expenses/batch", methods=["POST"])
+@login_required
+def api_expenses_batch():
+    ids = api.insert_expenses(current_user.id, api.json_body())
+    cache.bump(current_user.id)
+    db.session.commit()
+    refresh_insights(current_user.id)
+
+    return jsonify({"inserted": len(ids), "ids": ids}), 201
+
+
+@app.route("/api/v1/expenses/<int:expense_id>", methods=["GET", "PATCH", "DELETE"])
+@login_required
+def api_expense(expense_id):
+    expense = _api_own(Expense, expense_id, "user_id")
+
+    if request.method == "PATCH":
+        values = api.parse("expense", api.json_body(), partial=True)
+        api.check_events(current_user.id, [values.get("event_id")])
+
+        rollups.remove_expense(expense)
+        for name, value in values.items():
+            setattr(expense, name, value)
+        rollups.add_expense(expense)
+        anomalies.rescore(expense)
+        cache.bump(current_user.id)
+        db.session.commit()
+        refresh_insights(current_user.id)
+
+    elif request.method == "DELETE":
+        rollups.remove_expense(expense)
+        db.session.delete(expense)
+        anomalies.rewind()
+        cache.bump(current_user.id)
+        db.session.commit()
+        refresh_insights(current_user.id)
+        return "", 204
+
+    return jsonify(api.serialize(expense, api.requested_fields(api.EXPENSE_FIELDS)))
+
+
+# ===== EVENTS =====
+@app.route("/api/v1/events", methods=["GET", "POST"])
+@login_required
+@cache.cached
+def api_events():
+    if request.method == "POST":
+        values = api.parse("event", api.json_body())
+        values.setdefault("budget_limit", 0)
+
+        event = Event(created_by=current_user.id, **values)
+        db.session.add(event)
+        cache.bump(current_user.id)
+        db.session.commit()
+
+        return jsonify(api.serialize(event, api.EVENT_FIELDS)), 201
+
+    fields = api.requested_fields(api.EVENT_FIELDS)
+    events = Event.query.options(load_only(*[getattr(Event, name) for name in fields], raiseload=True))\
+        .filter_by(created_by=current_user.id).order_by(Event.id).all()
+
+    return jsonify({"items": [api.serialize(event, fields) for event in events]})
+
+
+@app.route("/api/v1/events/<int:event_id>", methods=["GET", "PATCH", "DELETE"])
+@login_required
+def api_event(event_id):
+    event = _api_own(Event, event_id, "created_by")
+
+    if request.method == "PATCH":
+        for name, value in api.parse("event", api.json_body(), partial=True).items():
+            setattr(event, name, value)
+        cache.bump(current_user.id)
+        db.session.commit()
+
+    elif request.method == "DELETE":
+        rollups.remove_event(event.id)
+        db.session.delete(event)
+        anomalies.rewind()
+        cache.bump(current_user.id)
+        db.session.commit()
+        refresh_insights(current_user.id)
+        return "", 204
+
+    return jsonify(api.serialize(event, api.requested_fields(api.EVENT_FIELDS)))
+
+
+# ===== BUDGETS =====
+@app.route("/api/v1/budgets", methods=["GET", "POST"])
+@login_required
+@cache.cached
+def api_budgets():
+    if request.method == "POST":
+        # Upsert, like the budget page: one budget per (user, event or personal).
+        values = api.parse("budget", api.json_body())
+        budget_type = values.get("budget_type") or ("event" if values.get("event_id") else "personal")
+        event_id = values.get("event_id") if budget_type == "event" else None
+
+        if budget_type == "event" and event_id is None:
+            raise api.ApiError(422, "Invalid budget", {"event_id": "is required for an event budget"})
+        api.check_events(current_user.id, [event_id])
+
+        budget, created = save_budget(
+            current_user.id, values["monthly_limit"], budget_type, event_id,
+            values.get("month", month_start()).replace(day=1)
+        )
+        cache.bump(current_user.id)
+        db.session.commit()
+
+        return jsonify(api.serialize(budget, api.BUDGET_FIELDS)), 201 if created else 200
+
+    fields = api.requested_fields(api.BUDGET_FIELDS)
+    budgets = Budget.query.filter_by(user_id=current_user.id).order_by(Budget.id).all()
+
+    return jsonify({"items": [api.serialize(budget, fields) for budget in budgets]})
+
+
+@app.route("/api/v1/budgets/<int:budget_id>", methods=["GET", "PATCH", "DELETE"])
+@login_required
+def api_budget(budget_id):
+    budget = _api_own(Budget, budget_id, "user_id")
+
+    if request.method == "PATCH":
+        values = api.parse("budget", api.json_body(), partial=True)
+        if "budget_type" in values or "event_id" in values:
+            raise api.ApiError(422, "Invalid budget", {"event_id": "create a new budget to change its scope"})
+
+        if "monthly_limit" in values:
+            save_budget(
+                current_user.id, values["monthly_limit"], budget.budget_type, budget.event_id,
+                values.get("month", month_start()).replace(day=1)
+            )
+            cache.bump(current_user.id)
+            db.session.commit()
+
+    elif request.method == "DELETE":
+        db.session.delete(budget)
+        cache.bump(current_user.id)
+        db.session.commit()
+        return "", 204
+
+    return jsonify(api.serialize(budget, api.requested_fields(api.BUDGET_FIELDS)))
+
+
+# ================= ROLLUP COMMANDS =================
+rollups_cli = AppGroup("rollups", help="Maintain the pre-summed expense rollups.")
+
+
+@rollups_cli.command("rebuild")
+@click.option("--user-id", type=int, default=None, help="Only rebuild this user.")
+def rebuild_rollups_command(user_id):
+    rows = rollups.rebuild(user_id)
+    click.echo(f"Rebuilt {rows} rollup rows")
+
+
+@rollups_cli.command("verify")
+@click.option("--user-id", type=int, default=None, help="Only verify this user.")
+def verify_rollups_command(user_id):
+    mismatches = rollups.verify(user_id)
+
+    for key, expected, actual in mismatches:
+        click.echo(f"MISMATCH {key}: expected={expected} actual={actual}")
+
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} rollup groups out of sync")
+
+    click.echo("Rollups match raw expenses")
+
+
+app.cli.add_command(rollups_cli)
+
+
+# ================= EXPENSE COMMANDS =================
+expenses_cli = AppGroup("expenses", help="Expense data maintenance.")
+
+
+@expenses_cli.command("dedupe")
+@click.option("--user-id", type=int, default=None, help="Only check this user.")
+@click.option("--merge", is_flag=True, help="Merge each group into its oldest row.")
+def dedupe_expenses_command(user_id, merge):
+    """Find expenses with the same date, amount, description and account."""
+    with db.engine.begin() as conn:
+        filled = dedup.backfill(conn, user_id)
+    if filled:
+        click.echo(f"Fingerprinted {filled} rows that had none")
+
+    groups = dedup.duplicate_groups(user_id)
+    for owner, row_digest, count in groups[:20]:
+        click.echo(f"user {owner}: {count} rows share {row_digest[:12]}")
+    if len(groups) > 20:
+        click.echo(f"... and {len(groups) - 20} more groups")
+
+    if not groups:
+        click.echo("No duplicates")
+        return
+
+    extra = sum(count - 1 for _, _, count in groups)
+    if not merge:
+        click.echo(f"{len(groups)} groups, {extra} extra rows; run with --merge to remove them")
+        return
+
+    removed = dedup.merge(groups)
+    db.session.commit()
+    click.echo(f"Merged {len(groups)} groups, removed {removed} rows")
+
+
+app.cli.add_command(expenses_cli)
+
+
+# ================= RECEIPT COMMANDS =================
+receipts_cli = AppGroup("receipts", help="Receipt storage.")
+
+
+@receipts_cli.command("adopt")
+def adopt_receipts_command():
+    """Move receipts saved under UPLOAD_FOLDER into the receipt store."""
+    names = [name for (name,) in db.session.query(Expense.receipt).distinct()
+             if name and not receipts.is_key(name)]
+    adopted = 0
+
+    for name in names:
+        path = os.path.join(app.config["UPLOAD_FOLDER"], name)
+        if not os.path.isfile(path):
+            click.echo(f"missing: {name}")
+            continue
+
+        try:
+            with open(path, "rb") as stream:
+                key = receipts.store(stream, name)
+        except ValueError as err:
+            click.echo(f"skipped {name}: {err}")
+            continue
+
+        receipts.make_images(key)
+        for (user_id,) in db.session.query(Expense.user_id).filter_by(receipt=name).distinct():
+            cache.bump(user_id)
+        Expense.query.filter_by(receipt=name).update({"receipt": key}, synchronize_session=False)
+        db.session.commit()
+        adopted += 1
+
+    click.echo(f"Adopted {adopted} of {len(names)} receipts; the originals are left in place")
+
+
+app.cli.add_command(receipts_cli)
+
+
+# ================= SCHEMA COMMANDS =================
+schema_cli = AppGroup("schema", help="Versioned schema migrations.")
+
+
+@schema_cli.command("upgrade")
+def upgrade_schema_command():
+    applied = migrations.upgrade(echo=click.echo)
+    if not applied:
+        click.echo("Nothing to apply")
+    click.echo(f"Schema version {migrations.current_version()}")
+
+
+@schema_cli.command("version")
+def schema_version_command():
+    click.echo(f"Schema version {migrations.current_version()} "
+               f"(latest {migrations.LATEST_VERSION})")
+
+
+app.cli.add_command(schema_cli)
+
+
+# ================= CATEGORY MODEL COMMANDS =================
+categories_cli = AppGroup("categories", help="Per-user learned categorisation.")
+
+
+@categories_cli.command("train")
+@click.option("--user-id", type=int, default=None, help="Only train this user.")
+def train_categories_command(user_id):
+    user_ids = [user_id] if user_id else [u.id for u in User.query.all()]
+
+    for uid in user_ids:
+        stats = category_model.train(uid)
+        if stats:
+            click.echo(f"user {uid}: trained on {stats['rows']} rows, "
+                       f"{len(stats['classes'])} categories")
+        else:
+            click.echo(f"user {uid}: not enough categorised history, using keyword rules")
+
+
+app.cli.add_command(categories_cli)
+
+
 # ================= LOGOUT =================
 @app.route("/logout")
 @login_required
@@ -924,6 +1313,4 @@ def logout():
 
 
 if __name__ == "__main__":
-    with app.app_context():
-        db.create_all()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""Shared helpers for the benchmark scripts (not imported by the app)."""
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from flask import Flask
+from models import db
+
+CATEGORIES = ["Food", "Transport", "Shopping", "Entertainment", "Bills", "Study", "Other"]
+MERCHANTS = [
+    "swiggy order", "zomato dinner", "uber trip", "ola ride", "amazon purchase",
+    "flipkart sale", "netflix subscription", "electricity bill", "rent payment",
+    "book store", "petrol pump", "cafe coffee", "local market", "pharmacy",
+]
+
+
+def make_app(path=None):
+    """A minimal Flask app bound to a throwaway SQLite file."""
+    if path is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="expense-bench-"), "bench.db")
+
+    app = Flask("bench")
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app, path
+
+
+def generate_rows(rows, users=20, events_per_user=5, days=3 * 365, seed=7):
+    """Yield expense tuples matching ``INSERT_EXPENSE``."""
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=days)
+
+    for _ in range(rows):
+        user_id = rng.randint(1, users)
+        event_id = None
+        if rng.random() < 0.2:
+            event_id = (user_id - 1) * events_per_user + rng.randint(1, events_per_user)
+
+        income = rng.random() < 0.08
+        yield (
+            user_id,
+            event_id,
+            round(rng.lognormvariate(6, 1.1), 2),
+            rng.choice(CATEGORIES),
+            rng.choice(MERCHANTS),
+            (start + timedelta(days=rng.randrange(days))).isoformat(),
+            "income" if income else "expense",
+            rng.choice(["Cash", "Bank", "Card"]),
+        )
+
+
+INSERT_EXPENSE = (
+    "INSERT INTO expense (user_id, event_id, amount, category, description, date, "
+    "transaction_type, account) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+
+def seed_database(rows, users=20, events_per_user=5, chunk=50_000):
+    """Create users, events, one budget per user and ``rows`` expenses."""
+    raw = db.engine.raw_connection()
+    cur = raw.cursor()
+
+    cur.executemany(
+        "INSERT INTO user (id, username, email, password) VALUES (?, ?, ?, 'x')",
+        [(u, f"user{u}", f"user{u}@example.com") for u in range(1, users + 1)]
+    )
+    cur.executemany(
+        "INSERT INTO event (id, name, created_by, budget_limit) VALUES (?, ?, ?, 10000)",
+        [((u - 1) * events_per_user + e, f"event {e}", u)
+         for u in range(1, users + 1) for e in range(1, events_per_user + 1)]
+    )
+    cur.executemany(
+        "INSERT INTO budget (user_id, monthly_limit, budget_type) VALUES (?, 50000, 'personal')",
+        [(u,) for u in range(1, users + 1)]
+    )
+
+    batch = []
+    for row in generate_rows(rows, users, events_per_user):
+        batch.append(row)
+        if len(batch) >= chunk:
+            cur.executemany(INSERT_EXPENSE, batch)
+            batch.clear()
+    if batch:
+        cur.executemany(INSERT_EXPENSE, batch)
+
+    raw.commit()
+    raw.close()
+
+
+def timed(fn, repeat=5):
+    """Best-of-``repeat`` wall time in milliseconds and the last result."""
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def rows_arg(default):
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=default)
+    return parser.parse_args().rows
@@ -0,0 +1,63 @@
+"""Per-view cost of the old three-query aggregates vs analytics.summarize.
+
+    python benchmarks/bench_analytics.py --rows 200000
+"""
+from _common import make_app, seed_database, timed, rows_arg, db
+
+import aggregates
+import analytics
+import rollups
+import search
+
+USER = 3
+EVENT = 12
+
+VIEWS = {
+    "dashboard": ((), {}),
+    "dashboard ?month": ((), {"since": None, "before": None}),
+    "dashboard ?search": ("search", {}),
+    "event_analytics": ((), {"event_id": EVENT}),
+    "set_budget": ((), {"event_id": None}),
+}
+
+
+def old_path(criteria, filters):
+    return (
+        aggregates.type_summary(USER, *criteria, **filters),
+        aggregates.category_totals(USER, *criteria, **filters),
+        aggregates.daily_totals(USER, *criteria, **filters),
+    )
+
+
+def new_path(criteria, filters):
+    return analytics.summarize(USER, *criteria, **filters)
+
+
+def main():
+    rows = rows_arg(200_000)
+    app, path = make_app()
+
+    with app.app_context():
+        db.create_all()
+        print(f"Seeding {rows:,} expenses into {path}")
+        seed_database(rows)
+        rollups.rebuild()
+        with db.engine.begin() as conn:
+            search.install(conn)
+            search.rebuild(conn)
+
+        last_month = max(day for day, _ in aggregates.daily_totals(USER)).replace(day=1)
+        VIEWS["dashboard ?month"][1].update(since=last_month.replace(month=last_month.month - 1 or 12),
+                                            before=last_month)
+
+        print(f"\n{'view':<20}{'3 queries ms':>14}{'1 query ms':>12}")
+        for name, (criteria, filters) in VIEWS.items():
+            criteria = [aggregates.search_filter(USER, "swig")] if criteria == "search" else []
+            old_ms, _ = timed(lambda: old_path(criteria, filters))
+            new_ms, summary = timed(lambda: new_path(criteria, filters))
+            print(f"{name:<20}{old_ms:>14.2f}{new_ms:>12.2f}   "
+                  f"({summary.transactions:,} rows, {len(summary.daily_totals)} days)")
+
+
+if __name__ == "__main__":
+    main()
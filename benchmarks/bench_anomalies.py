@@ -0,0 +1,81 @@
+"""Incremental anomaly scoring cost as new expenses arrive.
+
+    python benchmarks/bench_anomalies.py --rows 1000000
+
+Seeds one user with ``--rows`` expenses and runs the first full pass,
+then appends batches of increasing size and times ``anomalies.update``
+on each. A batch only pays for its own rows unless it grows a category
+by more than REFIT_GROWTH, when that category's median/MAD is refitted.
+"""
+import argparse
+import time
+
+from sqlalchemy import text
+
+from _common import make_app, seed_database, generate_rows, INSERT_EXPENSE, db
+
+import anomalies
+from models import Anomaly, AnomalyScan, CategoryStats
+
+USER = 1
+BATCHES = (10, 100, 1_000, 10_000, 100_000)
+
+
+def append(rows, seed):
+    raw = db.engine.raw_connection()
+    raw.cursor().executemany(INSERT_EXPENSE, generate_rows(rows, users=1, events_per_user=1, seed=seed))
+    raw.commit()
+    raw.close()
+
+
+def fitted_counts():
+    return {s.category: s.fitted_count for s in CategoryStats.query.filter_by(user_id=USER)}
+
+
+def update():
+    before = fitted_counts()
+    started = time.perf_counter()
+    flagged = anomalies.update(USER)
+    elapsed = (time.perf_counter() - started) * 1000
+    refitted = sum(1 for category, count in fitted_counts().items() if before.get(category) != count)
+    return elapsed, flagged, refitted
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    rows = parser.parse_args().rows
+
+    app, path = make_app()
+    with app.app_context():
+        db.create_all()
+        seed_database(rows, users=1, events_per_user=1)
+
+        plan = db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT id, category, amount FROM expense "
+            "WHERE id > 1 AND user_id = 1 AND transaction_type = 'expense'"
+        )).all()
+        print(f"new-row scan: {plan[-1][-1]}")
+
+        print(f"\n{rows:,} rows for one user")
+        print(f"{'batch':>10}{'update':>12}{'per row':>12}{'flagged':>10}{'refits':>8}")
+
+        elapsed, flagged, refitted = update()
+        print(f"{'initial':>10}{elapsed:>9.0f} ms{elapsed * 1000 / rows:>9.2f} µs{flagged:>10,}{refitted:>8}")
+
+        for seed, batch in enumerate(BATCHES, start=100):
+            append(batch, seed)
+            elapsed, flagged, refitted = update()
+            print(f"{batch:>10,}{elapsed:>9.1f} ms{elapsed * 1000 / batch:>9.2f} µs{flagged:>10,}{refitted:>8}")
+
+        # Nothing new: the cost of a no-op run triggered by an unrelated write.
+        elapsed, _, _ = update()
+        print(f"{'no-op':>10}{elapsed:>9.1f} ms")
+
+        total = Anomaly.query.filter_by(user_id=USER).count()
+        scan = AnomalyScan.query.filter_by(user_id=USER).one()
+        print(f"\n{total:,} flagged in all; watermark at expense {scan.last_expense_id:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Training time and batch latency of the learned categoriser.
+
+    python benchmarks/bench_category_model.py --rows 50000
+"""
+import os
+import random
+import time
+
+from _common import make_app, rows_arg, db
+
+import category_model
+from categories import default_classifier
+from models import User, Expense
+
+MERCHANTS = {
+    "Food": ["swiggy", "zomato", "dominos pizza", "starbucks", "chai point", "bakery"],
+    "Transport": ["uber", "ola cabs", "irctc", "metro card", "indian oil", "rapido"],
+    "Shopping": ["amazon", "flipkart", "myntra", "decathlon", "ikea", "croma"],
+    "Entertainment": ["netflix", "bookmyshow", "spotify", "hotstar", "pvr cinemas"],
+    "Bills": ["bescom electricity", "airtel postpaid", "jio recharge", "water board", "rent"],
+    "Health": ["apollo pharmacy", "practo", "cult fit", "medplus"],
+}
+
+
+def description(rng, merchant):
+    noise = rng.choice(["", " upi", " pos", " ref", " txn", " online"])
+    return f"{merchant.upper() if rng.random() < 0.3 else merchant}{noise} {rng.randint(1000, 99999)}"
+
+
+def samples(rng, count):
+    for _ in range(count):
+        category = rng.choice(list(MERCHANTS))
+        yield description(rng, rng.choice(MERCHANTS[category])), category
+
+
+def main():
+    rows = rows_arg(50_000)
+    rng = random.Random(3)
+    app, path = make_app()
+    app.config["CATEGORY_MODEL_FOLDER"] = os.path.join(os.path.dirname(path), "models")
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="bench", email="bench@example.com", password="x"))
+        db.session.execute(Expense.__table__.insert(), [
+            {"user_id": 1, "amount": 1.0, "description": text, "category": category}
+            for text, category in samples(rng, rows)
+        ])
+        db.session.commit()
+
+        started = time.perf_counter()
+        stats = category_model.train(1)
+        print(f"train on {stats['rows']:,} rows: {time.perf_counter() - started:.2f} s")
+
+        held_out = list(samples(rng, 10_000))
+        texts = [text for text, _ in held_out]
+
+        category_model.classify_many(1, texts[:10])  # load the model once
+        for label, fn in (
+            ("learned model", lambda: category_model.classify_many(1, texts)),
+            ("keyword rules", lambda: default_classifier.classify_many(texts)),
+        ):
+            started = time.perf_counter()
+            predicted = fn()
+            elapsed = (time.perf_counter() - started) * 1000
+            accuracy = sum(p == c for p, (_, c) in zip(predicted, held_out)) / len(held_out)
+            print(f"{label:<14} {elapsed:8.1f} ms per 10k descriptions  accuracy {accuracy:.1%}")
+
+
+if __name__ == "__main__":
+    main()
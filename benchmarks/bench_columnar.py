@@ -0,0 +1,106 @@
+"""ORM objects vs the NumPy columnar snapshot for one heavy user.
+
+    python benchmarks/bench_columnar.py --sizes 100000,1000000
+
+Both paths compute category totals, daily totals, the top 3 categories,
+a 7-day rolling mean and the 95th percentile amount. Peak memory is
+traced in a separate run so it doesn't distort the timings.
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import timedelta
+
+import numpy as np
+
+from _common import make_app, seed_database, db
+
+import columnar
+from models import Expense
+
+USER = 1
+
+
+def orm_path():
+    expenses = Expense.query.filter_by(user_id=USER).all()
+
+    categories = {}
+    daily = {}
+    amounts = []
+    for e in expenses:
+        if e.transaction_type != "expense":
+            continue
+        categories[e.category] = categories.get(e.category, 0) + e.amount
+        if e.date:
+            daily[e.date] = daily.get(e.date, 0) + e.amount
+        amounts.append(e.amount)
+
+    top = sorted(categories.items(), key=lambda item: -item[1])[:3]
+
+    rolling = []
+    if daily:
+        day, last = min(daily), max(daily)
+        window = []
+        while day <= last:
+            window.append(daily.get(day, 0))
+            rolling.append(sum(window[-7:]) / min(len(window), 7))
+            day += timedelta(days=1)
+
+    amounts.sort()
+    p95 = amounts[int(round(0.95 * (len(amounts) - 1)))] if amounts else None
+    return categories, daily, top, rolling, p95
+
+
+def snapshot_path():
+    snapshot = columnar.load(USER)
+    return (
+        snapshot.group_sum("category"),
+        snapshot.group_sum("date"),
+        snapshot.top_k(3),
+        snapshot.rolling(7),
+        snapshot.percentile(95),
+        snapshot,
+    )
+
+
+def run(label, fn):
+    db.session.expunge_all()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = (time.perf_counter() - started) * 1000
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    db.session.expunge_all()
+
+    print(f"  {label:<10}{elapsed:>10.0f} ms{peak:>10.1f} MB peak")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100000,1000000")
+    sizes = [int(size) for size in parser.parse_args().sizes.split(",")]
+
+    for rows in sizes:
+        app, path = make_app()
+        with app.app_context():
+            db.create_all()
+            seed_database(rows, users=1, events_per_user=1)
+
+            print(f"\n{rows:,} rows for one user")
+            orm = run("orm", orm_path)
+            snap = run("snapshot", snapshot_path)
+
+            top_orm = [name for name, _ in orm[2]]
+            top_snap = [name for name, _ in snap[2]]
+            assert top_orm == top_snap, (top_orm, top_snap)
+            assert np.allclose(snap[3][1], orm[3])
+            print(f"  snapshot arrays: {snap[5].nbytes / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
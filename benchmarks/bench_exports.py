@@ -0,0 +1,72 @@
+"""Bulk export throughput and peak Python memory per format.
+
+    python benchmarks/bench_exports.py --rows 1000000 [--memory]
+
+Seeds one user with ``--rows`` expenses and drains ``exports.stream`` for
+the last month, the last year and everything, discarding each chunk as a
+streamed response would after sending it. With --memory the peak column
+should stay flat as the row count grows (a chunk at a time); it slows
+everything down, so leave it off when comparing rows/sec.
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import timedelta
+
+from _common import make_app, seed_database, db
+
+import aggregates
+import exports
+import rollups
+
+USER = 1
+
+
+def drain(fmt, filters):
+    size = 0
+    for chunk in exports.stream("expenses", fmt, USER, **filters):
+        size += len(chunk)
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--memory", action="store_true")
+    args = parser.parse_args()
+
+    app, path = make_app()
+    with app.app_context():
+        db.create_all()
+        seed_database(args.rows, users=1, events_per_user=1)
+        rollups.rebuild()
+
+        last = max(day for day, _ in aggregates.daily_totals(USER)) + timedelta(days=1)
+        ranges = {
+            "last month": {"since": last - timedelta(days=30), "before": last},
+            "last year": {"since": last - timedelta(days=365), "before": last},
+            "all time": {},
+        }
+
+        print(f"{args.rows:,} expenses for one user, chunks of {exports.EXPORT_CHUNK:,}\n")
+        print(f"{'format':<9}{'range':<12}{'rows':>11}{'size':>11}{'time':>10}{'rows/s':>11}{'peak':>11}")
+
+        for fmt in exports.FORMATS:
+            for name, filters in ranges.items():
+                _, _, rows = aggregates.type_summary(USER, **filters)
+
+                if args.memory:
+                    tracemalloc.start()
+                started = time.perf_counter()
+                size = drain(fmt, filters)
+                elapsed = time.perf_counter() - started
+                peak = f"{tracemalloc.get_traced_memory()[1] / 1e6:>8.1f} MB" if args.memory else f"{'-':>11}"
+                if args.memory:
+                    tracemalloc.stop()
+
+                print(f"{fmt:<9}{name:<12}{rows:>11,}{size / 1e6:>8.1f} MB{elapsed:>8.2f} s"
+                      f"{rows / elapsed:>11,.0f}{peak}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Rows/sec and peak Python memory of the CSV import paths.
+
+    python benchmarks/bench_import.py --rows 200000 [--memory]
+
+--memory traces Python allocations for the peak column; it slows every
+path down a lot, so leave it off when comparing rows/sec.
+"""
+import argparse
+import io
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+from _common import make_app, generate_rows, db
+
+import importer
+from models import User, Expense
+
+
+def make_csv(rows):
+    buffer = io.StringIO()
+    buffer.write("date,description,amount,category\n")
+
+    for i, row in enumerate(generate_rows(rows)):
+        _, _, amount, category, description, day, _, _ = row
+        if i % 3 == 0:
+            day = datetime.strptime(day, "%Y-%m-%d").strftime("%d-%m-%Y")
+        if i % 2 == 0:
+            category = ""
+        buffer.write(f"{day},{description},{amount},{category}\n")
+
+    return buffer.getvalue().encode()
+
+
+def legacy_import(data, user_id):
+    """The pre-vectorisation loop from app.import_csv (iterrows + ORM adds)."""
+    df = importer.normalise_columns(pd.read_csv(io.BytesIO(data)))
+    count = 0
+
+    for _, row in df.iterrows():
+        try:
+            try:
+                parsed_date = datetime.strptime(str(row.get("date")), "%Y-%m-%d")
+            except Exception:
+                parsed_date = datetime.strptime(str(row.get("date")), "%d-%m-%Y")
+
+            db.session.add(Expense(
+                user_id=user_id,
+                amount=float(row.get("amount", 0)),
+                category=row.get("category", "Other"),
+                description=row.get("description", ""),
+                date=parsed_date.date(),
+                transaction_type=row.get("transaction_type") or "expense",
+                account=row.get("account", "Bank")
+            ))
+            count += 1
+        except Exception:
+            continue
+
+    db.session.commit()
+    return count
+
+
+def vectorised_import(data, user_id):
+    df = importer.normalise_columns(pd.read_csv(io.BytesIO(data)))
+    result = importer.import_frame(df, user_id)
+    db.session.commit()
+    return result.inserted
+
+
+def streamed_import(data, user_id):
+    return importer.stream_import(io.BytesIO(data), user_id, "bench.csv").inserted
+
+
+def run(label, fn, data, memory=False):
+    app, _ = make_app()
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(id=1, username="bench", email="bench@example.com", password="x"))
+        db.session.commit()
+
+        if memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        inserted = fn(data, 1)
+        elapsed = time.perf_counter() - started
+
+        line = f"{label:<12} {inserted:>9,} rows  {elapsed:8.2f} s  {inserted / elapsed:>10,.0f} rows/s"
+        if memory:
+            line += f"  peak {tracemalloc.get_traced_memory()[1] / 1e6:7.1f} MB"
+            tracemalloc.stop()
+
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--memory", action="store_true")
+    args = parser.parse_args()
+
+    data = make_csv(args.rows)
+    print(f"CSV: {args.rows:,} rows, {len(data) / 1e6:.1f} MB")
+
+    run("legacy", legacy_import, data, args.memory)
+    run("vectorised", vectorised_import, data, args.memory)
+    run("streamed", streamed_import, data, args.memory)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Query plans and timings for the hot queries before/after migration 3.
+
+    python benchmarks/bench_indexes.py --rows 1000000
+"""
+from _common import make_app, seed_database, timed, rows_arg, db
+
+from sqlalchemy import text
+import migrations
+from models import Expense, Budget, Event
+
+QUERIES = {
+    "totals by type": (
+        "SELECT transaction_type, SUM(amount), COUNT(id) FROM expense "
+        "WHERE user_id = :user GROUP BY transaction_type"
+    ),
+    "event category totals": (
+        "SELECT category, SUM(amount) FROM expense "
+        "WHERE user_id = :user AND event_id = :event AND transaction_type = 'expense' "
+        "GROUP BY category"
+    ),
+    "category filter": (
+        "SELECT COUNT(*) FROM expense WHERE user_id = :user AND category = 'Food'"
+    ),
+    "date range": (
+        "SELECT date, SUM(amount) FROM expense "
+        "WHERE user_id = :user AND date >= '2025-01-01' AND date < '2025-02-01' "
+        "GROUP BY date"
+    ),
+    "budget lookup": (
+        "SELECT * FROM budget WHERE user_id = :user AND event_id IS NULL LIMIT 1"
+    ),
+    "events by owner": (
+        "SELECT * FROM event WHERE created_by = :user ORDER BY id DESC"
+    ),
+}
+PARAMS = {"user": 3, "event": 12}
+
+
+def measure(label):
+    print(f"\n===== {label} =====")
+    with db.engine.connect() as conn:
+        for name, sql in QUERIES.items():
+            plan = conn.execute(text("EXPLAIN QUERY PLAN " + sql), PARAMS).all()
+            ms, _ = timed(lambda: conn.execute(text(sql), PARAMS).all())
+            print(f"{name:<24} {ms:9.2f} ms")
+            for row in plan:
+                print(f"{'':<26}{row[-1]}")
+
+
+def main():
+    rows = rows_arg(1_000_000)
+    app, path = make_app()
+
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conn:
+            for model in (Expense, Budget, Event):
+                for index in model.__table__.indexes:
+                    index.drop(conn)
+
+        print(f"Seeding {rows:,} expenses into {path}")
+        seed_database(rows)
+        measure("before (primary keys only)")
+
+        ms, _ = timed(lambda: _create_indexes(), repeat=1)
+        print(f"\nmigration 3 built indexes in {ms:.0f} ms")
+        measure("after migration 3")
+
+
+def _create_indexes():
+    with db.engine.begin() as conn:
+        migrations._add_access_indexes(conn)
+        conn.execute(text("ANALYZE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Statement PDF generation time, peak Python memory and peak RSS.
+
+    python benchmarks/bench_reports.py --rows 100000 [--memory]
+
+Seeds one user with ``--rows`` expenses and draws statements for the last
+month, the last year and all time. For comparison, "load all" is the old
+export's first step alone: ``Expense.query...all()`` for the user.
+--memory traces allocations for the peak column (slower; leave it off
+when comparing times). "rss" is the process's peak resident size during
+each step; on kernels that can't reset it, it is the peak so far.
+"""
+import argparse
+import io
+import resource
+import time
+import tracemalloc
+from datetime import timedelta
+
+from _common import make_app, seed_database, db
+
+import aggregates
+import reports
+import rollups
+from models import Expense
+
+USER = 1
+
+
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")  # Linux 4.0+: restart the ru_maxrss high-water mark
+    except OSError:
+        pass
+
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3  # KB on Linux
+
+
+def measure(fn, memory):
+    if memory:
+        tracemalloc.start()
+    reset_peak_rss()
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] / 1e6 if memory else None
+    if memory:
+        tracemalloc.stop()
+    return elapsed, peak, peak_rss(), result
+
+
+def statement(filters):
+    output = io.BytesIO()
+    rows = reports.statement_pdf(USER, output, **filters)
+    return rows, output.getbuffer().nbytes, output.getvalue().count(b"/Type /Page\n")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--memory", action="store_true")
+    args = parser.parse_args()
+
+    app, path = make_app()
+    with app.app_context():
+        db.create_all()
+        seed_database(args.rows, users=1, events_per_user=1)
+        rollups.rebuild()
+
+        last = max(day for day, _ in aggregates.daily_totals(USER)) + timedelta(days=1)
+        ranges = {
+            "last month": {"since": last - timedelta(days=30), "before": last},
+            "last year": {"since": last - timedelta(days=365), "before": last},
+            "all time": {},
+        }
+
+        print(f"{args.rows:,} expenses for one user\n")
+        print(f"{'statement':<12}{'rows':>9}{'pages':>7}{'size':>10}{'time':>10}{'rows/s':>10}"
+              f"{'peak':>10}{'rss':>10}")
+
+        for name, filters in ranges.items():
+            elapsed, peak, rss, (rows, size, pages) = measure(lambda: statement(filters), args.memory)
+            peak = f"{peak:>7.1f} MB" if peak is not None else f"{'-':>10}"
+            print(f"{name:<12}{rows:>9,}{pages:>7,}{size / 1e6:>7.1f} MB{elapsed:>8.2f} s"
+                  f"{rows / elapsed:>10,.0f}{peak}{rss:>7.1f} MB")
+
+        elapsed, peak, rss, expenses = measure(lambda: Expense.query.filter_by(user_id=USER).all(), args.memory)
+        peak = f"{peak:>7.1f} MB" if peak is not None else f"{'-':>10}"
+        print(f"{'load all':<12}{len(expenses):>9,}{'':>7}{'':>10}{elapsed:>8.2f} s{'':>10}{peak}{rss:>7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""FTS5 search (migration 8) against the old ``ilike('%q%')`` scan.
+
+    python benchmarks/bench_search.py --rows 1000000
+"""
+from _common import make_app, seed_database, timed, rows_arg, db
+
+from sqlalchemy import func, or_
+import search
+from models import Expense
+
+USER = 3
+QUERIES = ["swig", "pharmacy", "netflix sub", "bill", "nomatch"]
+
+
+def ilike_filter(search_query):
+    columns = [getattr(Expense, name) for name in search.EXPENSE_COLUMNS]
+    return or_(*(column.ilike(f"%{search_query}%") for column in columns))
+
+
+def run(criterion):
+    base = db.session.query(Expense).filter(Expense.user_id == USER, criterion)
+    count = base.with_entities(func.count(Expense.id), func.sum(Expense.amount)).one()
+    page = base.order_by(Expense.date.desc(), Expense.id.desc()).limit(50).all()
+    return count[0], len(page)
+
+
+def main():
+    rows = rows_arg(1_000_000)
+    app, path = make_app()
+
+    with app.app_context():
+        db.create_all()
+        print(f"Seeding {rows:,} expenses into {path}")
+        seed_database(rows)
+
+        def build():
+            with db.engine.begin() as conn:
+                search.install(conn)
+                search.rebuild(conn)
+
+        ms, _ = timed(build, repeat=1)
+        print(f"built the FTS index in {ms:.0f} ms\n")
+
+        print(f"{'query':<14}{'matches':>9}{'ilike ms':>11}{'fts ms':>9}{'speed-up':>10}")
+        for search_query in QUERIES:
+            ilike_ms, (matches, _) = timed(lambda: run(ilike_filter(search_query)))
+            fts_ms, (fts_matches, _) = timed(lambda: run(search.expense_filter(USER, search_query)))
+            print(f"{search_query:<14}{matches:>9,}{ilike_ms:>11.2f}{fts_ms:>9.2f}"
+                  f"{ilike_ms / fts_ms:>9.1f}x")
+            if matches != fts_matches:
+                print(f"{'':<14}(fts matched {fts_matches:,}: prefix terms, all columns)")
+
+
+if __name__ == "__main__":
+    main()
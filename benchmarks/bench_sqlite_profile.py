@@ -0,0 +1,172 @@
+"""Mixed read/write throughput under each SQLite profile (config.py).
+
+    python benchmarks/bench_sqlite_profile.py --rows 200000 --workers 4 --seconds 10
+
+Each profile gets its own copy of a seeded database. ``--workers``
+processes stand in for gunicorn sync workers: each loops over dashboard
+style reads (a category breakdown and the latest page of expenses) and,
+``--writes`` of the time, a single-expense insert. One more process runs
+an import alongside them, committing IMPORT_CHUNK rows at a time.
+Reported per profile: operations per second, read latency percentiles,
+the import's rows per second and any "database is locked" errors.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import time
+from datetime import date, timedelta
+
+from flask import Flask
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from _common import make_app, seed_database, generate_rows, INSERT_EXPENSE, db
+
+import database
+
+USERS = 20
+IMPORT_CHUNK = 5_000
+
+BREAKDOWN = text(
+    "SELECT category, SUM(amount) FROM expense WHERE user_id = :user AND date >= :since "
+    "AND transaction_type = 'expense' GROUP BY category"
+)
+LATEST = text(
+    "SELECT id, date, description, category, amount FROM expense WHERE user_id = :user "
+    "ORDER BY date DESC, id DESC LIMIT 50"
+)
+INSERT = text(
+    "INSERT INTO expense (user_id, amount, category, description, date, transaction_type, account) "
+    "VALUES (:user, :amount, 'Food', 'bench', :day, 'expense', 'Cash')"
+)
+
+
+def make_profile_app(path, profile):
+    app = Flask("bench")
+    app.config.from_object("config")
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{path}"
+    app.config["SQLITE_PROFILE"] = profile
+    database.init_app(app)
+    return app
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+# ================= WORKERS =================
+def web_worker(path, profile, seconds, writes, seed, results):
+    app = make_profile_app(path, profile)
+    rng = random.Random(seed)
+    since = (date.today() - timedelta(days=90)).isoformat()
+    reads, inserts, errors, latencies = 0, 0, 0, []
+
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            user = rng.randint(1, USERS)
+            started = time.perf_counter()
+            try:
+                if rng.random() < writes:
+                    db.session.execute(INSERT, {
+                        "user": user, "amount": rng.randint(10, 500), "day": date.today().isoformat()
+                    })
+                    db.session.commit()
+                    inserts += 1
+                else:
+                    db.session.execute(BREAKDOWN, {"user": user, "since": since}).all()
+                    db.session.execute(LATEST, {"user": user}).all()
+                    db.session.commit()
+                    reads += 1
+                    latencies.append(time.perf_counter() - started)
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+
+    results.put(("web", reads, inserts, errors, latencies))
+
+
+def import_worker(path, profile, seconds, results):
+    app = make_profile_app(path, profile)
+    rows = generate_rows(10_000_000, users=USERS, events_per_user=1, seed=99)
+    imported, errors = 0, 0
+
+    with app.app_context():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            chunk = [next(rows) for _ in range(IMPORT_CHUNK)]
+            try:
+                raw = db.session.connection().connection.dbapi_connection
+                raw.cursor().executemany(INSERT_EXPENSE, chunk)
+                db.session.commit()
+                imported += len(chunk)
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+
+    results.put(("import", imported, errors))
+
+
+# ================= RUN =================
+def run(path, profile, args):
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=web_worker, args=(path, profile, args.seconds, args.writes, seed, results))
+        for seed in range(args.workers)
+    ]
+    processes.append(context.Process(target=import_worker, args=(path, profile, args.seconds, results)))
+
+    for process in processes:
+        process.start()
+    collected = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    web = [r for r in collected if r[0] == "web"]
+    _, imported, import_errors = next(r for r in collected if r[0] == "import")
+    latencies = [latency for r in web for latency in r[4]]
+    return {
+        "reads": sum(r[1] for r in web) / args.seconds,
+        "inserts": sum(r[2] for r in web) / args.seconds,
+        "p50": percentile(latencies, 0.5) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "imported": imported / args.seconds,
+        "errors": sum(r[3] for r in web) + import_errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writes", type=float, default=0.2, help="share of web operations that insert")
+    args = parser.parse_args()
+
+    app, seeded = make_app()
+    with app.app_context():
+        db.create_all()
+        seed_database(args.rows, users=USERS, events_per_user=1)
+        db.engine.dispose()
+
+    print(f"{args.rows:,} rows, {args.workers} web workers + 1 importer, "
+          f"{args.writes:.0%} writes, {args.seconds:g} s per profile\n")
+    print(f"{'profile':<13}{'reads/s':>10}{'inserts/s':>11}{'read p50':>11}{'read p99':>11}"
+          f"{'import rows/s':>15}{'locked':>8}")
+
+    for profile in ("default", "performance"):
+        path = os.path.join(os.path.dirname(seeded), f"{profile}.db")
+        shutil.copyfile(seeded, path)
+        r = run(path, profile, args)
+        print(f"{profile:<13}{r['reads']:>10,.0f}{r['inserts']:>11,.0f}{r['p50']:>8.1f} ms"
+              f"{r['p99']:>8.1f} ms{r['imported']:>15,.0f}{r['errors']:>8}")
+
+
+if __name__ == "__main__":
+    main()
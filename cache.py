@@ -0,0 +1,210 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request, make_response
+from flask_login import current_user
+from models import User
+
+# Rendered pages are cached per user under a key that includes the user's
+# data version. Every write path calls bump(), which moves the user onto
+# a new version, so stale entries are never read again and simply age out.
+# Nothing has to be deleted or broadcast, and that keeps the on-disk tier
+# safe to share between gunicorn workers. Jobs that only refresh derived
+# insights (forecast, anomaly flags) call bump_insights() instead: the
+# forecast compares itself against data_version to tell it is stale.
+
+
+# ================= DATA VERSION =================
+def bump(user_id):
+    """Invalidate ``user_id``'s cached pages (inside the caller's transaction)."""
+    User.query.filter_by(id=user_id).update(
+        {User.data_version: User.data_version + 1},
+        synchronize_session=False
+    )
+
+
+def bump_insights(user_id):
+    """Invalidate cached pages after a job refreshed the user's insights."""
+    User.query.filter_by(id=user_id).update(
+        {User.insights_version: User.insights_version + 1},
+        synchronize_session=False
+    )
+
+
+def page_version(user):
+    return f"{user.data_version or 0}.{user.insights_version or 0}"
+
+
+# ================= MEMORY TIER =================
+class LRUCache:
+    """Thread-safe ``OrderedDict`` LRU holding at most ``max_entries`` items."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+_memory = LRUCache(256)
+
+
+def init_app(app):
+    app.config.setdefault("RESPONSE_CACHE_SIZE", 256)
+    app.config.setdefault("RESPONSE_CACHE_TTL", 600)
+    app.config.setdefault("RESPONSE_CACHE_DIR", None)
+
+    _memory.max_entries = app.config["RESPONSE_CACHE_SIZE"]
+    if app.config["RESPONSE_CACHE_DIR"]:
+        os.makedirs(app.config["RESPONSE_CACHE_DIR"], exist_ok=True)
+
+
+# ================= DISK TIER =================
+# <dir>/user_<id>/<version>/<key> holding "<mimetype>\n<body>".
+
+def _user_dir(user_id):
+    return os.path.join(current_app.config["RESPONSE_CACHE_DIR"], f"user_{user_id}")
+
+
+def _disk_get(user_id, version, key):
+    path = os.path.join(_user_dir(user_id), str(version), key)
+    try:
+        with open(path, "rb") as handle:
+            mimetype, _, body = handle.read().partition(b"\n")
+    except FileNotFoundError:
+        return None
+    return mimetype.decode(), body
+
+
+def _disk_set(user_id, version, key, mimetype, body):
+    user_dir = _user_dir(user_id)
+    folder = os.path.join(user_dir, str(version))
+    os.makedirs(folder, exist_ok=True)
+
+    # Write then rename so another worker never reads half a page.
+    path = os.path.join(folder, key)
+    with open(path + f".{os.getpid()}.tmp", "wb") as handle:
+        handle.write(mimetype.encode() + b"\n" + body)
+    os.replace(path + f".{os.getpid()}.tmp", path)
+
+    _prune(user_dir, str(version))
+
+
+def _prune(user_dir, keep):
+    """Drop older versions and entries from past TTL windows."""
+    expired = time.time() - current_app.config["RESPONSE_CACHE_TTL"]
+
+    for entry in os.scandir(user_dir):
+        if entry.name != keep:
+            _remove_tree(entry.path)
+            continue
+        for item in os.scandir(entry.path):
+            if item.stat().st_mtime < expired:
+                _remove(item.path)
+
+
+def _remove_tree(folder):
+    for item in os.scandir(folder):
+        _remove(item.path)
+    try:
+        os.rmdir(folder)
+    except OSError:
+        pass  # another worker is writing into it
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# ================= VIEW DECORATOR =================
+def cache_key(user_id, version):
+    """Hash of (endpoint, view args, query args, user, page version, TTL window).
+
+    The TTL window bounds how long time-dependent numbers (e.g. "last 30
+    days") can be served from cache when the user makes no writes.
+    """
+    window = int(time.time() // current_app.config["RESPONSE_CACHE_TTL"])
+    parts = (
+        request.endpoint,
+        sorted((request.view_args or {}).items()),
+        sorted(request.args.items(multi=True)),
+        user_id,
+        version,
+        window,
+    )
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def cached(view):
+    """Serve GET responses from the per-user cache, with ETag/304 support.
+
+    Place below ``@login_required``. Only 200 responses are stored.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != "GET" or not current_user.is_authenticated:
+            return view(*args, **kwargs)
+
+        user_id = current_user.id
+        version = page_version(current_user)
+        key = cache_key(user_id, version)
+
+        if key in request.if_none_match:
+            response = current_app.response_class(status=304)
+            return _finish(response, key, "revalidated")
+
+        entry = _memory.get(key)
+        state = "hit"
+
+        if entry is None and current_app.config["RESPONSE_CACHE_DIR"]:
+            entry = _disk_get(user_id, version, key)
+            if entry is not None:
+                _memory.set(key, entry)
+
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.direct_passthrough:
+                return response
+
+            entry = (response.mimetype, response.get_data())
+            _memory.set(key, entry)
+            if current_app.config["RESPONSE_CACHE_DIR"]:
+                _disk_set(user_id, version, key, *entry)
+            state = "miss"
+
+        mimetype, body = entry
+        return _finish(current_app.response_class(body, mimetype=mimetype), key, state)
+
+    return wrapper
+
+
+def _finish(response, key, state):
+    response.set_etag(key)
+    # private: per-user pages; no-cache: browsers revalidate with If-None-Match.
+    response.headers["Cache-Control"] = "private, no-cache"
+    response.headers["X-Cache"] = state
+    return response
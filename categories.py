@@ -0,0 +1,157 @@
+import re
+import threading
+from functools import lru_cache
+
+from models import db, CategoryRule
+
+# Earlier categories win when a description matches several.
+DEFAULT_KEYWORDS = {
+    "Food": ["swiggy", "zomato", "restaurant", "cafe", "food"],
+    "Transport": ["uber", "ola", "bus", "train", "petrol"],
+    "Shopping": ["amazon", "flipkart", "mall"],
+    "Entertainment": ["netflix", "movie", "spotify"],
+    "Bills": ["electricity", "water", "rent"],
+    "Study": ["book", "course"]
+}
+
+FALLBACK_CATEGORY = "Other"
+
+
+def normalise(description):
+    return " ".join(str(description).lower().split()) if description else ""
+
+
+# ================= CLASSIFIER =================
+class CategoryClassifier:
+    """Keyword classifier compiled once into a single regex.
+
+    ``rules`` is an iterable of ``(keyword, category)`` in priority order.
+    Matching keeps the old ``detect_category`` semantics (substring match,
+    the highest-priority category wins) but scans each description once
+    instead of once per keyword, and caches results per normalised
+    description because merchant strings repeat heavily.
+    """
+
+    def __init__(self, rules, cache_size=8192):
+        self._best = {}
+
+        for rank, (keyword, category) in enumerate(rules):
+            keyword = normalise(keyword)
+            if keyword and keyword not in self._best:
+                self._best[keyword] = (rank, category)
+
+        keywords = sorted(self._best, key=len, reverse=True)
+
+        # The regex reports the longest keyword at each position; fold any
+        # shorter keyword that is a prefix of it into its result so a
+        # higher-priority prefix is never hidden.
+        for keyword in keywords:
+            for other in keywords:
+                if other != keyword and keyword.startswith(other):
+                    self._best[keyword] = min(self._best[keyword], self._best[other])
+
+        self._pattern = None
+        if keywords:
+            self._pattern = re.compile(
+                "(?=(" + "|".join(re.escape(k) for k in keywords) + "))"
+            )
+
+        self._cached = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, text):
+        if not text or self._pattern is None:
+            return None
+
+        best = None
+        for match in self._pattern.finditer(text):
+            found = self._best[match.group(1)]
+            if best is None or found < best:
+                best = found
+                if best[0] == 0:
+                    break
+
+        return best[1] if best else None
+
+    def match(self, description):
+        """The category of the best matching keyword, or None."""
+        return self._cached(normalise(description))
+
+    def classify(self, description):
+        category = self.match(description)
+        return FALLBACK_CATEGORY if category is None else category
+
+    def classify_many(self, descriptions):
+        """Batch API for imports: each distinct description is matched once."""
+        seen = {}
+        result = []
+
+        for description in descriptions:
+            if description not in seen:
+                seen[description] = self.classify(description)
+            result.append(seen[description])
+
+        return result
+
+
+def _default_rules():
+    return [
+        (keyword, category)
+        for category, words in DEFAULT_KEYWORDS.items()
+        for keyword in words
+    ]
+
+
+default_classifier = CategoryClassifier(_default_rules())
+
+
+# ================= PER-USER CLASSIFIERS =================
+_user_classifiers = {}
+_lock = threading.Lock()
+
+
+def classifiers_for(user_id):
+    """``(own, combined)``: the user's rules alone (None without any) and
+    the default keywords plus the user's rules (which take priority).
+
+    Rebuilt only when the user's rules change. The cache is keyed on the
+    rules themselves, ``(id, keyword, category)`` in id order, read in one
+    small query: a count/max-id probe misses a rule deleted and re-added
+    with new text, because SQLite hands the freed id out again.
+    """
+    if user_id is None:
+        return None, default_classifier
+
+    version = tuple(db.session.query(
+        CategoryRule.id, CategoryRule.keyword, CategoryRule.category
+    ).filter(CategoryRule.user_id == user_id).order_by(CategoryRule.id).all())
+
+    if not version:
+        return None, default_classifier
+
+    with _lock:
+        cached = _user_classifiers.get(user_id)
+        if cached and cached[0] == version:
+            return cached[1]
+
+    own_rules = [(keyword, category) for _, keyword, category in version]
+    classifiers = (CategoryClassifier(own_rules), CategoryClassifier(own_rules + _default_rules()))
+
+    with _lock:
+        _user_classifiers[user_id] = (version, classifiers)
+
+    return classifiers
+
+
+def classifier_for(user_id):
+    """The default keywords plus the user's own rules (which take priority)."""
+    return classifiers_for(user_id)[1]
+
+
+# ================= AUTO CATEGORY =================
+def detect_category(description, user_id=None):
+    return classifier_for(user_id).classify(description)
+
+
+def detect_categories(descriptions, user_id=None):
+    """Batch form of detect_category: each distinct description is classified once."""
+    return classifier_for(user_id).classify_many(descriptions)
@@ -0,0 +1,139 @@
+import os
+import threading
+from datetime import datetime
+
+import joblib
+import numpy as np
+from flask import current_app
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import SGDClassifier
+
+from models import db, Expense
+from categories import classifiers_for, normalise, FALLBACK_CATEGORY
+
+MIN_TRAINING_ROWS = 20
+MAX_TRAINING_ROWS = 200_000
+CONFIDENCE_THRESHOLD = 0.6
+
+# Stateless, so one instance serves every user and never needs fitting.
+_vectorizer = HashingVectorizer(
+    analyzer="char_wb",
+    ngram_range=(3, 5),
+    n_features=2 ** 18,
+    alternate_sign=False,
+)
+
+_models = {}
+_lock = threading.Lock()
+
+
+# ================= STORAGE =================
+def model_path(user_id):
+    folder = current_app.config.get(
+        "CATEGORY_MODEL_FOLDER",
+        os.path.join(current_app.instance_path, "category_models")
+    )
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"user_{user_id}.joblib")
+
+
+def load(user_id):
+    """The user's fitted model, loaded once per worker.
+
+    The file's mtime is checked on every call so a retrain written by
+    another process is picked up without a restart.
+    """
+    path = model_path(user_id)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        cached = _models.get(user_id)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    bundle = joblib.load(path)
+
+    with _lock:
+        _models[user_id] = (mtime, bundle)
+    return bundle
+
+
+# ================= TRAINING =================
+def train(user_id):
+    """Fit the user's model on their categorised history.
+
+    Returns a stats dict, or ``None`` when there isn't enough labelled
+    data (fewer than MIN_TRAINING_ROWS rows or a single category).
+    """
+    rows = db.session.query(Expense.description, Expense.category).filter(
+        Expense.user_id == user_id,
+        Expense.description.isnot(None),
+        Expense.description != "",
+        Expense.category.isnot(None),
+        Expense.category != FALLBACK_CATEGORY
+    ).order_by(Expense.id.desc()).limit(MAX_TRAINING_ROWS).all()
+
+    labels = [category for _, category in rows]
+    if len(rows) < MIN_TRAINING_ROWS or len(set(labels)) < 2:
+        return None
+
+    features = _vectorizer.transform([normalise(description) for description, _ in rows])
+
+    model = SGDClassifier(loss="log_loss", alpha=1e-5, max_iter=25, tol=1e-4, random_state=0)
+    model.fit(features, labels)
+
+    bundle = {
+        "model": model,
+        "rows": len(rows),
+        "classes": list(model.classes_),
+        "trained_at": datetime.now().isoformat(timespec="seconds"),
+    }
+
+    # Write then rename so other workers never load a half-written file.
+    path = model_path(user_id)
+    joblib.dump(bundle, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+    return {key: bundle[key] for key in ("rows", "classes", "trained_at")}
+
+
+# ================= INFERENCE =================
+def classify_many(user_id, descriptions, threshold=CONFIDENCE_THRESHOLD):
+    """Categorise a batch with one vectorised predict call.
+
+    The user's own keyword rules always win. The model decides the rest;
+    descriptions it is unsure about (or every description, when the user
+    has no model yet) fall back to the default keywords.
+    """
+    own, keywords = classifiers_for(user_id)
+    bundle = load(user_id)
+
+    if bundle is None or not descriptions:
+        return keywords.classify_many(descriptions)
+
+    normalised = [normalise(d) for d in descriptions]
+    predicted, unruled = {}, []
+    for text in dict.fromkeys(normalised):
+        category = own.match(text) if own else None
+        if category is None:
+            unruled.append(text)
+        else:
+            predicted[text] = category
+
+    if unruled:
+        proba = bundle["model"].predict_proba(_vectorizer.transform(unruled))
+        best = proba.argmax(axis=1)
+        confident = proba[np.arange(len(unruled)), best] >= threshold
+        classes = bundle["model"].classes_
+
+        for text, index, sure in zip(unruled, best, confident):
+            predicted[text] = str(classes[index]) if sure and text else keywords.classify(text)
+
+    return [predicted[text] for text in normalised]
+
+
+def classify(user_id, description):
+    return classify_many(user_id, [description])[0]
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, type_coerce, String
+from models import db, Expense
+from aggregates import expense_filters
+import analytics
+
+# Column-oriented, in-memory copy of a user's transactions.
+#
+# Rows are fetched as plain tuples (no ORM objects) straight into NumPy
+# arrays. Categories and dates are dictionary-encoded: each row stores a
+# small integer code into ``categories`` / ``days``, so group-bys become
+# np.bincount over the codes. A NULL category is a label like any other;
+# a NULL date has code -1 and is left out of date-based operations.
+
+
+class Snapshot:
+    """Parallel arrays for one filtered set of transactions; build with load()."""
+
+    def __init__(self, amounts, is_expense, is_income, category_codes, categories, day_codes, days):
+        self.amounts = amounts
+        self.is_expense = is_expense
+        self.is_income = is_income
+        self.category_codes = category_codes
+        self.categories = categories
+        self.day_codes = day_codes
+        self.days = days
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @property
+    def nbytes(self):
+        return sum(
+            array.nbytes for array in
+            (self.amounts, self.is_expense, self.is_income,
+             self.category_codes, self.day_codes, self.days)
+        )
+
+    # ===== ENCODINGS =====
+    def _keys(self, by):
+        """``(codes, labels)`` for grouping by category, date or month."""
+        if by == "category":
+            return self.category_codes, np.array(self.categories, dtype=object)
+        if by == "date":
+            return self.day_codes, self.days
+        if by == "month":
+            months, month_codes = np.unique(self.days.astype("datetime64[M]"), return_inverse=True)
+            codes = np.where(self.day_codes >= 0, month_codes[self.day_codes], -1)
+            return codes, months
+        raise ValueError(f"Unknown grouping: {by}")
+
+    def _mask(self, expense_only):
+        return self.is_expense if expense_only else np.ones(len(self), dtype=bool)
+
+    # ===== OPERATIONS =====
+    def group_sum(self, by="category", expense_only=True):
+        """``(labels, totals)`` for the groups that have at least one row."""
+        codes, labels = self._keys(by)
+        keep = self._mask(expense_only) & (codes >= 0)
+
+        totals = np.bincount(codes[keep], weights=self.amounts[keep], minlength=len(labels))
+        present = np.bincount(codes[keep], minlength=len(labels)) > 0
+        return labels[present], totals[present]
+
+    def top_k(self, k, by="category", expense_only=True):
+        """The ``k`` largest groups as ``[(label, total), ...]``, largest first."""
+        labels, totals = self.group_sum(by, expense_only)
+        if k < len(totals):
+            picked = np.argpartition(-totals, k - 1)[:k]
+        else:
+            picked = np.arange(len(totals))
+        picked = picked[np.argsort(-totals[picked], kind="stable")]
+        return list(zip(labels[picked].tolist(), totals[picked].tolist()))
+
+    def _dated(self, expense_only, first):
+        """Mask of the rows to place on a dense calendar starting at ``first``."""
+        keep = self._mask(expense_only) & (self.day_codes >= 0)
+        if first is not None:
+            keep &= self.days[np.maximum(self.day_codes, 0)] >= np.datetime64(first, "D")
+        return keep
+
+    def daily_series(self, expense_only=True, first=None):
+        """Dense ``(days, totals)`` up to the last dated row, gaps as 0.
+
+        The calendar starts at ``first`` (rows before it are dropped) or
+        at the first dated row.
+        """
+        keep = self._dated(expense_only, first)
+        if not keep.any():
+            return np.array([], dtype="datetime64[D]"), np.array([], dtype=float)
+
+        dated = self.days[self.day_codes[keep]]
+        first = dated.min() if first is None else np.datetime64(first, "D")
+        totals = np.bincount((dated - first).astype(np.int64), weights=self.amounts[keep])
+        return first + np.arange(len(totals)), totals
+
+    def daily_matrix(self, by="category", expense_only=True, first=None):
+        """Dense ``(days, labels, totals)`` with one column of daily totals per group."""
+        codes, labels = self._keys(by)
+        keep = self._dated(expense_only, first) & (codes >= 0)
+        if not keep.any():
+            return np.array([], dtype="datetime64[D]"), labels[:0], np.zeros((0, 0))
+
+        dated = self.days[self.day_codes[keep]]
+        first = dated.min() if first is None else np.datetime64(first, "D")
+        rows = (dated - first).astype(np.int64)
+
+        present, columns = np.unique(codes[keep], return_inverse=True)
+        width = len(present)
+        totals = np.bincount(
+            rows * width + columns,
+            weights=self.amounts[keep],
+            minlength=(rows.max() + 1) * width
+        ).reshape(-1, width)
+
+        return first + np.arange(len(totals)), labels[present], totals
+
+    def rolling(self, window, how="mean", expense_only=True):
+        """Trailing ``window``-day sum or mean over the dense daily series.
+
+        The first ``window - 1`` days use the days available so far.
+        """
+        days, totals = self.daily_series(expense_only)
+        sums = np.cumsum(totals)
+        sums[window:] = sums[window:] - sums[:-window]
+
+        if how == "sum":
+            return days, sums
+        if how == "mean":
+            return days, sums / np.minimum(np.arange(1, len(sums) + 1), window)
+        raise ValueError(f"Unknown rolling aggregate: {how}")
+
+    def percentile(self, q, by=None, expense_only=True):
+        """Amount percentile ``q`` (0-100), overall or per group as ``{label: value}``."""
+        keep = self._mask(expense_only)
+        if by is None:
+            return float(np.percentile(self.amounts[keep], q)) if keep.any() else None
+
+        codes, labels = self._keys(by)
+        keep &= codes >= 0
+        order = np.argsort(codes[keep], kind="stable")
+        sorted_codes = codes[keep][order]
+        amounts = self.amounts[keep][order]
+
+        bounds = np.flatnonzero(np.diff(sorted_codes)) + 1
+        labels = labels.tolist()
+        return {
+            labels[group[0]]: float(np.percentile(values, q))
+            for group, values in zip(np.split(sorted_codes, bounds), np.split(amounts, bounds))
+            if len(values)
+        }
+
+    # ===== VIEWS =====
+    def summary(self):
+        """The same analytics.Summary that analytics.summarize() builds."""
+        result = analytics.Summary()
+        result.transactions = len(self)
+        result.total_expense = float(self.amounts[self.is_expense].sum())
+        result.total_income = float(self.amounts[self.is_income].sum())
+
+        labels, totals = self.group_sum("category")
+        result.category_totals = dict(sorted(
+            zip(labels.tolist(), totals.tolist()),
+            key=lambda item: (item[0] is not None, item[0] or "")
+        ))
+
+        days, totals = self.group_sum("date")
+        result.daily_totals = dict(zip(days.tolist(), totals.tolist()))
+        return result
+
+
+# ================= LOADING =================
+def load(user_id, *criteria, **filters):
+    """Snapshot of the user's rows matching the usual aggregate filters."""
+    result = db.session.connection().execute(
+        select(
+            Expense.amount,
+            Expense.transaction_type,
+            Expense.category,
+            # ISO text as stored; skips per-row date object conversion
+            type_coerce(Expense.date, String)
+        ).where(*expense_filters(user_id, *criteria, **filters))
+    )
+    # Every column is already a plain Python value, so read the DBAPI
+    # tuples directly instead of wrapping each one in a Row.
+    rows = result.cursor.fetchall()
+    result.close()
+
+    columns = list(zip(*rows)) or [(), (), (), ()]
+    amounts = np.array(columns[0], dtype=np.float64)
+    types, categories, days = (np.array(column, dtype=object) for column in columns[1:])
+
+    # A NULL category is kept as its own label; a NULL date gets code -1.
+    category_codes, category_labels = pd.factorize(categories, use_na_sentinel=False)
+    day_codes, day_labels = pd.factorize(days)
+
+    return Snapshot(
+        amounts=amounts,
+        is_expense=types == "expense",
+        is_income=types == "income",
+        category_codes=category_codes.astype(np.int32),
+        categories=[None if pd.isna(label) else label for label in category_labels],
+        day_codes=day_codes.astype(np.int32),
+        days=np.array(day_labels, dtype="datetime64[D]")
+    )
@@ -0,0 +1,80 @@
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from models import db
+
+# Applies the SQLite profile from config.py: pool options go to the engine,
+# PRAGMAs run on every new connection (most of them are per connection;
+# journal_mode is stored in the file, so the profile also switches it back).
+
+PROFILES = {
+    "performance": lambda config: [
+        ("busy_timeout", config["SQLITE_BUSY_TIMEOUT_MS"]),
+        ("journal_mode", "WAL"),
+        ("synchronous", "NORMAL"),
+        ("mmap_size", config["SQLITE_MMAP_SIZE"]),
+        ("cache_size", -config["SQLITE_CACHE_SIZE_KB"]),  # negative: KiB, not pages
+        ("temp_store", "MEMORY"),
+        ("foreign_keys", "ON"),
+    ],
+    "default": lambda config: [
+        ("busy_timeout", config["SQLITE_BUSY_TIMEOUT_MS"]),
+        ("journal_mode", "DELETE"),
+        ("synchronous", "FULL"),
+        ("foreign_keys", "ON"),
+    ],
+}
+
+
+def pragmas(config):
+    profile = config["SQLITE_PROFILE"]
+    if profile not in PROFILES:
+        raise ValueError(f"unknown SQLITE_PROFILE {profile!r}; expected one of {sorted(PROFILES)}")
+    return PROFILES[profile](config)
+
+
+def engine_options(config):
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if not url.drivername.startswith("sqlite") or url.database in (None, "", ":memory:"):
+        return {}  # in-memory SQLite gets Flask-SQLAlchemy's single StaticPool connection
+
+    return {
+        "pool_size": config["SQLITE_POOL_SIZE"],
+        "max_overflow": config["SQLITE_POOL_OVERFLOW"],
+        "pool_timeout": config["SQLITE_POOL_TIMEOUT"],
+    }
+
+
+def init_app(app):
+    """``db.init_app`` with the SQLite profile applied."""
+    options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    for name, value in engine_options(app.config).items():
+        options.setdefault(name, value)
+
+    statements = [f"PRAGMA {name}={value}" for name, value in pragmas(app.config)]
+
+    db.init_app(app)
+
+    with app.app_context():
+        @event.listens_for(db.engine, "connect")
+        def configure_connection(dbapi_connection, connection_record):
+            if isinstance(dbapi_connection, sqlite3.Connection):
+                cursor = dbapi_connection.cursor()
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.close()
+
+
+def begin_immediate(connection):
+    """Take SQLite's write lock now rather than at the first write.
+
+    For read-then-write sequences that must not interleave with another
+    process: what is read afterwards can't change before the commit.
+    pysqlite only opens a transaction at the first INSERT/UPDATE/DELETE,
+    so this is skipped when one is already open (the lock is then held).
+    """
+    dbapi_connection = connection.connection.dbapi_connection
+    if isinstance(dbapi_connection, sqlite3.Connection) and not dbapi_connection.in_transaction:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
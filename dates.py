@@ -0,0 +1,120 @@
+from datetime import date, datetime, timedelta
+
+# Formats seen in stored rows and uploads: HTML date inputs, the old
+# import path (which wrote full datetimes) and day-first bank exports.
+DATE_FORMATS = (
+    "%Y-%m-%d",
+    "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%d-%m-%Y",
+    "%d/%m/%Y",
+)
+
+
+def parse_date(value):
+    """Return a ``date`` for any supported input, ``None`` if it can't be read."""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+
+    value = str(value).strip()
+    if not value:
+        return None
+
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+
+    return None
+
+
+def month_bounds(month):
+    """``"2026-03"`` -> ``(date(2026, 3, 1), date(2026, 4, 1))``."""
+    try:
+        first = datetime.strptime(month, "%Y-%m").date()
+        following = (first.replace(day=28) + timedelta(days=4)).replace(day=1)
+    except (TypeError, ValueError, OverflowError):  # OverflowError: 9999-12
+        return None
+
+    return first, following
+
+
+def month_start(day=None):
+    return (day or date.today()).replace(day=1)
+
+
+def add_months(month, count):
+    """First of the month ``count`` months after ``month`` (negative goes back)."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# Longest span month_range returns, whatever the query string asks for.
+MAX_HISTORY_MONTHS = 120
+
+
+def month_range(args, default_months=12, today=None, max_months=MAX_HISTORY_MONTHS):
+    """Read ``history_start``/``history_end`` (``YYYY-MM``) into month firsts.
+
+    Defaults to the ``default_months`` months ending with the current one.
+    A span longer than ``max_months`` keeps its latest ``max_months``.
+    """
+    last = month_bounds(args.get("history_end"))
+    last = last[0] if last else month_start(today)
+
+    first = month_bounds(args.get("history_start"))
+    first = first[0] if first else add_months(last, 1 - default_months)
+
+    if first > last:
+        first, last = last, first
+
+    span = (last.year - first.year) * 12 + last.month - first.month + 1
+    return [add_months(last, offset) for offset in range(1 - min(span, max_months), 1)]
+
+
+def range_filters(args):
+    """Read ``month`` or ``start``/``end`` query args into aggregate filters.
+
+    ``since`` is inclusive and ``before`` exclusive, so both map straight
+    onto an index range scan over ``(user_id, date)``.
+    """
+    filters = {}
+
+    bounds = month_bounds(args.get("month"))
+    if bounds:
+        filters["since"], filters["before"] = bounds
+        return filters
+
+    start = parse_date(args.get("start"))
+    end = parse_date(args.get("end"))
+
+    if start:
+        filters["since"] = start
+    if end:
+        filters["before"] = end + timedelta(days=1)
+
+    return filters
+
+
+def describe_range(filters):
+    """Human-readable period for ``range_filters`` output, e.g. for report titles."""
+    since = filters.get("since")
+    last = filters["before"] - timedelta(days=1) if filters.get("before") else None
+
+    if since and last:
+        return f"{since:%d %b %Y} – {last:%d %b %Y}"
+    if since:
+        return f"From {since:%d %b %Y}"
+    if last:
+        return f"Until {last:%d %b %Y}"
+    return "All time"
+
+
+def iso_labels(days):
+    return [d.isoformat() if isinstance(d, date) else d for d in days]
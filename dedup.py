@@ -0,0 +1,277 @@
+import hashlib
+from collections import defaultdict
+from functools import lru_cache
+
+from sqlalchemy import bindparam, delete, func, insert, select, update
+
+from models import db, Expense, ImportDigest
+from categories import normalise
+import anomalies
+import cache
+import database
+import rollups
+
+# Content fingerprints for expenses, so re-importing an overlapping bank
+# statement skips the rows that are already there.
+#
+# A fingerprint is "<sha1 of user|date|amount|description|account>:<n>".
+# The ordinal n keeps genuinely repeated rows apart (two identical coffees
+# on one statement): an import numbers each repeat by its occurrence in
+# the file, so running the same file again produces the same fingerprints,
+# while rows added by hand or through the API take the lowest free n.
+# Both read the ordinals in use under the SQLite write lock, so two
+# processes can't hand out the same one.
+# (user_id, fingerprint) is unique. Fingerprints are taken when a row is
+# created and are not changed by later edits, so they keep identifying
+# the statement line a row came from.
+
+DIGEST_LENGTH = 40
+LOOKUP_CHUNK = 5_000
+
+
+# ================= FINGERPRINTS =================
+# Statement descriptions repeat a lot; normalise each distinct one once.
+_normalise = lru_cache(maxsize=65_536)(normalise)
+
+
+def digest(user_id, day, amount, description, account):
+    key = (
+        f"{user_id}|{day.isoformat() if day else ''}|{float(amount or 0):.2f}"
+        f"|{_normalise(description)}|{_normalise(account)}"
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def fingerprint(row_digest, ordinal):
+    return f"{row_digest}:{ordinal}"
+
+
+def import_digests(user_id, frame):
+    """Digests of a prepared import frame, in row order."""
+    columns = (frame[name].tolist() for name in ("date", "amount", "description", "account"))
+    return [digest(user_id, *row) for row in zip(*columns)]
+
+
+def import_fingerprints(csv_import_id, digests):
+    """Fingerprints for one chunk of an import, in row order.
+
+    The nth occurrence of a digest in the file gets ordinal n-1. Counts
+    from earlier chunks come from ImportDigest and are written back in the
+    chunk's transaction, so a resumed import picks up the numbering where
+    the last committed chunk left it. Without a ``csv_import_id`` the
+    digests are numbered as a whole file.
+    """
+    seen = _import_counts(csv_import_id, digests) if csv_import_id else {}
+    known = set(seen)
+
+    fingerprints = []
+    for row_digest in digests:
+        ordinal = seen.get(row_digest, 0)
+        fingerprints.append(fingerprint(row_digest, ordinal))
+        seen[row_digest] = ordinal + 1
+
+    if csv_import_id:
+        rows = [
+            {"csv_import_id": csv_import_id, "digest": row_digest, "seen": count}
+            for row_digest, count in seen.items()
+        ]
+        updates = [row for row in rows if row["digest"] in known]
+        inserts = [row for row in rows if row["digest"] not in known]
+        if updates:
+            db.session.execute(update(ImportDigest), updates)
+        if inserts:
+            db.session.execute(insert(ImportDigest), inserts)
+
+    return fingerprints
+
+
+def _import_counts(csv_import_id, digests):
+    """``{digest: occurrences so far}`` for the digests this import has seen."""
+    counts = {}
+    digests = sorted(set(digests))
+
+    for start in range(0, len(digests), LOOKUP_CHUNK):
+        query = select(ImportDigest.digest, ImportDigest.seen).where(
+            ImportDigest.csv_import_id == csv_import_id,
+            ImportDigest.digest.in_(digests[start:start + LOOKUP_CHUNK])
+        )
+        counts.update(db.session.execute(query).all())
+
+    return counts
+
+
+def forget_import(csv_import_id):
+    """Drop a finished import's digest counts."""
+    db.session.execute(delete(ImportDigest).where(ImportDigest.csv_import_id == csv_import_id))
+
+
+def existing(user_id, first_day, last_day):
+    """Fingerprints of the user's rows dated ``first_day``..``last_day``.
+
+    Dates are part of the digest, so these are the only rows an import
+    chunk spanning those days can duplicate: one range scan on
+    (user_id, date) instead of a lookup per row.
+    """
+    return set(db.session.scalars(select(Expense.fingerprint).where(
+        Expense.user_id == user_id,
+        Expense.date.between(first_day, last_day),
+        Expense.fingerprint.is_not(None)
+    )))
+
+
+def _taken(user_id, digests):
+    """``{digest: ordinals in use}`` for the user's rows with these digests."""
+    taken = defaultdict(set)
+    digests = sorted(set(digests))
+
+    for start in range(0, len(digests), LOOKUP_CHUNK):
+        chunk = digests[start:start + LOOKUP_CHUNK]
+        query = select(Expense.fingerprint).where(
+            Expense.user_id == user_id,
+            # The range lets a small lookup seek the (user_id, fingerprint)
+            # index; the substr test picks out the exact digests.
+            Expense.fingerprint >= chunk[0] + ":",
+            Expense.fingerprint < chunk[-1] + ";",
+            func.substr(Expense.fingerprint, 1, DIGEST_LENGTH).in_(chunk),
+        )
+        for value in db.session.scalars(query):
+            row_digest, _, ordinal = value.partition(":")
+            taken[row_digest].add(int(ordinal))
+
+    return taken
+
+
+def new_fingerprints(user_id, rows):
+    """Fingerprints for new ``(date, amount, description, account)`` rows.
+
+    Each takes the lowest ordinal not already used for its digest, so an
+    identical row entered twice is kept twice. The write lock is taken
+    first and held until the caller commits, so a concurrent insert of the
+    same row waits and then sees this one's ordinal.
+    """
+    database.begin_immediate(db.session.connection())
+    digests = [digest(user_id, *row) for row in rows]
+    taken = _taken(user_id, digests)
+
+    fingerprints = []
+    for row_digest in digests:
+        used = taken[row_digest]
+        ordinal = 0
+        while ordinal in used:
+            ordinal += 1
+        used.add(ordinal)
+        fingerprints.append(fingerprint(row_digest, ordinal))
+    return fingerprints
+
+
+# ================= BACKFILL =================
+def backfill(conn, user_id=None):
+    """Fingerprint rows that have none; returns how many were filled.
+
+    Rows are walked in (user, date, id) order, so a digest's earlier rows
+    get the lower ordinals and the counts can reset with every new day.
+    Ordinals already taken (by rows that do have a fingerprint) are
+    skipped.
+    """
+    query = select(
+        Expense.id, Expense.user_id, Expense.date, Expense.amount,
+        Expense.description, Expense.account, Expense.fingerprint
+    ).order_by(Expense.user_id, Expense.date, Expense.id)
+
+    if user_id is not None:
+        query = query.where(Expense.user_id == user_id)
+
+    updates, day_key, taken, pending = [], None, defaultdict(set), []
+
+    def assign():
+        for row_id, row_digest in pending:
+            used = taken[row_digest]
+            ordinal = 0
+            while ordinal in used:
+                ordinal += 1
+            used.add(ordinal)
+            updates.append({"row_id": row_id, "fingerprint": fingerprint(row_digest, ordinal)})
+
+    for row_id, owner, day, amount, description, account, value in conn.execute(query):
+        if (owner, day) != day_key:
+            assign()
+            day_key, taken, pending = (owner, day), defaultdict(set), []
+
+        if value:
+            row_digest, _, ordinal = value.partition(":")
+            taken[row_digest].add(int(ordinal))
+        else:
+            pending.append((row_id, digest(owner, day, amount, description, account)))
+    assign()
+
+    for start in range(0, len(updates), 10_000):
+        conn.execute(
+            update(Expense.__table__).where(Expense.__table__.c.id == bindparam("row_id")),
+            updates[start:start + 10_000]
+        )
+
+    return len(updates)
+
+
+# ================= DUPLICATES =================
+def duplicate_groups(user_id=None):
+    """``(user_id, digest, count)`` for every digest held by more than one row."""
+    row_digest = func.substr(Expense.fingerprint, 1, DIGEST_LENGTH)
+    query = select(Expense.user_id, row_digest, func.count(Expense.id))\
+        .where(Expense.fingerprint.is_not(None))\
+        .group_by(Expense.user_id, row_digest)\
+        .having(func.count(Expense.id) > 1)
+
+    if user_id is not None:
+        query = query.where(Expense.user_id == user_id)
+
+    return db.session.execute(query.order_by(Expense.user_id)).all()
+
+
+# Not part of the rollup key, so filling them in leaves the totals alone.
+MERGED_FIELDS = ("notes", "tags", "receipt")
+
+
+def merge(groups):
+    """Collapse each duplicate group into its oldest row; returns rows removed.
+
+    The kept row takes any of MERGED_FIELDS it lacks from the rows being
+    removed. Rollups are adjusted with one set-based update, and each
+    affected user's cache is bumped. The caller commits.
+    """
+    by_user = defaultdict(list)
+    for owner, row_digest, _ in groups:
+        by_user[owner].append(row_digest)
+
+    removed = []
+    for owner, digests in by_user.items():
+        for start in range(0, len(digests), LOOKUP_CHUNK):
+            rows = Expense.query.filter(
+                Expense.user_id == owner,
+                func.substr(Expense.fingerprint, 1, DIGEST_LENGTH).in_(digests[start:start + LOOKUP_CHUNK])
+            ).order_by(Expense.id).all()
+
+            keepers = {}
+            for expense in rows:
+                keeper = keepers.setdefault(expense.fingerprint[:DIGEST_LENGTH], expense)
+                if keeper is expense:
+                    continue
+                for name in MERGED_FIELDS:
+                    if getattr(keeper, name) in (None, "") and getattr(expense, name) not in (None, ""):
+                        setattr(keeper, name, getattr(expense, name))
+                removed.append(expense)
+
+        cache.bump(owner)
+
+    if not removed:
+        return 0
+
+    rollups.add_totals((rollups.expense_key(e), -float(e.amount or 0), -1) for e in removed)
+    ids = [expense.id for expense in removed]
+    for expense in removed:
+        db.session.expunge(expense)
+    for start in range(0, len(ids), LOOKUP_CHUNK):
+        db.session.execute(delete(Expense).where(Expense.id.in_(ids[start:start + LOOKUP_CHUNK])))
+    anomalies.rewind()
+
+    return len(ids)
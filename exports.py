@@ -0,0 +1,147 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import select
+
+from models import Expense, Event, Budget
+import aggregates
+import pagination
+
+# Bulk exports of a user's expenses, events and budgets as CSV, JSON Lines
+# or Parquet. Rows are read EXPORT_CHUNK at a time (pagination's batch
+# helpers: one short keyset query per chunk) and each chunk is encoded and
+# yielded before the next is read, so a streamed response holds a single
+# chunk in memory whatever the size of the export.
+
+EXPORT_CHUNK = 5_000
+
+# format -> mimetype
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+EXPENSE_COLUMNS = (
+    Expense.id, Expense.event_id, Expense.date, Expense.description, Expense.category,
+    Expense.amount, Expense.transaction_type, Expense.account, Expense.notes, Expense.tags,
+    Expense.receipt,
+)
+EVENT_COLUMNS = (
+    Event.id, Event.name, Event.description, Event.date, Event.budget_limit, Event.created_at,
+)
+BUDGET_COLUMNS = (
+    Budget.id, Budget.budget_type, Budget.event_id, Budget.monthly_limit,
+)
+
+DATASETS = ("expenses", "events", "budgets")
+
+
+# ================= ROWS =================
+def batches(dataset, user_id, *criteria, **filters):
+    """``(columns, batches)`` for one dataset; ``criteria``/``filters`` apply to expenses."""
+    if dataset == "expenses":
+        query = select(*EXPENSE_COLUMNS).where(*aggregates.expense_filters(user_id, *criteria, **filters))
+        return EXPENSE_COLUMNS, pagination.expense_batches(query, EXPORT_CHUNK)
+
+    if dataset == "events":
+        query = select(*EVENT_COLUMNS).where(Event.created_by == user_id)
+        return EVENT_COLUMNS, pagination.id_batches(query, Event.id, EXPORT_CHUNK)
+
+    if dataset == "budgets":
+        query = select(*BUDGET_COLUMNS).where(Budget.user_id == user_id)
+        return BUDGET_COLUMNS, pagination.id_batches(query, Budget.id, EXPORT_CHUNK)
+
+    raise ValueError(f"Unknown export dataset: {dataset}")
+
+
+def stream(dataset, fmt, user_id, *criteria, **filters):
+    """Generator of encoded chunks for a streamed Flask response."""
+    columns, rows = batches(dataset, user_id, *criteria, **filters)
+    return ENCODERS[fmt](columns, rows)
+
+
+# ================= ENCODERS =================
+def _csv(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow([column.key for column in columns])
+    yield buffer.getvalue()
+
+    for batch in rows:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def _ndjson(columns, rows):
+    names = [column.key for column in columns]
+    for batch in rows:
+        yield "".join(json.dumps(dict(zip(names, row)), default=str) + "\n" for row in batch)
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file handing back whatever was written since the last drain.
+
+    ParquetWriter records byte offsets through ``tell()``, so the position
+    keeps counting even though drained bytes are no longer held.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _arrow_type(column):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return pa.timestamp("us")
+    if python_type is date:
+        return pa.date32()
+    return {int: pa.int64(), float: pa.float64(), bool: pa.bool_()}.get(python_type, pa.string())
+
+
+def _parquet(columns, rows):
+    # One row group per chunk. A Parquet file is written front to back
+    # (row groups, then the footer), so each group can go out as soon as
+    # it is encoded; pandas' to_parquet would need the whole frame first.
+    schema = pa.schema([(column.key, _arrow_type(column)) for column in columns])
+    sink = _Sink()
+
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    for batch in rows:
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+        writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+    writer.close()
+
+    yield sink.drain()
+
+
+ENCODERS = {
+    "csv": _csv,
+    "ndjson": _ndjson,
+    "parquet": _parquet,
+}
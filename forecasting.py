@@ -0,0 +1,335 @@
+import json
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func
+
+from models import db, User, ExpenseRollup, ForecastState
+from aggregates import rollup_filters
+from dates import month_start, add_months
+import cache
+import columnar
+
+# Next-month spend forecasts from exponential smoothing on daily totals.
+#
+# Total spend uses additive level + weekly seasonality (ETS(A,N,A)); each
+# category gets simple exponential smoothing (ETS(A,N,N)) because per-
+# category days are too sparse for a weekly pattern. Intervals are the
+# exact variance of the summed forecast errors under those models.
+#
+# The fitted state lives in ``forecast_state``. The update_forecast job
+# extends it over days added since the last fit, and only refits from
+# scratch when older days changed or parameters are due for re-selection,
+# so the dashboard just reads a row and does a little arithmetic. Only
+# complete days (through yesterday) are fitted; today is the first day
+# forecast, so spending as it comes in today never disturbs the state.
+
+SEASON = 7
+MIN_DAYS = 21
+WARMUP_DAYS = 2 * SEASON
+REFIT_DAYS = 30
+ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5)
+GAMMAS = (0.05, 0.1, 0.2)
+CATEGORY_ALPHA = 0.1
+INTERVAL_Z = 1.2816  # 80% interval
+SPIKE_Z = 2.0
+
+
+class Forecast:
+    """Projected spend for ``month`` with an 80% interval.
+
+    ``categories`` holds ``(category, projection, low, high)``, largest
+    first. ``stale`` means newer data is still being folded in.
+    """
+
+    def __init__(self, month, total, low, high, categories, spike, stale):
+        self.month = month
+        self.total = total
+        self.low = low
+        self.high = high
+        self.categories = categories
+        self.spike = spike
+        self.stale = stale
+
+
+# ================= SMOOTHING =================
+def _smooth(values, weekdays, alpha, gamma, level, season, sse, count, warmup=0):
+    """Run ETS(A,N,A) over ``values``, vectorised across parameter sets.
+
+    ``alpha``/``gamma``/``level``/``sse`` have shape (k,), ``season`` (k, 7).
+    Returns the updated state and the last one-step error.
+    """
+    error = np.zeros_like(level)
+    rows = np.arange(len(level))
+
+    for position, (value, weekday) in enumerate(zip(values, weekdays)):
+        error = value - (level + season[rows, weekday])
+        level = level + alpha * error
+        season[rows, weekday] += gamma * error
+        if position >= warmup:
+            sse = sse + error ** 2
+            count += 1
+
+    return level, season, sse, count, error
+
+
+def _smooth_levels(values, alpha, level, sse, count):
+    """ETS(A,N,N) over a (days, k) matrix, one column per series."""
+    for row in values:
+        error = row - level
+        level = level + alpha * error
+        sse = sse + error ** 2
+        count += 1
+    return level, sse, count
+
+
+def _weekdays(first, days):
+    return (np.datetime64(first, "D") + np.arange(days)).astype("datetime64[D]").view("int64") % 7
+
+
+def _fit(days, totals, labels, matrix):
+    """Full fit: pick (alpha, gamma) by one-step SSE, then fit categories."""
+    grid = np.array([(a, g) for a in ALPHAS for g in GAMMAS if g <= 1 - a])
+    k = len(grid)
+
+    first_weeks = totals[:WARMUP_DAYS]
+    level = np.full(k, first_weeks.mean())
+    weekdays = _weekdays(days[0], len(totals))
+    season = np.zeros((k, SEASON))
+    for weekday in range(SEASON):
+        same = first_weeks[weekdays[:WARMUP_DAYS] == weekday]
+        season[:, weekday] = same.mean() - first_weeks.mean() if len(same) else 0
+
+    level, season, sse, count, error = _smooth(
+        totals, weekdays, grid[:, 0], grid[:, 1], level, season,
+        np.zeros(k), 0, warmup=WARMUP_DAYS
+    )
+    best = int(np.argmin(sse))
+
+    category_level, category_sse, category_count = _smooth_levels(
+        matrix, CATEGORY_ALPHA, np.zeros(matrix.shape[1]), np.zeros(matrix.shape[1]), 0
+    )
+
+    return {
+        "alpha": float(grid[best, 0]),
+        "gamma": float(grid[best, 1]),
+        "level": float(level[best]),
+        "season": season[best].tolist(),
+        "sse": float(sse[best]),
+        "count": count,
+        "last_error": float(error[best]),
+        "history_sum": float(totals.sum()),
+        "full_fit_through": str(days[-1]),
+        "categories": [
+            [label, float(l), float(s), category_count]
+            for label, l, s in zip(labels.tolist(), category_level, category_sse)
+        ],
+    }
+
+
+def _extend(state, days, totals, labels, matrix):
+    """Fold newly observed days into a fitted state with its parameters."""
+    alpha = np.array([state["alpha"]])
+    level, season, sse, count, error = _smooth(
+        totals, _weekdays(days[0], len(totals)),
+        alpha, np.array([state["gamma"]]),
+        np.array([state["level"]]), np.array([state["season"]]),
+        np.array([state["sse"]]), state["count"]
+    )
+
+    known = {label: index for index, (label, *_) in enumerate(state["categories"])}
+    categories = [list(entry) for entry in state["categories"]]
+    for label in labels.tolist():
+        if label not in known:
+            known[label] = len(categories)
+            categories.append([label, 0.0, 0.0, 0])
+
+    # Every category sees every new day (days without spend are zeros).
+    width = len(categories)
+    full = np.zeros((len(totals), width))
+    for column, label in enumerate(labels.tolist()):
+        full[:, known[label]] = matrix[:, column]
+
+    new_level, new_sse, _ = _smooth_levels(
+        full, CATEGORY_ALPHA,
+        np.array([entry[1] for entry in categories]),
+        np.array([entry[2] for entry in categories]), 0
+    )
+    for index, entry in enumerate(categories):
+        entry[1], entry[2], entry[3] = float(new_level[index]), float(new_sse[index]), entry[3] + len(totals)
+
+    state.update(
+        level=float(level[0]),
+        season=season[0].tolist(),
+        sse=float(sse[0]),
+        count=count,
+        last_error=float(error[0]),
+        history_sum=state["history_sum"] + float(totals.sum()),
+        categories=categories,
+    )
+    return state
+
+
+# ================= UPDATING =================
+def _expenses_through(user_id, day):
+    return db.session.query(func.coalesce(func.sum(ExpenseRollup.total), 0)).filter(
+        *rollup_filters(user_id, transaction_type="expense", before=day + timedelta(days=1))
+    ).scalar()
+
+
+def _needs_refit(user_id, row, state):
+    if state is None or row.fitted_through is None:
+        return True
+
+    full_fit = datetime.strptime(state["full_fit_through"], "%Y-%m-%d").date()
+    if (row.fitted_through - full_fit).days >= REFIT_DAYS:
+        return True
+
+    # An edit, delete or back-dated import changed already-fitted days.
+    current = _expenses_through(user_id, row.fitted_through)
+    return abs(current - state["history_sum"]) > 1e-6 * max(1.0, abs(current))
+
+
+def _calendar(days, totals, matrix, first, last):
+    """Run the series from ``first`` (or its first day) through ``last``.
+
+    Quiet days become zeros rather than gaps, so every fitted day is
+    smoothed exactly once. The category matrix is padded to match.
+    """
+    if first is None and not len(days):
+        return days, totals, matrix
+
+    start = days[0] if len(days) else np.datetime64(first, "D")
+    calendar = start + np.arange((np.datetime64(last, "D") - start).astype(int) + 1)
+    totals = np.concatenate([totals, np.zeros(len(calendar) - len(totals))])
+    matrix = np.vstack([matrix, np.zeros((len(calendar) - len(matrix), matrix.shape[1]))])
+    return calendar, totals, matrix
+
+
+def update(user_id):
+    """Bring the user's forecast state up to date. Returns what was done."""
+    version = db.session.query(User.data_version).filter_by(id=user_id).scalar() or 0
+    today = date.today()
+
+    row = ForecastState.query.filter_by(user_id=user_id).first()
+    if row is None:
+        row = ForecastState(user_id=user_id)
+        db.session.add(row)
+
+    state = json.loads(row.state) if row.state else None
+    refit = _needs_refit(user_id, row, state)
+    first = None if refit else row.fitted_through + timedelta(days=1)
+
+    if first is not None and first >= today:
+        days = ()
+    else:
+        snapshot = columnar.load(
+            user_id, transaction_type="expense", before=today, **({"since": first} if first else {})
+        )
+        days, totals = snapshot.daily_series(first=first)
+        _, labels, matrix = snapshot.daily_matrix("category", first=first)
+        days, totals, matrix = _calendar(days, totals, matrix, first, today - timedelta(days=1))
+
+    if refit:
+        if len(days) < MIN_DAYS:
+            row.state, row.fitted_through = None, None
+            action = "not enough history"
+        else:
+            state = _fit(days, totals, labels, matrix)
+            row.fitted_through = days[-1].item()
+            action = f"fitted {len(days)} days"
+    elif len(days):
+        state = _extend(state, days, totals, labels, matrix)
+        row.fitted_through = days[-1].item()
+        action = f"extended by {len(days)} days"
+    else:
+        action = "up to date"
+
+    if state is not None and row.fitted_through is not None:
+        row.state = json.dumps(state)
+    row.data_version = version
+    row.updated_at = datetime.now()
+    if action != "up to date":
+        cache.bump_insights(user_id)
+    db.session.commit()
+    return action
+
+
+def schedule(user_id):
+    """Queue an update unless one is already pending."""
+    import jobs
+    return jobs.enqueue_unique("update_forecast", user_id)
+
+
+# ================= READING =================
+def _interval_scale(alpha, gamma, start, end):
+    """Std-dev multiplier for the sum of forecasts over horizon days start..end.
+
+    Under ETS(A,N,A) a future shock at step i moves the level for every
+    later day (weight alpha) and the season for later same-weekday days
+    (weight gamma); the sum's variance is sigma^2 times the sum of the
+    squared total weights.
+    """
+    steps = np.arange(1, end + 1)
+    inside = (steps >= start).astype(float)
+    lo = np.maximum(steps + 1, start)
+    later = np.maximum(end - lo + 1, 0)
+    same_weekday = np.maximum((end - steps) // SEASON - (lo - 1 - steps) // SEASON, 0)
+    weights = inside + alpha * later + gamma * same_weekday
+    return float(np.sqrt((weights ** 2).sum()))
+
+
+def _between(value, scale, sigma):
+    return max(0.0, value - INTERVAL_Z * sigma * scale), value + INTERVAL_Z * sigma * scale
+
+
+def forecast_from(row, target=None):
+    """Forecast for ``target`` (a month's first day; default next month)."""
+    if row is None or not row.state or row.fitted_through is None:
+        return None
+
+    state = json.loads(row.state)
+    target = target or add_months(month_start(), 1)
+    start = (target - row.fitted_through).days
+    end = (add_months(target, 1) - row.fitted_through).days - 1
+    if end < 1:
+        return None
+    start = max(start, 1)
+
+    weekdays = _weekdays(row.fitted_through + timedelta(days=start), end - start + 1)
+    season = np.array(state["season"])
+    total = max(0.0, float((state["level"] + season[weekdays]).sum()))
+
+    sigma = np.sqrt(state["sse"] / state["count"]) if state["count"] else 0.0
+    low, high = _between(total, _interval_scale(state["alpha"], state["gamma"], start, end), sigma)
+
+    days = end - start + 1
+    category_scale = _interval_scale(CATEGORY_ALPHA, 0.0, start, end)
+    categories = []
+    for label, level, sse, count in state["categories"]:
+        projection = max(0.0, level * days)
+        category_sigma = np.sqrt(sse / count) if count else 0.0
+        categories.append((label, projection, *_between(projection, category_scale, category_sigma)))
+    categories.sort(key=lambda item: -item[1])
+
+    spike = sigma > 0 and state["last_error"] > SPIKE_Z * sigma
+
+    return Forecast(target, total, low, high, categories, bool(spike), stale=False)
+
+
+def current(user_id):
+    """The stored forecast; schedules a refresh once a new day has begun.
+
+    Expense writes queue their own refresh (see refresh_insights), so other
+    writes (budgets, events, rules) never reach the forecast job.
+    """
+    row = ForecastState.query.filter_by(user_id=user_id).first()
+
+    stale = row is None or row.updated_at is None or row.updated_at.date() < date.today()
+    if stale:
+        schedule(user_id)
+
+    forecast = forecast_from(row)
+    if forecast:
+        forecast.stale = stale
+    return forecast
@@ -0,0 +1,319 @@
+import hashlib
+
+import pandas as pd
+from flask import current_app
+from sqlalchemy import insert, or_
+from models import db, Expense, CsvImport
+import category_model
+import database
+import dedup
+from dates import DATE_FORMATS
+import rollups
+import cache
+
+REQUIRED_COLUMNS = {"amount", "description", "date"}
+TRANSACTION_TYPES = {"expense", "income"}
+INSERT_CHUNK_SIZE = 5000
+STREAM_CHUNK_ROWS = 20_000
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportResult:
+    """Outcome of an import: rows inserted plus ``(line, message)`` errors.
+
+    Only the first MAX_REPORTED_ERRORS errors are kept so a badly broken
+    file can't grow the report without bound; ``failed`` counts them all.
+    ``duplicates`` counts valid rows skipped because the user already has
+    them (same fingerprint, see dedup.py).
+    """
+
+    def __init__(self):
+        self.inserted = 0
+        self.failed = 0
+        self.duplicates = 0
+        self.errors = []
+        self.resumed_from = 0
+        self.already_imported = False
+
+    def add_errors(self, errors):
+        self.failed += len(errors)
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        if room > 0:
+            self.errors.extend(errors[:room])
+
+
+# ================= PARSING =================
+def normalise_columns(df):
+    df.columns = (
+        df.columns
+        .str.strip()
+        .str.lower()
+        .str.replace(" ", "_")
+    )
+    return df
+
+
+def missing_columns(df):
+    return sorted(REQUIRED_COLUMNS - set(df.columns))
+
+
+def _text(df, column, default):
+    if column not in df.columns:
+        return pd.Series(default, index=df.index, dtype="object")
+
+    values = df[column].astype("string").str.strip()
+    return values.mask(values.isna() | (values == ""), default).astype("object")
+
+
+def _parse_dates(raw):
+    parsed = pd.Series(pd.NaT, index=raw.index, dtype="datetime64[ns]")
+
+    for fmt in DATE_FORMATS:
+        missing = parsed.isna() & raw.notna()
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(raw[missing], format=fmt, errors="coerce")
+
+    return parsed
+
+
+def _parse_amounts(column):
+    if column.dtype.kind in "if":
+        return column.astype("float64")
+
+    cleaned = column.astype("string").str.replace(",", "", regex=False).str.strip()
+    return pd.to_numeric(cleaned, errors="coerce").astype("float64")
+
+
+def prepare(df, user_id):
+    """Validate and convert a normalised frame column-wise.
+
+    Returns ``(frame, errors)`` where ``frame`` holds only valid rows ready
+    for insertion and ``errors`` lists ``(csv_line, message)`` for the rest.
+    The CSV line is the frame index + 2 (header plus 1-based numbering).
+    """
+    raw_dates = df["date"].astype("string").str.strip()
+    dates = _parse_dates(raw_dates)
+    amounts = _parse_amounts(df["amount"])
+    types = _text(df, "transaction_type", "expense").str.lower()
+
+    problems = [
+        (dates.isna(), "unreadable date", raw_dates),
+        (amounts.isna(), "invalid amount", df["amount"]),
+        (~types.isin(TRANSACTION_TYPES), "unknown transaction_type", types),
+    ]
+
+    errors = []
+    invalid = pd.Series(False, index=df.index)
+
+    for mask, message, values in problems:
+        invalid |= mask
+        for index, value in values[mask].items():
+            errors.append((int(index) + 2, f"{message}: {value!r}"))
+
+    errors.sort()
+    valid = ~invalid
+
+    descriptions = _text(df, "description", "")[valid]
+    categories = _text(df, "category", None)[valid]
+
+    # Only rows without a category need classifying (one predict call).
+    unknown = categories.isna()
+    if unknown.any():
+        categories[unknown] = category_model.classify_many(user_id, descriptions[unknown].tolist())
+
+    frame = pd.DataFrame({
+        "user_id": user_id,
+        "amount": amounts[valid],
+        "category": categories,
+        "description": descriptions,
+        "date": dates[valid].dt.date,
+        "transaction_type": types[valid],
+        "account": _text(df, "account", "Bank")[valid],
+    })
+
+    return frame, errors
+
+
+# ================= WRITING =================
+def insert_frame(frame, chunk_size=INSERT_CHUNK_SIZE):
+    """Bulk insert a prepared frame with Core executemany, chunk by chunk."""
+    records = frame.to_dict("records")
+
+    for start in range(0, len(records), chunk_size):
+        db.session.execute(insert(Expense.__table__), records[start:start + chunk_size])
+
+    grouped = frame.groupby(["category", "date", "transaction_type"])["amount"].agg(["sum", "count"])
+    user_id = int(frame["user_id"].iloc[0]) if len(frame) else None
+
+    rollups.add_totals(
+        ((user_id, None, category, day, transaction_type), float(total), int(count))
+        for (category, day, transaction_type), total, count in grouped.itertuples()
+    )
+
+    return len(records)
+
+
+def drop_duplicates(frame, user_id, csv_import_id=None):
+    """Fingerprint a prepared frame and drop the rows the user already has.
+
+    The user's fingerprints over the frame's date span come back in one
+    query and are matched set-wise, rather than looked up row by row.
+    ``csv_import_id`` carries the repeat numbering across the chunks of a
+    streamed import. Returns ``(new rows, duplicates dropped)``.
+    """
+    # Hold the write lock from the lookup to the insert, so a concurrent
+    # import of the same rows waits and then finds them.
+    database.begin_immediate(db.session.connection())
+    fingerprints = dedup.import_fingerprints(csv_import_id, dedup.import_digests(user_id, frame))
+    frame = frame.assign(fingerprint=fingerprints)
+    if frame.empty:
+        return frame, 0
+
+    found = dedup.existing(user_id, frame["date"].min(), frame["date"].max())
+    if not found:
+        return frame, 0
+
+    new = ~frame["fingerprint"].isin(found)
+    return frame[new], int((~new).sum())
+
+
+def import_frame(df, user_id, result=None, csv_import_id=None):
+    """Validate and insert ``df`` inside the caller's transaction."""
+    result = result or ImportResult()
+
+    frame, errors = prepare(df, user_id)
+    result.add_errors(errors)
+
+    frame, duplicates = drop_duplicates(frame, user_id, csv_import_id)
+    result.duplicates += duplicates
+    result.inserted += insert_frame(frame)
+
+    return result
+
+
+# ================= STREAMING =================
+def checksum(stream, block_size=1 << 20):
+    digest = hashlib.sha256()
+
+    for block in iter(lambda: stream.read(block_size), b""):
+        digest.update(block)
+
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def _claim(csv_import_id):
+    """Mark an unfinished import running; False if another job has it.
+
+    One conditional UPDATE, so of two jobs resuming the same file only one
+    succeeds. A running row untouched for JOB_STALE_AFTER seconds was left
+    by a worker that died and is taken over.
+    """
+    stale = current_app.config.get("JOB_STALE_AFTER", 3600)
+    claimed = CsvImport.query.filter(
+        CsvImport.id == csv_import_id,
+        or_(
+            CsvImport.status != "running",
+            CsvImport.updated_at < db.func.datetime("now", f"-{stale} seconds")
+        )
+    ).update({"status": "running", "error": None}, synchronize_session=False)
+    return claimed == 1
+
+
+def stream_import(stream, user_id, filename=None, chunk_rows=STREAM_CHUNK_ROWS,
+                  on_chunk=None):
+    """Import a CSV upload chunk by chunk with bounded memory.
+
+    Each chunk is inserted and committed together with its CsvImport
+    progress row, so after a failure the same file resumes from the last
+    committed chunk instead of inserting its rows twice. Re-uploading a
+    file that already finished is a no-op, and rows the user already has
+    (an overlapping statement) are skipped and counted in ``duplicates``.
+
+    ``on_chunk(rows_read)`` is called after every committed chunk.
+    Raises ValueError when required columns are missing, or when another
+    job is already importing the same file (a double submit).
+    """
+    result = ImportResult()
+    digest = checksum(stream)
+
+    # Hold the write lock from the lookup to the claim, so two uploads of
+    # the same new file can't each create a progress row.
+    database.begin_immediate(db.session.connection())
+    progress = CsvImport.query.filter_by(user_id=user_id, checksum=digest)\
+        .order_by(CsvImport.id.desc()).first()
+
+    if progress and progress.status == "done":
+        result.already_imported = True
+        result.inserted = progress.rows_inserted
+        result.duplicates = progress.rows_duplicate or 0
+        db.session.commit()
+        return result
+
+    if progress is None:
+        progress = CsvImport(
+            user_id=user_id,
+            filename=filename,
+            checksum=digest,
+            status="running",
+            rows_read=0,
+            rows_inserted=0,
+            rows_skipped=0,
+            rows_duplicate=0,
+            chunks_committed=0
+        )
+        db.session.add(progress)
+    elif not _claim(progress.id):
+        db.session.commit()
+        raise ValueError("This file is already being imported")
+    db.session.commit()
+
+    skip = progress.rows_read or 0
+    result.resumed_from = skip
+
+    reader = pd.read_csv(
+        stream,
+        chunksize=chunk_rows,
+        # A callable keeps memory flat however many rows are skipped.
+        skiprows=(lambda line: 0 < line <= skip) if skip else None
+    )
+
+    try:
+        for chunk in reader:
+            normalise_columns(chunk)
+
+            missing = missing_columns(chunk)
+            if missing:
+                raise ValueError(f"CSV missing required columns: {', '.join(missing)}")
+
+            # Chunk indexes continue across chunks but start after the skip.
+            chunk.index = chunk.index + skip
+            before = result.inserted, result.failed, result.duplicates
+            import_frame(chunk, user_id, result, progress.id)
+            cache.bump(user_id)
+
+            progress.rows_read = (progress.rows_read or 0) + len(chunk)
+            progress.rows_inserted = (progress.rows_inserted or 0) + result.inserted - before[0]
+            progress.rows_skipped = (progress.rows_skipped or 0) + result.failed - before[1]
+            progress.rows_duplicate = (progress.rows_duplicate or 0) + result.duplicates - before[2]
+            progress.chunks_committed = (progress.chunks_committed or 0) + 1
+            db.session.commit()
+
+            if on_chunk:
+                on_chunk(progress.rows_read)
+
+    except Exception as err:
+        db.session.rollback()
+        progress.status = "failed"
+        progress.error = str(err)[:1000]
+        db.session.commit()
+        raise
+
+    progress.status = "done"
+    dedup.forget_import(progress.id)
+    db.session.commit()
+
+    result.inserted = progress.rows_inserted
+    result.duplicates = progress.rows_duplicate
+    return result
@@ -0,0 +1,381 @@
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from models import db, Job
+
+# Handlers registered with @handler("kind"); each receives (job, payload).
+HANDLERS = {}
+
+_state = {"app": None, "executor": None}
+
+# One lock per (kind, user): jobs of the same kind for the same user run one
+# at a time in this process, so refreshes never race on the state they write.
+_locks = {}
+
+
+def handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+# ================= SETUP =================
+def init_app(app):
+    """Start the in-process worker pool.
+
+    Job rows live in the app database, so status and downloads work from
+    any gunicorn worker; only execution happens in the process that took
+    the job. ``JOB_WORKERS = 0`` runs jobs inline (handy for debugging).
+    """
+    app.config.setdefault("JOB_WORKERS", 2)
+    app.config.setdefault("JOB_FOLDER", os.path.join(app.instance_path, "jobs"))
+    # A job still running this many seconds after it started is presumed
+    # lost with the process that took it.
+    app.config.setdefault("JOB_STALE_AFTER", 3600)
+    # Generated files (PDF statements) are deleted after this many seconds.
+    app.config.setdefault("JOB_RESULT_MAX_AGE", 24 * 3600)
+    os.makedirs(app.config["JOB_FOLDER"], exist_ok=True)
+
+    _state["app"] = app
+    workers = app.config["JOB_WORKERS"]
+    _state["executor"] = ThreadPoolExecutor(workers, thread_name_prefix="job") if workers else None
+
+    with app.app_context():
+        fail_stale()
+        prune_expired()
+
+        # Pick up work queued by a process that exited before running it.
+        for job in Job.query.filter_by(status="queued").all():
+            _submit(job.id)
+
+
+def is_stale(job):
+    """Running for longer than JOB_STALE_AFTER: its worker most likely died."""
+    return job.status == "running" and job.started_at is not None and job.started_at < _stale_cutoff()
+
+
+def fail_stale():
+    """Mark stale running jobs failed and drop their uploads; returns how many.
+
+    They are not requeued: a job that took its process down would only do
+    it again. Imports resume where they stopped when the file is sent again.
+    """
+    stale = Job.query.filter(Job.status == "running", Job.started_at < _stale_cutoff()).all()
+
+    for job in stale:
+        path = json.loads(job.payload or "{}").get("path")
+        if path and os.path.exists(path):
+            os.remove(path)
+
+        job.status = "failed"
+        job.message = "Interrupted: the worker running this job stopped. Please try again."
+        job.finished_at = datetime.now()
+
+    db.session.commit()
+    return len(stale)
+
+
+def _stale_cutoff():
+    return datetime.now() - timedelta(seconds=_state["app"].config["JOB_STALE_AFTER"])
+
+
+def job_path(suffix):
+    return os.path.join(_state["app"].config["JOB_FOLDER"], f"{uuid.uuid4().hex}{suffix}")
+
+
+# ================= QUEUE =================
+def _queue_session():
+    # Its own session, so queueing from a view commits only the job row and
+    # leaves the caller's loaded objects unexpired (no refresh per row).
+    # Callers must not hold uncommitted writes: SQLite would block the insert.
+    return Session(db.engine, expire_on_commit=False)
+
+
+def enqueue(kind, user_id, **payload):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    with _queue_session() as session:
+        job = Job(user_id=user_id, kind=kind, status="queued", payload=_encode(payload))
+        session.add(job)
+        session.commit()
+
+    _submit(job.id)
+    return job
+
+
+def enqueue_unique(kind, user_id, **payload):
+    """Like enqueue, but reuse a queued job of the same kind for the user.
+
+    For idempotent refreshes where one pending run covers every request.
+    """
+    with _queue_session() as session:
+        pending = session.query(Job).filter_by(user_id=user_id, kind=kind, status="queued")\
+            .order_by(Job.id.desc()).first()
+    return pending or enqueue(kind, user_id, **payload)
+
+
+def enqueue_cached(kind, user_id, **payload):
+    """Like enqueue, but reuse an identical job whose file can still be served.
+
+    ``payload`` must name everything the output depends on (e.g. the
+    user's data_version). Queued and running twins are reused as well, so
+    repeated clicks build the file once. Queueing a new job deletes the
+    files it supersedes, see _prune_results.
+    """
+    with _queue_session() as session:
+        previous = session.query(Job).filter(
+            Job.user_id == user_id,
+            Job.kind == kind,
+            Job.payload == _encode(payload),
+            Job.status.in_(("queued", "running", "done"))
+        ).order_by(Job.id.desc()).first()
+
+        if previous is not None and (previous.status != "done" or _file_exists(previous.result_path)):
+            return previous
+
+        _prune_results(session, user_id, kind, payload)
+
+    return enqueue(kind, user_id, **payload)
+
+
+def _prune_results(session, user_id, kind, payload):
+    """Delete the files of the user's finished ``kind`` jobs that can't be
+    served again: those with this payload under an older ``version``, and
+    any finished more than JOB_RESULT_MAX_AGE ago.
+    """
+    same = {name: value for name, value in payload.items() if name != "version"}
+    expired = _expiry_cutoff()
+
+    done = session.query(Job).filter(
+        Job.user_id == user_id,
+        Job.kind == kind,
+        Job.status == "done",
+        Job.result_path.isnot(None)
+    )
+    for job in done:
+        previous = json.loads(job.payload or "{}")
+        previous.pop("version", None)
+        if previous == same or (job.finished_at is not None and job.finished_at < expired):
+            _drop_result(job)
+
+    session.commit()
+
+
+def prune_expired():
+    """Delete every user's job files older than JOB_RESULT_MAX_AGE."""
+    expired = Job.query.filter(
+        Job.status == "done",
+        Job.result_path.isnot(None),
+        Job.finished_at < _expiry_cutoff()
+    ).all()
+
+    for job in expired:
+        _drop_result(job)
+    db.session.commit()
+
+
+def _drop_result(job):
+    if _file_exists(job.result_path):
+        os.remove(job.result_path)
+    job.result_path = None
+    job.message = "File removed; export again for an up-to-date copy"
+
+
+def _expiry_cutoff():
+    return datetime.now() - timedelta(seconds=_state["app"].config["JOB_RESULT_MAX_AGE"])
+
+
+def _encode(payload):
+    return json.dumps(payload, sort_keys=True)
+
+
+def _file_exists(path):
+    return bool(path) and os.path.exists(path)
+
+
+def _submit(job_id):
+    if _state["executor"] is None:
+        _run(job_id)
+    else:
+        _state["executor"].submit(_run, job_id)
+
+
+def _run(job_id):
+    with _state["app"].app_context():
+        kind, user_id = db.session.query(Job.kind, Job.user_id).filter_by(id=job_id).one()
+
+        with _locks.setdefault((kind, user_id), threading.RLock()):
+            claimed = Job.query.filter_by(id=job_id, status="queued").update({
+                "status": "running",
+                "started_at": datetime.now()
+            })
+            db.session.commit()
+
+            if not claimed:
+                return
+
+            job = db.session.get(Job, job_id)
+            try:
+                HANDLERS[job.kind](job, json.loads(job.payload or "{}"))
+                job.status = "done"
+            except Exception as err:
+                db.session.rollback()
+                _state["app"].logger.exception("Job %s (%s) failed", job_id, job.kind)
+                job = db.session.get(Job, job_id)
+                job.status = "failed"
+                job.message = str(err)[:300]
+
+            job.finished_at = datetime.now()
+            db.session.commit()
+            db.session.remove()
+
+
+# ================= HANDLER HELPERS =================
+def report_progress(job, progress, total=None, message=None):
+    job.progress = progress
+    if total is not None:
+        job.total = total
+    if message is not None:
+        job.message = message
+    db.session.commit()
+
+
+def set_result(job, **result):
+    job.result = json.dumps(result, default=str)
+
+
+def result_of(job):
+    return json.loads(job.result) if job.result else {}
+
+
+def status_of(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": job.progress,
+        "total": job.total,
+        "message": job.message,
+        "result": result_of(job),
+        "ready": job.status == "done" and bool(job.result_path),
+        "stale": is_stale(job),
+    }
+
+
+# ================= HANDLERS =================
+@handler("import_csv")
+def _import_csv(job, payload):
+    import importer
+
+    path = payload["path"]
+    try:
+        with open(path, "rb") as stream:
+            result = importer.stream_import(
+                stream,
+                job.user_id,
+                filename=payload.get("filename"),
+                chunk_rows=payload.get("chunk_rows", importer.STREAM_CHUNK_ROWS),
+                on_chunk=lambda rows: report_progress(job, rows, message=f"{rows:,} rows processed")
+            )
+    finally:
+        os.remove(path)
+
+    # New labelled history: refresh the user's categoriser, forecast and anomaly
+    # flags. Queued before touching ``job`` so this session holds no write lock.
+    if result.inserted and not result.already_imported:
+        enqueue("train_category_model", job.user_id)
+        enqueue_unique("update_forecast", job.user_id)
+        enqueue_unique("detect_anomalies", job.user_id)
+
+    set_result(
+        job,
+        inserted=result.inserted,
+        failed=result.failed,
+        duplicates=result.duplicates,
+        errors=result.errors,
+        resumed_from=result.resumed_from,
+        already_imported=result.already_imported
+    )
+    job.message = f"{result.inserted:,} rows imported"
+    if result.duplicates:
+        job.message += f", {result.duplicates:,} duplicates skipped"
+
+
+@handler("dashboard_pdf")
+def _dashboard_pdf(job, payload):
+    import aggregates
+    import reports
+    from dates import parse_date
+
+    filters = {}
+    for name in ("since", "before"):
+        if payload.get(name):
+            filters[name] = parse_date(payload[name])
+    if payload.get("event_id"):
+        filters["event_id"] = payload["event_id"]
+
+    _, _, total = aggregates.type_summary(job.user_id, **filters)
+    report_progress(job, 0, total=total, message="Drawing statement")
+
+    path = job_path(".pdf")
+    rows = reports.statement_pdf(
+        job.user_id, path,
+        title=payload.get("title") or "Expense Statement",
+        period=payload.get("period") or "All time",
+        on_progress=lambda rows: report_progress(job, rows, message=f"{rows:,} of {total:,} rows"),
+        **filters
+    )
+    job.progress = rows
+    job.result_path = path
+    job.message = "Report ready"
+
+
+@handler("train_category_model")
+def _train_category_model(job, payload):
+    import category_model
+
+    stats = category_model.train(job.user_id)
+    set_result(job, **(stats or {}))
+    job.message = f"Trained on {stats['rows']} rows" if stats else "Not enough categorised history"
+
+
+@handler("update_forecast")
+def _update_forecast(job, payload):
+    import forecasting
+
+    job.message = forecasting.update(job.user_id)
+
+
+@handler("detect_anomalies")
+def _detect_anomalies(job, payload):
+    import anomalies
+
+    flagged = anomalies.update(job.user_id)
+    set_result(job, flagged=flagged)
+    job.message = f"{flagged} unusual expenses flagged"
+
+
+@handler("receipt_images")
+def _receipt_images(job, payload):
+    import receipts
+
+    made = receipts.make_images(payload["key"])
+    set_result(job, key=payload["key"], made=made)
+    job.message = f"Made {', '.join(made)}" if made else "Receipt images already up to date"
+
+
+@handler("rebuild_rollups")
+def _rebuild_rollups(job, payload):
+    import rollups
+
+    rows = rollups.rebuild(job.user_id)
+    set_result(job, rows=rows)
+    job.message = f"Rebuilt {rows} rollup rows"
@@ -0,0 +1,210 @@
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-endpoint request metrics, exported in the Prometheus text format at
+# /metrics: request count and latency histogram, SQL statements and time,
+# and template render time. Totals live in this process, so with several
+# gunicorn workers each scrape sees one worker (the pid label says which).
+#
+# Statements slower than SLOW_QUERY_MS also go to the "slow_sql" logger
+# (and to the SLOW_QUERY_LOG file, if set) with their EXPLAIN QUERY PLAN.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+slow_log = logging.getLogger("slow_sql")
+
+
+class EndpointStats:
+    """Running totals for one (endpoint, method)."""
+
+    def __init__(self):
+        self.responses = {}  # status code -> count
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.latency = 0.0
+        self.sql_time = 0.0
+        self.queries = 0
+        self.render_time = 0.0
+
+    def observe(self, status, latency, sql_time, queries, render_time):
+        self.responses[status] = self.responses.get(status, 0) + 1
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if latency <= bound:
+                self.buckets[index] += 1
+        self.count += 1
+        self.latency += latency
+        self.sql_time += sql_time
+        self.queries += queries
+        self.render_time += render_time
+
+
+_stats = {}
+_lock = threading.Lock()
+_slow = {"seconds": None, "count": 0}
+
+
+# ================= SQL TIMING =================
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _end_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["statement_started"].pop()
+
+    if has_request_context() and "sql_time" in g:
+        g.sql_time += elapsed
+
+    if _slow["seconds"] is not None and elapsed >= _slow["seconds"]:
+        _log_slow(cursor, statement, parameters, executemany, elapsed)
+
+
+@event.listens_for(Engine, "handle_error")
+def _statement_failed(context):
+    # after_cursor_execute never fires for a failed statement; drop its start.
+    started = context.connection.info.get("statement_started") if context.connection else None
+    if started and context.statement is not None:
+        started.pop()
+
+
+def _log_slow(cursor, statement, parameters, executemany, elapsed):
+    with _lock:
+        _slow["count"] += 1
+
+    plan = ""
+    if not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+        try:
+            # A separate DBAPI cursor: fires no engine events, leaves ``cursor`` alone.
+            rows = cursor.connection.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+            plan = "\n".join(f"  {row[-1]}" for row in rows)
+        except Exception as err:
+            plan = f"  (no plan: {err})"
+
+    where = f"{request.method} {request.path}" if has_request_context() else "background job"
+    slow_log.warning("%.1f ms in %s\n%s\n%s", elapsed * 1000, where, statement, plan)
+
+
+# ================= REQUEST TIMING =================
+def init_app(app):
+    app.config.setdefault("SLOW_QUERY_MS", None)  # None turns the slow-query log off
+    app.config.setdefault("SLOW_QUERY_LOG", None)  # file path; the "slow_sql" logger otherwise
+
+    if app.config["SLOW_QUERY_MS"] is not None:
+        _slow["seconds"] = app.config["SLOW_QUERY_MS"] / 1000
+    if app.config["SLOW_QUERY_LOG"]:
+        handler = logging.FileHandler(app.config["SLOW_QUERY_LOG"])
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_log.addHandler(handler)
+
+    app.before_request(_start)
+    app.after_request(_response_status)
+    app.teardown_request(_finish)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+
+
+def _start():
+    g.request_started = time.perf_counter()
+    g.sql_time = 0.0
+    g.render_time = 0.0
+
+
+def _render_started(sender, template, context, **extra):
+    g.render_started = time.perf_counter()
+
+
+def _render_finished(sender, template, context, **extra):
+    if "render_started" in g:
+        g.render_time += time.perf_counter() - g.pop("render_started")
+
+
+def _response_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+def _finish(exc):
+    """Record the request once it is over, including unhandled errors.
+
+    A teardown hook rather than after_request, which never sees a 500
+    that propagates (debug, testing) or one raised by a later hook.
+    ``exc`` is set then, and the request counts as a 500.
+    """
+    if "request_started" not in g:
+        return
+
+    status = 500 if exc is not None else g.get("response_status", 500)
+    latency = time.perf_counter() - g.request_started
+    key = (request.endpoint or "unmatched", request.method)
+
+    with _lock:
+        stats = _stats.get(key)
+        if stats is None:
+            stats = _stats[key] = EndpointStats()
+        stats.observe(
+            status,
+            latency,
+            g.sql_time,
+            g.get("query_count", 0),  # counted by querycount
+            g.render_time
+        )
+
+
+# ================= EXPORT =================
+def _labels(endpoint, method, **extra):
+    pairs = {"endpoint": endpoint, "method": method, **extra}
+    return ",".join(f'{name}="{value}"' for name, value in pairs.items())
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        return _render(sorted(_stats.items()), _slow["count"])
+
+
+def _render(items, slow_count):
+    pid = os.getpid()
+    lines = [
+        "# HELP app_requests_total Requests handled, by response status.",
+        "# TYPE app_requests_total counter",
+    ]
+    for (endpoint, method), stats in items:
+        for status, count in sorted(stats.responses.items()):
+            lines.append(f"app_requests_total{{{_labels(endpoint, method, status=status, pid=pid)}}} {count}")
+
+    lines += [
+        "# HELP app_request_duration_seconds Time from request start to response.",
+        "# TYPE app_request_duration_seconds histogram",
+    ]
+    for (endpoint, method), stats in items:
+        labels = _labels(endpoint, method, pid=pid)
+        for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+            lines.append(f'app_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'app_request_duration_seconds_bucket{{{labels},le="+Inf"}} {stats.count}')
+        lines.append(f"app_request_duration_seconds_sum{{{labels}}} {stats.latency:.6f}")
+        lines.append(f"app_request_duration_seconds_count{{{labels}}} {stats.count}")
+
+    for name, attribute, help_text in (
+        ("app_sql_queries_total", "queries", "SQL statements run while handling requests."),
+        ("app_sql_seconds_total", "sql_time", "Time spent executing SQL while handling requests."),
+        ("app_template_render_seconds_total", "render_time", "Time spent rendering templates."),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (endpoint, method), stats in items:
+            value = getattr(stats, attribute)
+            value = f"{value:.6f}" if isinstance(value, float) else value
+            lines.append(f"{name}{{{_labels(endpoint, method, pid=pid)}}} {value}")
+
+    lines += [
+        "# HELP app_slow_queries_total Statements slower than SLOW_QUERY_MS (requests and jobs).",
+        "# TYPE app_slow_queries_total counter",
+        f'app_slow_queries_total{{pid="{pid}"}} {slow_count}',
+    ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,272 @@
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import inspect, insert, select, func, text, literal
+from sqlalchemy.exc import OperationalError
+from models import (
+    db, Expense, Budget, BudgetMonth, Event, ExpenseRollup, CsvImport, Job, CategoryRule,
+    ForecastState, CategoryStats, AnomalyScan, Anomaly, ImportDigest
+)
+from dates import parse_date, month_start
+import database
+import dedup
+import rollups
+import search
+
+# Single-row table holding the version of the last applied migration.
+schema_version = db.Table(
+    "schema_version",
+    db.Column("version", db.Integer, nullable=False)
+)
+
+
+# ================= MIGRATIONS =================
+# Each step receives a connection inside its own transaction and must be
+# safe to run on a database that db.create_all() built before migrations
+# existed (version 1), and safe to run again (checkfirst / column checks).
+
+def _baseline(conn):
+    pass
+
+
+def _add_expense_rollup(conn):
+    ExpenseRollup.__table__.create(conn, checkfirst=True)
+
+    empty = conn.execute(select(func.count()).select_from(ExpenseRollup.__table__)).scalar() == 0
+    if empty:
+        conn.execute(
+            insert(ExpenseRollup).from_select(
+                list(rollups.KEY_COLUMNS) + ["total", "count"],
+                rollups.raw_groups()
+            )
+        )
+
+
+def _add_access_indexes(conn):
+    for model in (Expense, Budget, Event):
+        for index in model.__table__.indexes:
+            if index.name == "ix_expense_user_fingerprint":
+                continue  # its column only arrives in _add_expense_fingerprint
+            index.create(conn, checkfirst=True)
+
+
+def _normalise_dates(conn):
+    # SQLite cannot ALTER a column's type, and doesn't need to: the Date
+    # type stores ISO-8601 text, so rewriting every value as YYYY-MM-DD
+    # (or NULL when unreadable) is the whole conversion.
+    for table in ("expense", "event"):
+        updates = []
+
+        for row_id, value in conn.execute(text(f"SELECT id, date FROM {table}")):
+            parsed = parse_date(value)
+            normalised = parsed.isoformat() if parsed else None
+            if normalised != value:
+                updates.append({"id": row_id, "date": normalised})
+
+        for start in range(0, len(updates), 10_000):
+            conn.execute(
+                text(f"UPDATE {table} SET date = :date WHERE id = :id"),
+                updates[start:start + 10_000]
+            )
+
+    # Rollup keys were built from the old strings.
+    conn.execute(ExpenseRollup.__table__.delete())
+    conn.execute(
+        insert(ExpenseRollup).from_select(
+            list(rollups.KEY_COLUMNS) + ["total", "count"],
+            rollups.raw_groups()
+        )
+    )
+    for index in ExpenseRollup.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def _add_csv_import(conn):
+    CsvImport.__table__.create(conn, checkfirst=True)
+
+
+def _add_job(conn):
+    Job.__table__.create(conn, checkfirst=True)
+
+
+def _add_category_rule(conn):
+    CategoryRule.__table__.create(conn, checkfirst=True)
+
+
+def _add_search_index(conn):
+    search.install(conn)
+    search.rebuild(conn)
+
+
+def _add_user_data_version(conn):
+    columns = {column["name"] for column in inspect(conn).get_columns("user")}
+    if "data_version" not in columns:
+        conn.execute(text(
+            'ALTER TABLE "user" ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0'
+        ))
+
+
+
+def _add_budget_month(conn):
+    BudgetMonth.__table__.create(conn, checkfirst=True)
+
+    # Record today's limits as this month's; earlier months fall back to them.
+    this_month = month_start()
+    recorded = select(BudgetMonth.budget_id).where(BudgetMonth.month == this_month)
+    conn.execute(
+        insert(BudgetMonth).from_select(
+            ["budget_id", "month", "monthly_limit"],
+            select(Budget.id, literal(this_month), Budget.monthly_limit)
+            .where(Budget.id.not_in(recorded))
+        )
+    )
+
+
+
+def _add_forecast_state(conn):
+    ForecastState.__table__.create(conn, checkfirst=True)
+
+
+def _add_anomalies(conn):
+    for model in (CategoryStats, AnomalyScan, Anomaly):
+        model.__table__.create(conn, checkfirst=True)
+
+
+def _add_expense_fingerprint(conn):
+    columns = {column["name"] for column in inspect(conn).get_columns("expense")}
+    if "fingerprint" not in columns:
+        conn.execute(text("ALTER TABLE expense ADD COLUMN fingerprint VARCHAR(48)"))
+
+    columns = {column["name"] for column in inspect(conn).get_columns("csv_import")}
+    if "rows_duplicate" not in columns:
+        conn.execute(text("ALTER TABLE csv_import ADD COLUMN rows_duplicate INTEGER DEFAULT 0"))
+
+    # Existing duplicates get distinct ordinals here; `flask expenses dedupe`
+    # reports (and with --merge removes) them afterwards.
+    dedup.backfill(conn)
+    for index in Expense.__table__.indexes:
+        if index.name == "ix_expense_user_fingerprint":
+            index.create(conn, checkfirst=True)
+
+
+def _add_user_insights_version(conn):
+    columns = {column["name"] for column in inspect(conn).get_columns("user")}
+    if "insights_version" not in columns:
+        conn.execute(text(
+            'ALTER TABLE "user" ADD COLUMN insights_version INTEGER NOT NULL DEFAULT 0'
+        ))
+
+
+def _add_import_digest(conn):
+    ImportDigest.__table__.create(conn, checkfirst=True)
+
+
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "expense rollup table", _add_expense_rollup),
+    (3, "composite indexes for expense/budget/event lookups", _add_access_indexes),
+    (4, "typed expense/event dates", _normalise_dates),
+    (5, "csv import progress", _add_csv_import),
+    (6, "background jobs", _add_job),
+    (7, "user category rules", _add_category_rule),
+    (8, "full-text search index", _add_search_index),
+    (9, "per-user data version for the response cache", _add_user_data_version),
+    (10, "per-month budget limits", _add_budget_month),
+    (11, "cached forecast state", _add_forecast_state),
+    (12, "anomaly detection state and flags", _add_anomalies),
+    (13, "expense content fingerprints for import de-duplication", _add_expense_fingerprint),
+    (14, "import digest counts that survive a resume", _add_import_digest),
+    (15, "per-user insights version for the response cache", _add_user_insights_version),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ================= RUNNER =================
+def current_version():
+    if not inspect(db.engine).has_table("schema_version"):
+        return 0
+
+    with db.engine.connect() as conn:
+        return conn.execute(select(schema_version.c.version)).scalar() or 0
+
+
+def _stamp(conn, version):
+    conn.execute(schema_version.delete())
+    conn.execute(schema_version.insert().values(version=version))
+
+
+# Seconds a booting process waits for another one's migrations to finish.
+LOCK_TIMEOUT = 600
+
+
+@contextmanager
+def _exclusive():
+    """A connection whose transaction holds the database write lock.
+
+    SQLite waits SQLITE_BUSY_TIMEOUT_MS for the lock; a long migration in
+    another process outlasts that, so keep asking until LOCK_TIMEOUT.
+    """
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while True:
+        conn = db.engine.connect()
+        try:
+            database.begin_immediate(conn)
+            break
+        except OperationalError as err:
+            conn.close()
+            if "database is locked" not in str(err) or time.monotonic() > deadline:
+                raise
+
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _prepare(conn):
+    """Create schema_version if needed and return the stamped version."""
+    inspector = inspect(conn)
+    if inspector.has_table("schema_version"):
+        return conn.execute(select(schema_version.c.version)).scalar() or 0
+
+    schema_version.create(conn)
+
+    if not inspector.has_table("expense"):
+        # Fresh database: build the current schema in one go.
+        db.metadata.create_all(conn)
+        search.install(conn)
+        _stamp(conn, LATEST_VERSION)
+        return LATEST_VERSION
+
+    # Tables made by the old bare db.create_all() call.
+    _stamp(conn, 1)
+    return 1
+
+
+def upgrade(echo=None):
+    """Bring the database up to LATEST_VERSION. Returns the applied steps.
+
+    Every worker calls this at startup, so each step runs under the write
+    lock with the version re-read inside it: the first process applies a
+    step, the others wait and then find it done.
+    """
+    applied = []
+    if current_version() == LATEST_VERSION:
+        return applied
+
+    while True:
+        with _exclusive() as conn:
+            version = _prepare(conn)
+            pending = [migration for migration in MIGRATIONS if migration[0] > version]
+            if not pending:
+                return applied
+
+            number, name, step = pending[0]
+            step(conn)
+            _stamp(conn, number)
+
+        applied.append((number, name))
+        if echo:
+            echo(f"Applied migration {number}: {name}")
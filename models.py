@@ -1,8 +1,13 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.orm import load_only
 
 db = SQLAlchemy()
 
+# Relationships are "raise_on_sql": nothing may lazy-load them, so a view
+# can't slip into one query per row. Query what a page needs explicitly
+# (a join, selectinload, or the columns themselves) instead.
+
 # ================= USER =================
 class User(UserMixin, db.Model):
     __tablename__ = "user"
@@ -12,8 +17,17 @@ class User(UserMixin, db.Model):
     email = db.Column(db.String(150), unique=True, nullable=False)
     password = db.Column(db.String(200), nullable=False)
 
-    expenses = db.relationship("Expense", backref="user", lazy=True)
-    budgets = db.relationship("Budget", backref="user", lazy=True)
+    # Bumped by every write to the user's data; part of the response cache key.
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    # Bumped when background jobs refresh the forecast or anomaly flags.
+    insights_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+
+    expenses = db.relationship(
+        "Expense", backref=db.backref("user", lazy="raise_on_sql"), lazy="raise_on_sql"
+    )
+    budgets = db.relationship(
+        "Budget", backref=db.backref("user", lazy="raise_on_sql"), lazy="raise_on_sql"
+    )
 
 
 # ================= EVENT =================
@@ -23,16 +37,21 @@ class Event(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(150), nullable=False)
     description = db.Column(db.String(300))
-    date = db.Column(db.String(50))
+    date = db.Column(db.Date)
     budget_limit = db.Column(db.Float, default=0)
     created_by = db.Column(db.Integer, db.ForeignKey("user.id"))
     created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
-    
+
+    __table_args__ = (
+        db.Index("ix_event_created_by", "created_by", "id"),
+    )
+
     expenses = db.relationship(
     "Expense",
-    backref="event",
+    backref=db.backref("event", lazy="raise_on_sql"),
     cascade="all, delete-orphan",
-    passive_deletes=True
+    passive_deletes=True,
+    lazy="raise_on_sql"
 )
 
 
@@ -52,7 +71,7 @@ class Expense(db.Model):
     amount = db.Column(db.Float, nullable=False)
     category = db.Column(db.String(100))
     description = db.Column(db.String(200))
-    date = db.Column(db.String(50))
+    date = db.Column(db.Date)
 
     transaction_type = db.Column(db.String(20), default="expense")
 
@@ -63,6 +82,252 @@ class Expense(db.Model):
 
     receipt = db.Column(db.String(300))
 
+    # "<content digest>:<ordinal>", taken at creation; see dedup.py.
+    fingerprint = db.Column(db.String(48))
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "event_id": self.event_id,
+            "amount": self.amount,
+            "category": self.category,
+            "description": self.description,
+            "date": self.date.isoformat() if self.date else None,
+            "transaction_type": self.transaction_type,
+            "account": self.account,
+            "notes": self.notes,
+            "tags": self.tags,
+            "receipt": self.receipt,
+        }
+
+    # Every hot query filters by user first, then one of these columns.
+    __table_args__ = (
+        db.Index("ix_expense_user_event", "user_id", "event_id"),
+        db.Index("ix_expense_user_type", "user_id", "transaction_type"),
+        db.Index("ix_expense_user_category", "user_id", "category"),
+        db.Index("ix_expense_user_date", "user_id", "date"),
+        db.Index("ix_expense_user_fingerprint", "user_id", "fingerprint", unique=True),
+    )
+
+
+def expense_list_columns():
+    """Loader option for list pages: just the columns their rows render.
+
+    Any other attribute raises rather than being fetched row by row.
+    """
+    return load_only(
+        Expense.id, Expense.date, Expense.description, Expense.category,
+        Expense.amount, Expense.transaction_type, Expense.account, Expense.receipt,
+        raiseload=True
+    )
+
+
+# ================= EXPENSE ROLLUP =================
+class ExpenseRollup(db.Model):
+    """Pre-summed expenses, one row per (user, event, category, date, type)."""
+    __tablename__ = "expense_rollup"
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    user_id = db.Column(
+    db.Integer,
+    db.ForeignKey("user.id", ondelete="CASCADE"),
+    nullable=False
+)
+    event_id = db.Column(
+    db.Integer,
+    db.ForeignKey("event.id", ondelete="CASCADE"),
+    nullable=True
+)
+
+    category = db.Column(db.String(100))
+    date = db.Column(db.Date)
+    transaction_type = db.Column(db.String(20))
+
+    total = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index(
+            "ix_expense_rollup_key",
+            "user_id", "event_id", "category", "date", "transaction_type"
+        ),
+        db.Index("ix_expense_rollup_user_date", "user_id", "date"),
+    )
+
+
+# ================= CATEGORY RULE =================
+class CategoryRule(db.Model):
+    """User-defined keyword -> category rule, checked before the defaults."""
+    __tablename__ = "category_rule"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+
+    keyword = db.Column(db.String(100), nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+
+
+# ================= CSV IMPORT PROGRESS =================
+class CsvImport(db.Model):
+    """Progress of a chunked CSV import, so a failed upload can resume."""
+    __tablename__ = "csv_import"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+
+    filename = db.Column(db.String(300))
+    checksum = db.Column(db.String(64), nullable=False)  # sha256 of the upload
+    status = db.Column(db.String(20), default="running")  # running / failed / done
+
+    rows_read = db.Column(db.Integer, default=0)  # data rows committed so far
+    rows_inserted = db.Column(db.Integer, default=0)
+    rows_skipped = db.Column(db.Integer, default=0)
+    rows_duplicate = db.Column(db.Integer, default=0)  # already imported before
+    chunks_committed = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    updated_at = db.Column(
+        db.DateTime,
+        default=db.func.current_timestamp(),
+        onupdate=db.func.current_timestamp()
+    )
+
+    __table_args__ = (
+        db.Index("ix_csv_import_user_checksum", "user_id", "checksum"),
+    )
+
+
+class ImportDigest(db.Model):
+    """How often a row digest has occurred so far in an unfinished import.
+
+    Kept in the database rather than in memory so a resumed import goes on
+    numbering repeated lines where it stopped (see dedup.py). Dropped once
+    the import is done.
+    """
+    __tablename__ = "import_digest"
+
+    csv_import_id = db.Column(
+        db.Integer, db.ForeignKey("csv_import.id", ondelete="CASCADE"), primary_key=True
+    )
+    digest = db.Column(db.String(40), primary_key=True)
+    seen = db.Column(db.Integer, nullable=False)
+
+
+# ================= BACKGROUND JOB =================
+class Job(db.Model):
+    """A unit of background work (import, PDF export, rollup rebuild)."""
+    __tablename__ = "job"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), default="queued")  # queued / running / done / failed
+    payload = db.Column(db.Text)  # JSON arguments for the handler
+    result = db.Column(db.Text)  # JSON summary written by the handler
+
+    progress = db.Column(db.Integer, default=0)
+    total = db.Column(db.Integer)
+    message = db.Column(db.String(300))
+    result_path = db.Column(db.String(500))  # generated file, if any
+
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_job_user_created", "user_id", "id"),
+        db.Index("ix_job_status", "status"),
+    )
+
+
+# ================= FORECAST =================
+class ForecastState(db.Model):
+    """A user's fitted spend-forecast model (see forecasting.py)."""
+    __tablename__ = "forecast_state"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True
+    )
+
+    state = db.Column(db.Text)  # JSON smoothing state
+    fitted_through = db.Column(db.Date)  # last day folded into ``state``
+    data_version = db.Column(db.Integer, default=0)  # User.data_version it reflects
+    updated_at = db.Column(db.DateTime)
+
+
+# ================= ANOMALIES =================
+class CategoryStats(db.Model):
+    """Robust spread of a user's expenses in one category (see anomalies.py)."""
+    __tablename__ = "category_stats"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    category = db.Column(db.String(100))
+
+    # Both on the log1p(amount) scale the scores use.
+    median = db.Column(db.Float)
+    mad = db.Column(db.Float)
+    count = db.Column(db.Integer, default=0)  # expenses seen so far
+    fitted_count = db.Column(db.Integer, default=0)  # expenses median/mad came from
+    updated_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_category_stats_user_category", "user_id", "category", unique=True),
+    )
+
+
+class AnomalyScan(db.Model):
+    """How far through a user's expenses anomaly scoring has got."""
+    __tablename__ = "anomaly_scan"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True
+    )
+    last_expense_id = db.Column(db.Integer, default=0)
+
+
+class Anomaly(db.Model):
+    """An expense flagged as unusual for its category."""
+    __tablename__ = "anomaly"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer,
+        db.ForeignKey("user.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    expense_id = db.Column(
+        db.Integer,
+        db.ForeignKey("expense.id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True
+    )
+
+    category = db.Column(db.String(100))
+    amount = db.Column(db.Float)
+    score = db.Column(db.Float)  # robust z-score when flagged
+    median = db.Column(db.Float)  # the category's typical amount at the time
+    created_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index("ix_anomaly_user_expense", "user_id", "expense_id"),
+    )
+
 
 # ================= BUDGET =================
 class Budget(db.Model):
@@ -74,5 +339,31 @@ class Budget(db.Model):
     budget_type = db.Column(db.String(20), default="personal")  # personal OR event
     event_id = db.Column(db.Integer, db.ForeignKey("event.id"), nullable=True)
 
+    __table_args__ = (
+        db.Index("ix_budget_user_event", "user_id", "event_id"),
+    )
+
+
+class BudgetMonth(db.Model):
+    """The limit a budget had in one month (``month`` is the 1st).
+
+    ``Budget.monthly_limit`` stays the current limit; these rows let the
+    history show what the limit actually was in earlier months.
+    """
+    __tablename__ = "budget_month"
+
+    id = db.Column(db.Integer, primary_key=True)
+    budget_id = db.Column(
+        db.Integer,
+        db.ForeignKey("budget.id", ondelete="CASCADE"),
+        nullable=False
+    )
+    month = db.Column(db.Date, nullable=False)
+    monthly_limit = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index("ix_budget_month_budget_month", "budget_id", "month", unique=True),
+    )
+
 
     Transaction = Expense  # This creates a "nickname" so both names work
\ No newline at end of file
@@ -0,0 +1,106 @@
+from sqlalchemy import and_, or_
+from models import db, Expense
+from dates import parse_date
+
+# Keyset ("seek") pagination over Expense ordered by (date DESC, id DESC).
+# The cursor is the last row of the previous page, so every page is an
+# index range scan on (user_id, date) no matter how deep the user scrolls.
+# SQLite sorts NULL dates last in DESC order; the cursor handles that.
+
+
+def encode_cursor(expense):
+    day = expense.date.isoformat() if expense.date else ""
+    return f"{day}:{expense.id}"
+
+
+def decode_cursor(value):
+    """``"2026-03-01:42"`` -> ``(date, 42)``; ``None`` for a bad cursor."""
+    if not value or ":" not in value:
+        return None
+
+    day, _, expense_id = value.partition(":")
+    try:
+        expense_id = int(expense_id)
+    except ValueError:
+        return None
+
+    parsed = parse_date(day) if day else None
+    if day and parsed is None:
+        return None
+
+    return parsed, expense_id
+
+
+def after(cursor):
+    day, expense_id = cursor
+
+    if day is None:
+        return and_(Expense.date.is_(None), Expense.id < expense_id)
+
+    return or_(
+        Expense.date < day,
+        and_(Expense.date == day, Expense.id < expense_id),
+        Expense.date.is_(None)
+    )
+
+
+def keyset_page(query, cursor, page_size):
+    """Return ``(rows, next_cursor)``; ``next_cursor`` is None on the last page."""
+    decoded = decode_cursor(cursor)
+    if decoded:
+        query = query.filter(after(decoded))
+
+    rows = query.order_by(Expense.date.desc(), Expense.id.desc())\
+        .limit(page_size + 1).all()
+
+    if len(rows) > page_size:
+        return rows[:page_size], encode_cursor(rows[page_size - 1])
+
+    return rows, None
+
+
+# ================= BATCHES =================
+# Forward iteration over every row (reports, exports): (date, id) ascending,
+# one short query per batch, so no read transaction stays open between
+# batches and the caller may commit or yield to a slow client meanwhile.
+
+def expense_batches(query, size):
+    """Yield lists of rows from ``query``, a ``select`` over Expense.
+
+    ``query`` must select ``Expense.id`` and ``Expense.date``. SQLite sorts
+    undated rows first in ascending order.
+    """
+    query = query.order_by(Expense.date, Expense.id).limit(size)
+
+    last = None
+    while True:
+        if last is None:
+            batch_query = query
+        elif last.date is None:
+            batch_query = query.where(or_(Expense.date.isnot(None), Expense.id > last.id))
+        else:
+            batch_query = query.where(
+                Expense.date >= last.date,
+                or_(Expense.date > last.date, Expense.id > last.id)
+            )
+
+        batch = db.session.execute(batch_query).all()
+        if batch:
+            yield batch
+        if len(batch) < size:
+            return
+        last = batch[-1]
+
+
+def id_batches(query, id_column, size):
+    """Like expense_batches, for any ``select`` including ``id_column``, in id order."""
+    query = query.order_by(id_column).limit(size)
+
+    last = None
+    while True:
+        batch = db.session.execute(query if last is None else query.where(id_column > last)).all()
+        if batch:
+            yield batch
+        if len(batch) < size:
+            return
+        last = batch[-1][0]
@@ -0,0 +1,69 @@
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Counts the SQL statements each request runs and checks them against a
+# budget, so an N+1 pattern (a query per row, e.g. a lazy relationship
+# touched in a template loop) shows up as soon as a page has a few rows.
+#
+# The count goes out as an ``X-Query-Count`` header. Over budget, strict
+# mode (the default under TESTING) raises QueryBudgetExceeded, which the
+# test client re-raises; otherwise a warning is logged.
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "query_count" in g:
+        g.query_count += 1
+        if current_app.config["QUERY_LOG_STATEMENTS"]:
+            g.query_statements.append(statement)
+
+
+def init_app(app):
+    app.config.setdefault("QUERY_BUDGET", 20)
+    app.config.setdefault("QUERY_BUDGET_STRICT", None)  # None: strict when TESTING
+    app.config.setdefault("QUERY_LOG_STATEMENTS", False)
+
+    app.before_request(_start)
+    app.after_request(_check)
+
+
+def budget(limit):
+    """Per-view statement budget, overriding QUERY_BUDGET."""
+    def decorate(view):
+        view.query_budget = limit
+        return view
+    return decorate
+
+
+def _start():
+    g.query_count = 0
+    g.query_statements = []
+
+
+def _check(response):
+    count = g.get("query_count")
+    if count is None:
+        return response
+
+    response.headers["X-Query-Count"] = str(count)
+
+    view = current_app.view_functions.get(request.endpoint)
+    limit = getattr(view, "query_budget", current_app.config["QUERY_BUDGET"])
+    if count <= limit:
+        return response
+
+    message = f"{request.method} {request.path} ran {count} SQL statements (budget {limit})"
+    if g.query_statements:
+        message += ":\n" + "\n".join(g.query_statements)
+
+    strict = current_app.config["QUERY_BUDGET_STRICT"]
+    if strict or (strict is None and current_app.testing):
+        raise QueryBudgetExceeded(message)
+
+    current_app.logger.warning(message)
+    return response
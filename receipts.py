@@ -0,0 +1,141 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from flask import current_app
+from PIL import Image, ImageOps
+
+# Content-addressed receipt storage. A receipt is stored once under the
+# sha256 of its bytes ("<sha256>.<ext>", the value kept in
+# Expense.receipt), so identical uploads share a file and names can never
+# collide. Files live in RECEIPT_FOLDER/<first two hex digits>/.
+#
+# Uploads are copied to disk a chunk at a time while being hashed. The
+# thumbnail and the compressed preview are drawn afterwards by a
+# "receipt_images" job. A key never changes content, so app.receipt_file
+# serves them with a year-long immutable Cache-Control.
+
+CHUNK_SIZE = 1 << 20
+EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".pdf"}
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+# variant -> (bounding box, JPEG quality)
+VARIANTS = {
+    "thumb": ((320, 320), 75),
+    "preview": ((1600, 1600), 82),
+}
+
+
+def init_app(app):
+    app.config.setdefault("RECEIPT_FOLDER", os.path.join(app.instance_path, "receipts"))
+    app.config.setdefault("RECEIPT_MAX_BYTES", 20 * 1024 * 1024)
+    os.makedirs(app.config["RECEIPT_FOLDER"], exist_ok=True)
+
+
+# ================= STORAGE =================
+def is_key(value):
+    """True for stored receipts; older rows hold a bare filename in UPLOAD_FOLDER."""
+    return bool(value) and KEY_PATTERN.match(value) is not None
+
+
+def path_for(key, variant=None):
+    digest = key.split(".", 1)[0]
+    name = f"{digest}.{variant}.jpg" if variant else key
+    return os.path.join(current_app.config["RECEIPT_FOLDER"], digest[:2], name)
+
+
+def store(stream, filename):
+    """Copy an upload into the store and return its key.
+
+    Raises ValueError for a file type we don't keep or one over
+    RECEIPT_MAX_BYTES. Storing bytes that are already there only drops
+    the temporary copy.
+    """
+    ext = os.path.splitext(filename or "")[1].lower()
+    if ext not in EXTENSIONS:
+        raise ValueError("Receipts must be an image (PNG, JPEG, GIF, WebP) or a PDF")
+    if ext == ".jpeg":
+        ext = ".jpg"
+
+    root = current_app.config["RECEIPT_FOLDER"]
+    limit = current_app.config["RECEIPT_MAX_BYTES"]
+    digest = hashlib.sha256()
+    size = 0
+
+    # Same filesystem as the store, so the final rename is atomic.
+    handle, temp_path = tempfile.mkstemp(dir=root, suffix=".part")
+    try:
+        with os.fdopen(handle, "wb") as temp:
+            for block in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                size += len(block)
+                if size > limit:
+                    raise ValueError(f"Receipts can be at most {limit // (1024 * 1024)} MB")
+                digest.update(block)
+                temp.write(block)
+
+        key = digest.hexdigest() + ext
+        path = path_for(key)
+        if os.path.exists(path):
+            os.remove(temp_path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return key
+
+
+# ================= THUMBNAILS =================
+def ext_of(key):
+    return "." + key.split(".", 1)[1]
+
+
+def has_images(key):
+    return ext_of(key) == ".pdf" or all(os.path.exists(path_for(key, name)) for name in VARIANTS)
+
+
+def make_images(key):
+    """Draw the missing variants of an image receipt; returns their names."""
+    if ext_of(key) == ".pdf":
+        return []
+
+    missing = [name for name in VARIANTS if not os.path.exists(path_for(key, name))]
+    if not missing:
+        return []
+
+    with Image.open(path_for(key)) as image:
+        # JPEGs can decode straight at a fraction of full size.
+        image.draft("RGB", max(size for size, _ in VARIANTS.values()))
+        image = ImageOps.exif_transpose(image)
+
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            flat = Image.new("RGB", image.size, "white")
+            flat.paste(image, mask=image.getchannel("A"))
+            image = flat
+        else:
+            image = image.convert("RGB")
+
+        for name in sorted(missing, key=lambda name: -VARIANTS[name][0][0]):
+            size, quality = VARIANTS[name]
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+
+            path = path_for(key, name)
+            temp_path = path + ".part"
+            image.save(temp_path, "JPEG", quality=quality, optimize=True, progressive=True)
+            os.replace(temp_path, path)
+
+    return missing
+
+
+def schedule(user_id, key):
+    """Queue the thumbnail job unless the variants already exist."""
+    if has_images(key):
+        return None
+
+    import jobs
+    return jobs.enqueue("receipt_images", user_id, key=key)
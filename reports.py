@@ -0,0 +1,269 @@
+from reportlab.graphics import renderPDF
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.piecharts import Pie
+from reportlab.graphics.shapes import Drawing, Rect, String
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from sqlalchemy import select
+
+from models import Expense
+import aggregates
+import pagination
+
+# Multi-page expense statements. The summary page (totals, a category pie
+# and a spending trend) comes from the rollup aggregates; the transaction
+# table is then drawn from plain row tuples fetched ROWS_PER_FETCH at a
+# time, so no ORM objects are built and the fetch itself stays bounded.
+# The document does not: reportlab's canvas holds every finished page
+# until save(), so memory still grows with the page count (about 28 MB
+# over 1,800 pages for 100k rows, see benchmarks/bench_reports.py).
+
+PAGE_WIDTH, PAGE_HEIGHT = letter
+MARGIN = 40
+ROW_HEIGHT = 13
+ROWS_PER_PAGE = int((PAGE_HEIGHT - 2 * MARGIN - 4 - ROW_HEIGHT) // ROW_HEIGHT) + 1
+ROWS_PER_FETCH = 2_000
+PIE_SLICES = 7  # the rest are merged into "Other"
+
+# (heading, x offset, width in characters or None for right-aligned amount)
+COLUMNS = (
+    ("Date", 0, 10),
+    ("Description", 62, 44),
+    ("Category", 290, 16),
+    ("Account", 380, 10),
+    ("Type", 440, 8),
+    ("Amount (INR)", 532, None),
+)
+
+CHART_COLORS = [
+    colors.HexColor(c) for c in
+    ("#2563eb", "#f59e0b", "#10b981", "#ef4444", "#8b5cf6", "#06b6d4", "#ec4899", "#94a3b8")
+]
+
+
+def _money(value):
+    return f"{value or 0:,.2f}"
+
+
+def _clip(value, width):
+    value = "" if value is None else str(value)
+    return value if len(value) <= width else value[:width - 1] + "…"
+
+
+# ================= CHARTS =================
+def _category_pie(totals):
+    totals = sorted(((c or "Uncategorised", t) for c, t in totals if t), key=lambda item: -item[1])
+    if len(totals) > PIE_SLICES:
+        totals = totals[:PIE_SLICES - 1] + [("Other", sum(t for _, t in totals[PIE_SLICES - 1:]))]
+
+    drawing = Drawing(260, 190)
+    drawing.add(String(0, 178, "Spending by category", fontName="Helvetica-Bold", fontSize=10))
+    if not totals:
+        drawing.add(String(0, 150, "No expenses in this period", fontSize=9))
+        return drawing
+
+    pie = Pie()
+    pie.x, pie.y, pie.width, pie.height = 10, 10, 140, 140
+    pie.data = [t for _, t in totals]
+    pie.slices.strokeColor = colors.white
+    for index in range(len(totals)):
+        pie.slices[index].fillColor = CHART_COLORS[index % len(CHART_COLORS)]
+    drawing.add(pie)
+
+    grand = sum(pie.data)
+    for index, (category, total) in enumerate(totals):
+        y = 140 - index * 16
+        drawing.add(Rect(165, y, 7, 7, fillColor=CHART_COLORS[index % len(CHART_COLORS)], strokeColor=None))
+        drawing.add(String(177, y, f"{_clip(category, 12)} {total / grand:.0%}", fontSize=8))
+    return drawing
+
+
+def _trend_bars(points, title):
+    drawing = Drawing(PAGE_WIDTH - 2 * MARGIN, 190)
+    drawing.add(String(0, 178, title, fontName="Helvetica-Bold", fontSize=10))
+    if not points:
+        drawing.add(String(0, 150, "No expenses in this period", fontSize=9))
+        return drawing
+
+    chart = VerticalBarChart()
+    chart.x, chart.y = 50, 30
+    chart.width, chart.height = PAGE_WIDTH - 2 * MARGIN - 60, 130
+    chart.data = [[float(total or 0) for _, total in points]]
+    chart.bars[0].fillColor = CHART_COLORS[0]
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.labels.fontSize = 7
+    chart.categoryAxis.categoryNames = [str(label) for label, _ in points]
+    chart.categoryAxis.labels.fontSize = 6
+    chart.categoryAxis.labels.angle = 45 if len(points) > 12 else 0
+    chart.categoryAxis.labels.boxAnchor = "ne" if len(points) > 12 else "n"
+    # Every label on a long daily trend would overlap; show about 15.
+    step = max(1, len(points) // 15)
+    chart.categoryAxis.categoryNames = [
+        label if index % step == 0 else "" for index, label in enumerate(chart.categoryAxis.categoryNames)
+    ]
+    drawing.add(chart)
+    return drawing
+
+
+def _trend(user_id, filters):
+    """Daily totals for ranges of up to two months, monthly otherwise."""
+    since, before = filters.get("since"), filters.get("before")
+    if since and before and (before - since).days <= 62:
+        return aggregates.daily_totals(user_id, **filters), "Daily spending"
+    return aggregates.monthly_totals(user_id, **filters), "Monthly spending"
+
+
+# ================= STATEMENT =================
+class StatementWriter:
+    """Lays the transaction table out a page at a time.
+
+    Rows are buffered until a page is full, then each column is drawn as a
+    single text object. reportlab holds every page's content stream until
+    save, and this keeps those several times smaller (and faster to build)
+    than a drawString per cell.
+    """
+
+    def __init__(self, pdf, title):
+        self.pdf = pdf
+        self.title = title
+        self.page = 0
+        self.y = 0
+        self.pending = []
+
+    def start_page(self):
+        if self.page:
+            self.pdf.showPage()
+        self.page += 1
+
+        pdf = self.pdf
+        pdf.setFont("Helvetica", 8)
+        pdf.setFillColor(colors.grey)
+        pdf.drawString(MARGIN, MARGIN - 20, self.title)
+        pdf.drawRightString(PAGE_WIDTH - MARGIN, MARGIN - 20, f"Page {self.page}")
+        pdf.setFillColor(colors.black)
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def row(self, values):
+        self.pending.append(values)
+        if len(self.pending) == ROWS_PER_PAGE:
+            self.flush()
+
+    def flush(self):
+        """Draw the buffered rows on a new table page."""
+        self.start_page()
+        pdf = self.pdf
+
+        pdf.setFont("Helvetica-Bold", 8)
+        for heading, offset, width in COLUMNS:
+            if width is None:
+                pdf.drawRightString(MARGIN + offset, self.y, heading)
+            else:
+                pdf.drawString(MARGIN + offset, self.y, heading)
+        pdf.line(MARGIN, self.y - 4, PAGE_WIDTH - MARGIN, self.y - 4)
+        top = self.y - 4 - ROW_HEIGHT
+
+        for index, (_, offset, width) in enumerate(COLUMNS):
+            text = pdf.beginText(MARGIN + offset, top)
+            text.setFont("Helvetica", 8)
+            text.setLeading(ROW_HEIGHT)
+            for line, values in enumerate(self.pending):
+                if width is None:
+                    value = values[index]
+                    text.setTextOrigin(MARGIN + offset - stringWidth(value, "Helvetica", 8), top - line * ROW_HEIGHT)
+                    text.textOut(value)
+                else:
+                    text.textLine(_clip(values[index], width))
+            pdf.drawText(text)
+
+        self.y = top - len(self.pending) * ROW_HEIGHT
+        self.pending = []
+
+    def finish(self, label, total):
+        """Flush the last rows and draw the closing total under them."""
+        if self.pending:
+            self.flush()
+        if self.y < MARGIN:
+            self.start_page()
+            self.y -= ROW_HEIGHT
+
+        pdf = self.pdf
+        pdf.line(MARGIN, self.y + ROW_HEIGHT - 4, PAGE_WIDTH - MARGIN, self.y + ROW_HEIGHT - 4)
+        pdf.setFont("Helvetica-Bold", 8)
+        pdf.drawString(MARGIN, self.y - 2, label)
+        pdf.drawRightString(MARGIN + COLUMNS[-1][1], self.y - 2, total)
+
+
+def statement_rows(user_id, **filters):
+    """Yield ``(date, description, category, account, type, amount)`` in date order."""
+    query = select(
+        Expense.id, Expense.date, Expense.description, Expense.category,
+        Expense.account, Expense.transaction_type, Expense.amount
+    ).where(*aggregates.expense_filters(user_id, **filters))
+
+    for batch in pagination.expense_batches(query, ROWS_PER_FETCH):
+        for row in batch:
+            yield row[1:]
+
+
+def statement_pdf(user_id, output, title="Expense Statement", period="All time", on_progress=None, **filters):
+    """Write a full statement for ``filters`` into ``output``; returns the row count.
+
+    ``filters`` are the aggregate filters (``since``/``before``/``event_id``).
+    ``on_progress(rows)`` is called every ROWS_PER_FETCH rows. Rows are
+    read in bounded batches, but the pages stay in memory until the end.
+    """
+    total_expense, total_income, count = aggregates.type_summary(user_id, **filters)
+
+    pdf = canvas.Canvas(output, pagesize=letter, pageCompression=1)
+    pdf.setTitle(title)
+    writer = StatementWriter(pdf, f"{title} · {period}")
+
+    # ===== SUMMARY PAGE =====
+    writer.start_page()
+    y = writer.y
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawString(MARGIN, y - 10, title)
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(MARGIN, y - 28, period)
+
+    y -= 70
+    for label, value in (
+        ("Total Expense", _money(total_expense)),
+        ("Total Income", _money(total_income)),
+        ("Net Balance", _money(total_income - total_expense)),
+        ("Transactions", f"{count:,}"),
+    ):
+        pdf.setFont("Helvetica", 10)
+        pdf.drawString(MARGIN, y, label)
+        pdf.setFont("Helvetica-Bold", 10)
+        pdf.drawRightString(MARGIN + 220, y, value)
+        y -= 16
+
+    renderPDF.draw(_category_pie(aggregates.category_totals(user_id, **filters)), pdf, MARGIN + 270, y - 60)
+    points, trend_title = _trend(user_id, filters)
+    renderPDF.draw(_trend_bars(points, trend_title), pdf, MARGIN, y - 300)
+
+    # ===== TRANSACTIONS =====
+    rows = 0
+    for day, description, category, account, transaction_type, amount in statement_rows(user_id, **filters):
+        sign = "-" if transaction_type == "expense" else "+"
+        writer.row((
+            day.isoformat() if day else "",
+            description,
+            category or "Uncategorised",
+            account,
+            transaction_type,
+            sign + _money(amount),
+        ))
+        rows += 1
+        if on_progress and rows % ROWS_PER_FETCH == 0:
+            on_progress(rows)
+
+    if not rows:
+        writer.row(("", "No transactions in this period", "", "", "", ""))
+    writer.finish(f"{rows:,} transactions", _money(total_income - total_expense))
+
+    pdf.save()
+    return rows
@@ -0,0 +1,188 @@
+from collections import defaultdict
+from sqlalchemy import func, insert, select, update
+from models import db, Expense, ExpenseRollup
+
+KEY_COLUMNS = ("user_id", "event_id", "category", "date", "transaction_type")
+
+
+# ================= KEYS =================
+def expense_key(expense):
+    event_id = expense.event_id
+    return (
+        int(expense.user_id),
+        int(event_id) if event_id not in (None, "") else None,
+        expense.category,
+        expense.date,
+        expense.transaction_type,
+    )
+
+
+def _amount(expense):
+    return float(expense.amount or 0)
+
+
+# ================= INCREMENTAL UPDATES =================
+def apply(key, amount, count):
+    """Add ``amount``/``count`` to the rollup row for ``key``.
+
+    Runs inside the caller's session so the change commits (or rolls back)
+    together with the expense write that caused it.
+    """
+    row = ExpenseRollup.query.filter_by(**dict(zip(KEY_COLUMNS, key))).first()
+
+    if row is None:
+        if count <= 0:
+            return
+        row = ExpenseRollup(**dict(zip(KEY_COLUMNS, key)), total=0, count=0)
+        db.session.add(row)
+
+    row.total = (row.total or 0) + amount
+    row.count = (row.count or 0) + count
+
+    if row.count <= 0:
+        db.session.delete(row)
+
+
+def add_expense(expense):
+    apply(expense_key(expense), _amount(expense), 1)
+
+
+def remove_expense(expense):
+    apply(expense_key(expense), -_amount(expense), -1)
+
+
+def add_expenses(expenses):
+    """Fold a batch (e.g. a CSV import) into one update per rollup key."""
+    groups = defaultdict(lambda: [0.0, 0])
+
+    for expense in expenses:
+        group = groups[expense_key(expense)]
+        group[0] += _amount(expense)
+        group[1] += 1
+
+    add_totals((key, amount, count) for key, (amount, count) in groups.items())
+
+
+def add_totals(groups):
+    """Apply pre-grouped ``(key, amount, count)`` triples, e.g. from pandas.
+
+    Set-based: one SELECT for the affected rollup rows, then one bulk
+    UPDATE, INSERT and DELETE, instead of a lookup per key.
+    """
+    merged = defaultdict(lambda: [0.0, 0])
+    for key, amount, count in groups:
+        group = merged[key]
+        group[0] += amount
+        group[1] += count
+
+    if not merged:
+        return
+
+    days = [key[3] for key in merged if key[3] is not None]
+    query = ExpenseRollup.query.filter(
+        ExpenseRollup.user_id.in_({key[0] for key in merged})
+    )
+    if days:
+        query = query.filter(
+            ExpenseRollup.date.between(min(days), max(days)) | ExpenseRollup.date.is_(None)
+        )
+
+    existing = {
+        tuple(getattr(row, name) for name in KEY_COLUMNS): row
+        for row in query
+    }
+
+    inserts, updates, deletes = [], [], []
+
+    for key, (amount, count) in merged.items():
+        row = existing.get(key)
+
+        if row is None:
+            if count > 0:
+                inserts.append(dict(zip(KEY_COLUMNS, key), total=amount, count=count))
+        elif row.count + count <= 0:
+            deletes.append(row.id)
+        else:
+            updates.append({"id": row.id, "total": row.total + amount, "count": row.count + count})
+
+    if updates:
+        db.session.execute(update(ExpenseRollup), updates)
+    if inserts:
+        db.session.execute(insert(ExpenseRollup), inserts)
+    if deletes:
+        ExpenseRollup.query.filter(ExpenseRollup.id.in_(deletes)).delete(synchronize_session=False)
+
+
+def remove_event(event_id):
+    ExpenseRollup.query.filter_by(event_id=event_id).delete()
+
+
+# ================= REBUILD / VERIFY =================
+def raw_groups(user_id=None):
+    columns = [getattr(Expense, name) for name in KEY_COLUMNS]
+    query = select(*columns, func.sum(Expense.amount), func.count(Expense.id))
+
+    if user_id is not None:
+        query = query.where(Expense.user_id == user_id)
+
+    return query.group_by(*columns)
+
+
+def rebuild(user_id=None):
+    """Recompute rollups from the raw expense rows. Returns the row count."""
+    delete = ExpenseRollup.query
+    if user_id is not None:
+        delete = delete.filter_by(user_id=user_id)
+    delete.delete()
+
+    db.session.execute(
+        insert(ExpenseRollup).from_select(
+            list(KEY_COLUMNS) + ["total", "count"],
+            raw_groups(user_id)
+        )
+    )
+    db.session.commit()
+
+    query = ExpenseRollup.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    return query.count()
+
+
+def verify(user_id=None, tolerance=0.005):
+    """Compare rollups with the raw rows.
+
+    Returns ``[(key, expected, actual), ...]`` where ``expected`` and
+    ``actual`` are ``(total, count)`` pairs, ``None`` when a side is missing.
+    """
+    expected = {
+        tuple(row[:5]): (row[5], row[6])
+        for row in db.session.execute(raw_groups(user_id))
+    }
+
+    query = db.session.query(
+        *(getattr(ExpenseRollup, name) for name in KEY_COLUMNS),
+        ExpenseRollup.total,
+        ExpenseRollup.count
+    )
+    if user_id is not None:
+        query = query.filter(ExpenseRollup.user_id == user_id)
+
+    actual = defaultdict(lambda: [0.0, 0])
+    for row in query:
+        group = actual[tuple(row[:5])]
+        group[0] += row[5]
+        group[1] += row[6]
+
+    mismatches = []
+    for key in set(expected) | set(actual):
+        want = expected.get(key)
+        got = tuple(actual[key]) if key in actual else None
+
+        if want is None or got is None:
+            mismatches.append((key, want, got))
+        elif want[1] != got[1] or abs(want[0] - got[0]) > tolerance:
+            mismatches.append((key, want, got))
+
+    return mismatches
+
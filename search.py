@@ -0,0 +1,131 @@
+import re
+
+from sqlalchemy import select, text, column, literal_column, table
+from models import Expense, Event
+
+# Full-text search over expenses and events with SQLite FTS5.
+#
+# Both indexes are contentless (content=''): they only hold the posting
+# lists, and triggers on the base tables keep them in step with every
+# write, including the Core bulk inserts used by the CSV importer.
+# Each row also carries an ``owner`` token (``u<user id>``) so a search
+# intersects with the user's rows inside FTS instead of matching every
+# user's expenses and filtering afterwards.
+
+EXPENSE_COLUMNS = ("description", "notes", "tags", "category", "account")
+EVENT_COLUMNS = ("name", "description")
+
+_INDEXES = {
+    "expense_fts": ("expense", "user_id", EXPENSE_COLUMNS),
+    "event_fts": ("event", "created_by", EVENT_COLUMNS),
+}
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+# ================= SCHEMA =================
+def _values(prefix, owner, columns):
+    return ", ".join(
+        [f"{prefix}.id", f"'u' || {prefix}.{owner}"]
+        + [f"{prefix}.{name}" for name in columns]
+    )
+
+
+def _ddl(index, base, owner, columns):
+    names = ", ".join(("owner",) + columns)
+    insert = f"INSERT INTO {index}(rowid, {names}) VALUES ({_values('new', owner, columns)});"
+    delete = (
+        f"INSERT INTO {index}({index}, rowid, {names}) "
+        f"VALUES ('delete', {_values('old', owner, columns)});"
+    )
+
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5({names}, content='')",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ai AFTER INSERT ON {base} BEGIN {insert} END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_ad AFTER DELETE ON {base} BEGIN {delete} END",
+        f"CREATE TRIGGER IF NOT EXISTS {index}_au AFTER UPDATE ON {base} BEGIN {delete} {insert} END",
+    ]
+
+
+def install(conn):
+    """Create the FTS tables and their sync triggers (idempotent)."""
+    for index, (base, owner, columns) in _INDEXES.items():
+        for statement in _ddl(index, base, owner, columns):
+            conn.execute(text(statement))
+
+
+def rebuild(conn):
+    """Repopulate both indexes from the base tables."""
+    for index, (base, owner, columns) in _INDEXES.items():
+        names = ", ".join(("owner",) + columns)
+        select_values = ", ".join(
+            ["id", f"'u' || {owner}"] + list(columns)
+        )
+        conn.execute(text(f"INSERT INTO {index}({index}) VALUES ('delete-all')"))
+        conn.execute(text(
+            f"INSERT INTO {index}(rowid, {names}) SELECT {select_values} FROM {base}"
+        ))
+
+
+# ================= QUERIES =================
+def match_expression(user_id, search_query, columns):
+    """``"swig din"`` -> ``owner : "u1" AND {cols} : ("swig"* AND "din"*)``.
+
+    Every word becomes a quoted prefix term, so user input can never be
+    read as FTS syntax. Returns None when the query has no words.
+    """
+    terms = _TERM.findall((search_query or "").lower())
+    if not terms:
+        return None
+
+    words = " AND ".join(f'"{term}"*' for term in terms)
+    return f'owner : "u{user_id}" AND {{{" ".join(columns)}}} : ({words})'
+
+
+def _ranked(index, expression):
+    fts = table(index, column("rowid"))
+    return select(
+        literal_column("rowid").label("id"),
+        literal_column(f"bm25({index})").label("rank")
+    ).select_from(fts).where(literal_column(index).op("MATCH")(expression))
+
+
+def expense_matches(user_id, search_query):
+    """Subquery of ``(id, rank)`` for the user's matching expenses; lower rank is better."""
+    expression = match_expression(user_id, search_query, EXPENSE_COLUMNS)
+    if expression is None:
+        return None
+    return _ranked("expense_fts", expression).subquery("expense_match")
+
+
+def event_matches(user_id, search_query):
+    expression = match_expression(user_id, search_query, EVENT_COLUMNS)
+    if expression is None:
+        return None
+    return _ranked("event_fts", expression).subquery("event_match")
+
+
+def expense_filter(user_id, search_query):
+    """Criterion restricting Expense to full-text matches."""
+    matches = expense_matches(user_id, search_query)
+    if matches is None:
+        return Expense.id.is_(None)
+    return Expense.id.in_(select(matches.c.id))
+
+
+def ranked_events(query, user_id, search_query):
+    """Restrict an Event query to matches, best match first."""
+    matches = event_matches(user_id, search_query)
+    if matches is None:
+        return query.filter(Event.id.is_(None))
+    return query.join(matches, matches.c.id == Event.id)\
+        .order_by(matches.c.rank, Event.id.desc())
+
+
+def ranked_expenses(query, user_id, search_query):
+    """Restrict an Expense query to matches, best match first."""
+    matches = expense_matches(user_id, search_query)
+    if matches is None:
+        return query.filter(Expense.id.is_(None))
+    return query.join(matches, matches.c.id == Expense.id)\
+        .order_by(matches.c.rank, Expense.id.desc())
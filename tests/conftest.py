@@ -0,0 +1,76 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+from flask.testing import FlaskClient
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# app.py builds the app (and migrates its database) at import time, so the
+# throwaway database and inline jobs have to be chosen before that.
+TMP = tempfile.mkdtemp(prefix="expense-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TMP, 'test.db')}"
+os.environ["JOB_WORKERS"] = "0"
+
+import app as application  # noqa: E402
+from models import db, User  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+application.app.config.update(
+    TESTING=True,
+    JOB_FOLDER=os.path.join(TMP, "jobs"),
+    RECEIPT_FOLDER=os.path.join(TMP, "receipts"),
+    CATEGORY_MODEL_FOLDER=os.path.join(TMP, "category_models"),
+)
+os.makedirs(application.app.config["JOB_FOLDER"], exist_ok=True)
+os.makedirs(application.app.config["RECEIPT_FOLDER"], exist_ok=True)
+
+_emails = itertools.count(1)
+
+
+class Client(FlaskClient):
+    """Runs every request in its own app context, hence its own session.
+
+    Otherwise requests reuse the test's context and session, and see the
+    test's already-loaded objects instead of what jobs have committed.
+    """
+
+    def open(self, *args, **kwargs):
+        with self.application.app_context():
+            return super().open(*args, **kwargs)
+
+
+application.app.test_client_class = Client
+
+
+@pytest.fixture
+def app():
+    with application.app.app_context():
+        yield application.app
+        db.session.remove()
+
+
+@pytest.fixture
+def user(app):
+    """A fresh user per test, so tests share the database but not data."""
+    user = User(
+        username="tester",
+        email=f"tester{next(_emails)}@example.com",
+        password=generate_password_hash("secret")
+    )
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def client(app, user):
+    """A test client logged in as ``user``."""
+    client = app.test_client()
+    response = client.post("/login", data={"email": user.email, "password": "secret"})
+    assert response.status_code == 302
+    return client
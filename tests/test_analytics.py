@@ -0,0 +1,262 @@
+from collections import defaultdict
+from datetime import date
+
+import pytest
+
+import aggregates
+import analytics
+import rollups
+from models import db, Budget, BudgetMonth, Event, Expense
+
+
+# (category, description, amount, date, transaction_type, in the event?)
+ROWS = [
+    ("Food", "swiggy lunch", 300, date(2026, 8, 3), "expense", False),
+    ("Food", "coffee beans", 200, date(2026, 9, 1), "expense", False),
+    ("Transport", "uber ride", 150, date(2026, 9, 1), "expense", False),
+    ("Bills", "electricity", 850, date(2026, 9, 2), "expense", False),
+    ("Salary", "salary", 1000, date(2026, 9, 1), "income", False),
+    ("Food", "team dinner", 400, date(2026, 9, 5), "expense", True),
+    ("Shopping", "decorations", 100, date(2026, 9, 6), "expense", True),
+    ("Refund", "deposit back", 50, date(2026, 9, 6), "income", True),
+]
+
+
+@pytest.fixture
+def seeded(user):
+    event = Event(name="Trip", budget_limit=450, created_by=user.id)
+    db.session.add(event)
+    db.session.flush()
+
+    expenses = [
+        Expense(
+            user_id=user.id, event_id=event.id if in_event else None, amount=amount,
+            category=category, description=description, date=day,
+            transaction_type=transaction_type, account="Cash"
+        )
+        for category, description, amount, day, transaction_type, in_event in ROWS
+    ]
+    db.session.add_all(expenses)
+    db.session.commit()
+    rollups.rebuild(user.id)
+    return event, expenses
+
+
+# ================= BASELINE =================
+# The per-view loops that analytics.py replaced, kept here as the reference.
+
+def baseline_totals(expenses):
+    total_expense = sum(e.amount for e in expenses if e.transaction_type == "expense")
+    total_income = sum(e.amount for e in expenses if e.transaction_type == "income")
+    category_totals = defaultdict(float)
+    trend_data = defaultdict(float)
+    for e in sorted(expenses, key=lambda e: e.date):
+        if e.transaction_type == "expense":
+            category_totals[e.category] += e.amount
+            if e.date:
+                trend_data[e.date] += e.amount
+    return total_expense, total_income, dict(category_totals), dict(trend_data)
+
+
+def baseline_spike(trend_data):
+    values = list(trend_data.values())
+    return len(values) >= 2 and values[-1] > (sum(values[:-1]) / max(len(values[:-1]), 1)) * 1.5
+
+
+def baseline_dashboard(expenses, monthly_limit):
+    total_expense, total_income, category_totals, trend_data = baseline_totals(expenses)
+    budget_percentage = (total_expense / monthly_limit) * 100 if monthly_limit > 0 else 0
+    highest_category = max(category_totals, key=category_totals.get) if category_totals else None
+    highest_category_amount = category_totals.get(highest_category, 0)
+
+    insight = "Your finances are stable."
+    if monthly_limit > 0:
+        if budget_percentage > 100:
+            insight = "⚠️ You exceeded your monthly budget."
+        elif budget_percentage > 80:
+            insight = "⚠️ You are close to your budget limit."
+        elif budget_percentage < 50:
+            insight = "✅ Spending is well under control."
+        if total_income > total_expense:
+            insight += " You are saving money."
+    elif total_expense > total_income:
+        insight = "Expenses are higher than income."
+
+    health = 100
+    if budget_percentage > 100:
+        health -= 30
+    elif budget_percentage > 80:
+        health -= 15
+    if total_income > 0:
+        ratio = total_expense / total_income
+        if ratio > 1:
+            health -= 25
+        elif ratio > 0.8:
+            health -= 10
+    if baseline_spike(trend_data):
+        health -= 10
+
+    tips = []
+    if budget_percentage > 100:
+        tips.append("You exceeded your monthly budget. Reduce non-essential spending.")
+    elif budget_percentage > 80:
+        tips.append("You are close to your budget limit. Be cautious with new expenses.")
+    if highest_category and highest_category_amount > total_expense * 0.4:
+        tips.append(f"Your highest spending is on {highest_category}. Consider reducing it.")
+    if total_income > 0 and total_expense > total_income:
+        tips.append("Your expenses exceed your income. This is financially risky.")
+    if not tips:
+        tips.append("Your finances look healthy. Keep it up.")
+
+    return {
+        "total_expense": total_expense,
+        "total_income": total_income,
+        "transactions": len(expenses),
+        "category_totals": category_totals,
+        "daily_totals": trend_data,
+        "highest_category": highest_category,
+        "highest_day": max(trend_data, key=trend_data.get) if trend_data else None,
+        "average_daily_expense": round(sum(trend_data.values()) / len(trend_data), 2) if trend_data else 0,
+        "spending_spike": baseline_spike(trend_data),
+        "insight": insight,
+        "health_score": max(0, round(health, 2)),
+        "recommendations": tips,
+    }
+
+
+def baseline_event(expenses, budget):
+    total_spent, _, category_totals, _ = baseline_totals(expenses)
+    budget_percentage = round((total_spent / budget) * 100, 2) if budget > 0 else 0
+    overspent = total_spent > budget if budget > 0 else False
+    highest_category = max(category_totals, key=category_totals.get) if category_totals else None
+    highest_category_amount = category_totals.get(highest_category, 0)
+    total_transactions = len(expenses)
+
+    summary = "This event is within budget."
+    if overspent:
+        summary = "This event exceeded its budget."
+    elif budget_percentage > 80:
+        summary = "This event is close to its budget limit."
+    if highest_category:
+        summary += f" Most spending was on {highest_category}."
+
+    performance = 100
+    if budget_percentage > 100:
+        performance -= 40
+    elif budget_percentage > 90:
+        performance -= 25
+    elif budget_percentage > 75:
+        performance -= 15
+    if highest_category_amount > total_spent * 0.5:
+        performance -= 10
+    if total_transactions < 3:
+        performance -= 5
+
+    health = 100
+    if budget > 0:
+        if budget_percentage > 100:
+            health -= 30
+        elif budget_percentage > 80:
+            health -= 15
+    if (total_spent / total_transactions if total_transactions else 0) > 5000:
+        health -= 10
+
+    tips = []
+    if overspent:
+        tips.append("Event exceeded budget. Reduce future spending.")
+    elif budget_percentage > 80:
+        tips.append("Event is close to budget limit.")
+    if highest_category and highest_category_amount > total_spent * 0.4:
+        tips.append(f"Most spending is on {highest_category}.")
+    if not tips:
+        tips.append("Event spending is well managed.")
+
+    return {
+        "insight": summary,
+        "performance_score": max(0, performance),
+        "health_score": max(0, round(health, 2)),
+        "recommendations": tips,
+    }
+
+
+def assert_summary_matches(summary, expected):
+    for name in ("total_expense", "total_income", "transactions", "category_totals", "daily_totals",
+                 "highest_category", "highest_day", "average_daily_expense", "spending_spike"):
+        assert getattr(summary, name) == expected[name], name
+
+
+# ================= TESTS =================
+def test_dashboard_summary_and_assessment_match_baseline(user, seeded):
+    _, expenses = seeded
+    expected = baseline_dashboard(expenses, 1500)
+
+    summary = analytics.summarize(user.id)
+    assert_summary_matches(summary, expected)
+    assert summary.total_expense == 2000
+    assert summary.highest_category == "Food"
+
+    assessment = analytics.assess_personal(summary, 1500)
+    assert assessment.insight == expected["insight"]
+    assert assessment.health_score == expected["health_score"] == 45
+    assert assessment.health_label == "Moderate"
+    assert assessment.recommendations == expected["recommendations"]
+
+
+def test_search_summary_reads_raw_rows(user, seeded):
+    _, expenses = seeded
+    matching = [e for e in expenses if "coffee" in e.description]
+
+    summary = analytics.summarize(user.id, aggregates.search_filter(user.id, "coffee"))
+
+    assert_summary_matches(summary, baseline_dashboard(matching, 0))
+
+
+def test_event_summary_and_assessment_match_baseline(user, seeded):
+    event, expenses = seeded
+    in_event = [e for e in expenses if e.event_id == event.id]
+    expected = baseline_event(in_event, event.budget_limit)
+
+    summary = analytics.summarize(user.id, event_id=event.id)
+    assert (summary.total_expense, summary.total_income, summary.transactions) == (500, 50, 3)
+
+    assessment = analytics.assess_event(summary, event.budget_limit)
+    assert assessment.insight == expected["insight"]
+    assert assessment.performance_score == expected["performance_score"] == 50
+    assert assessment.health_score == expected["health_score"] == 70
+    assert assessment.recommendations == expected["recommendations"]
+
+
+def test_budget_path_matches_baseline(user, seeded):
+    _, expenses = seeded
+    personal = [e for e in expenses if e.event_id is None and e.transaction_type == "expense"]
+    total_spent, _, category_totals, _ = baseline_totals(personal)
+
+    summary = analytics.summarize(user.id, event_id=None)
+    assert summary.total_expense == total_spent == 1500
+    assert dict(summary.category_totals) == category_totals
+
+    usage = summary.budget_percentage(1800)
+    assert usage == pytest.approx(total_spent / 1800 * 100)
+    assert analytics.budget_insight(usage) == ("⚠️ You are close to your budget limit", True)
+    assert analytics.budget_insight(50) == ("Budget healthy", False)
+    assert analytics.budget_insight(95) == ("⚠️ You are about to exceed your budget", True)
+
+
+def test_budget_history_uses_each_months_limit(user, seeded):
+    budget = Budget(user_id=user.id, monthly_limit=1000, budget_type="personal")
+    db.session.add(budget)
+    db.session.flush()
+    db.session.add_all([
+        BudgetMonth(budget_id=budget.id, month=date(2026, 8, 1), monthly_limit=250),
+        BudgetMonth(budget_id=budget.id, month=date(2026, 9, 1), monthly_limit=1000),
+    ])
+    db.session.commit()
+
+    months = [date(2026, 7, 1), date(2026, 8, 1), date(2026, 9, 1)]
+    history = analytics.budget_history(user.id, budget, months, event_id=None, transaction_type="expense")
+
+    assert [(row["budget"], row["spent"], row["status"]) for row in history] == [
+        (250, 0, "Healthy"),
+        (250, 300, "Exceeded"),
+        (1000, 1200, "Exceeded"),
+    ]
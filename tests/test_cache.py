@@ -0,0 +1,52 @@
+from datetime import date
+
+import anomalies
+import forecasting
+from models import db, Expense, ForecastState, User
+
+
+def add_expense(client, amount, day="2026-09-01"):
+    response = client.post("/add_expense", data={
+        "amount": str(amount), "description": "coffee", "date": day, "transaction_type": "expense",
+    })
+    assert response.status_code == 302
+
+
+def test_writes_invalidate_cached_pages(client):
+    add_expense(client, 50)
+    first = client.get("/dashboard")
+    assert first.headers["X-Cache"] == "miss"
+    assert client.get("/dashboard").headers["X-Cache"] == "hit"
+
+    add_expense(client, 60)
+    assert client.get("/dashboard", headers={"If-None-Match": first.headers["ETag"]}).status_code == 200
+
+
+def test_insight_jobs_invalidate_cached_pages(client, user):
+    add_expense(client, 50)  # JOB_WORKERS=0: its insight refreshes ran inline
+    first = client.get("/dashboard")
+    assert client.get("/dashboard", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    # A row the anomaly job hasn't scored yet, written without a bump.
+    db.session.add(Expense(
+        user_id=user.id, amount=70, category="Food", description="lunch",
+        date=date(2026, 9, 2), transaction_type="expense", account="Cash"
+    ))
+    db.session.commit()
+    anomalies.update(user.id)
+
+    again = client.get("/dashboard", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 200
+    assert again.headers["X-Cache"] == "miss"
+
+
+def test_forecast_refresh_does_not_mark_itself_stale(client, user):
+    add_expense(client, 50)
+    before = db.session.get(User, user.id).insights_version
+
+    forecasting.update(user.id)
+
+    db.session.expire_all()
+    current = db.session.get(User, user.id)
+    assert current.insights_version > before
+    assert ForecastState.query.filter_by(user_id=user.id).one().data_version == current.data_version
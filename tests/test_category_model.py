@@ -0,0 +1,42 @@
+from datetime import date
+
+import categories
+import category_model
+from models import db, CategoryRule, Expense
+
+
+def seed_history(user, rows):
+    db.session.add_all(
+        Expense(
+            user_id=user.id, amount=100, category=category, description=description,
+            date=date(2026, 9, 1), transaction_type="expense", account="Cash"
+        )
+        for description, category in rows
+    )
+    db.session.commit()
+
+
+def test_user_rules_beat_a_confident_model(user):
+    seed_history(user, [("starbucks latte", "Food")] * 20 + [("metro card top up", "Transport")] * 20)
+    assert category_model.train(user.id)
+    assert category_model.classify(user.id, "starbucks latte") == "Food"
+
+    db.session.add(CategoryRule(user_id=user.id, keyword="starbucks", category="Coffee"))
+    db.session.commit()
+
+    assert category_model.classify_many(user.id, ["Starbucks latte", "metro card top up", "netflix"]) == [
+        "Coffee", "Transport", "Entertainment"
+    ]
+
+
+def test_replacing_a_rule_changes_the_classifier(client, user):
+    client.post("/category_rules", data={"keyword": "starbucks", "category": "Coffee"})
+    assert categories.detect_category("starbucks latte", user.id) == "Coffee"
+
+    rule = CategoryRule.query.filter_by(user_id=user.id, keyword="starbucks").one()
+    client.get(f"/category_rules/{rule.id}/delete")
+    client.post("/category_rules", data={"keyword": "starbucks", "category": "Treats"})
+
+    # SQLite gives the new rule the freed id, so count and max id are unchanged.
+    assert CategoryRule.query.filter_by(user_id=user.id).one().id == rule.id
+    assert categories.detect_category("starbucks latte", user.id) == "Treats"
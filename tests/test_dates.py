@@ -0,0 +1,36 @@
+from datetime import date
+
+from dates import MAX_HISTORY_MONTHS, add_months, month_bounds, month_range, month_start
+
+TODAY = date(2026, 10, 17)
+
+
+def test_month_range_defaults_to_the_last_twelve_months():
+    months = month_range({}, today=TODAY)
+    assert (len(months), months[0], months[-1]) == (12, date(2025, 11, 1), date(2026, 10, 1))
+
+
+def test_month_range_reads_and_orders_the_query_span():
+    months = month_range({"history_start": "2026-03", "history_end": "2026-01"}, today=TODAY)
+    assert months == [date(2026, 1, 1), date(2026, 2, 1), date(2026, 3, 1)]
+
+
+def test_month_range_keeps_the_latest_months_of_a_huge_span():
+    months = month_range({"history_start": "0001-01", "history_end": "2026-10"}, today=TODAY)
+    assert len(months) == MAX_HISTORY_MONTHS
+    assert (months[0], months[-1]) == (date(2016, 11, 1), date(2026, 10, 1))
+
+
+def test_last_representable_month_is_unreadable_not_an_error():
+    assert month_bounds("9999-12") is None
+    assert month_bounds("9999-11") == (date(9999, 11, 1), date(9999, 12, 1))
+
+
+def test_budget_page_caps_the_history(client):
+    response = client.get("/set_budget?history_start=0001-01&history_end=9999-12")
+
+    # The unreadable end falls back to this month; the start is clamped.
+    first = add_months(month_start(), 1 - MAX_HISTORY_MONTHS).strftime("%Y-%m")
+    assert response.status_code == 200
+    assert f'name="history_start" value="{first}"'.encode() in response.data
+    assert f'name="history_end" value="{month_start():%Y-%m}"'.encode() in response.data
@@ -0,0 +1,120 @@
+import io
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import dedup
+import importer
+from models import db, CsvImport, Expense, ImportDigest
+
+
+def csv_bytes(*lines):
+    return ("date,description,amount\n" + "".join(line + "\n" for line in lines)).encode()
+
+
+def fingerprints(user):
+    return sorted(e.fingerprint.split(":")[1] for e in Expense.query.filter_by(user_id=user.id))
+
+
+class Interrupt(Exception):
+    pass
+
+
+def test_resumed_import_keeps_numbering_repeats(user):
+    data = csv_bytes(*["2026-09-01,coffee,50"] * 4)
+
+    def fail_after_first_chunk(rows_read):
+        raise Interrupt
+
+    with pytest.raises(Interrupt):
+        importer.stream_import(io.BytesIO(data), user.id, chunk_rows=2, on_chunk=fail_after_first_chunk)
+    assert Expense.query.filter_by(user_id=user.id).count() == 2
+
+    result = importer.stream_import(io.BytesIO(data), user.id, chunk_rows=2)
+
+    assert result.resumed_from == 2
+    assert result.inserted == 4
+    assert result.duplicates == 0
+    assert fingerprints(user) == ["0", "1", "2", "3"]
+    assert ImportDigest.query.count() == 0  # dropped once the import is done
+
+
+def test_double_submit_is_refused_while_the_first_runs(user):
+    data = csv_bytes(*["2026-09-01,coffee,50"] * 4)
+    refused = []
+
+    def submit_again(rows_read):
+        if not refused:
+            with pytest.raises(ValueError, match="already being imported"):
+                importer.stream_import(io.BytesIO(data), user.id, chunk_rows=2)
+            refused.append(rows_read)
+
+    result = importer.stream_import(io.BytesIO(data), user.id, chunk_rows=2, on_chunk=submit_again)
+
+    assert refused == [2]
+    assert result.inserted == 4
+    assert fingerprints(user) == ["0", "1", "2", "3"]
+
+
+def test_import_left_running_by_a_dead_worker_is_taken_over(user):
+    data = csv_bytes(*["2026-09-01,coffee,50"] * 4)
+
+    def fail_after_first_chunk(rows_read):
+        raise Interrupt
+
+    with pytest.raises(Interrupt):
+        importer.stream_import(io.BytesIO(data), user.id, chunk_rows=2, on_chunk=fail_after_first_chunk)
+    # As if the process died mid-import: still "running", not touched since.
+    CsvImport.query.filter_by(user_id=user.id).update(
+        {"status": "running", "updated_at": datetime.utcnow() - timedelta(hours=2)}
+    )
+    db.session.commit()
+
+    result = importer.stream_import(io.BytesIO(data), user.id, chunk_rows=2)
+
+    assert result.resumed_from == 2
+    assert fingerprints(user) == ["0", "1", "2", "3"]
+
+
+def test_overlapping_statement_skips_only_rows_already_there(user):
+    importer.stream_import(io.BytesIO(csv_bytes(*["2026-09-01,coffee,50"] * 2)), user.id)
+
+    result = importer.stream_import(
+        io.BytesIO(csv_bytes(*["2026-09-01,coffee,50"] * 3, "2026-09-02,bus,20")), user.id, chunk_rows=1
+    )
+
+    assert result.inserted == 2
+    assert result.duplicates == 2
+    assert Expense.query.filter_by(user_id=user.id).count() == 4
+
+
+def test_concurrent_identical_rows_get_distinct_ordinals(app, user):
+    row = (date(2026, 9, 1), 50.0, "coffee", "Cash")
+    first_has_lock = threading.Event()
+    taken = []
+
+    def add(hold):
+        with app.app_context():
+            fingerprint = dedup.new_fingerprints(user.id, [row])[0]
+            if hold:
+                first_has_lock.set()
+                # The other thread has to wait for this commit, not race it.
+                threading.Event().wait(0.3)
+            db.session.add(Expense(
+                user_id=user.id, amount=row[1], category="Food", description=row[2],
+                date=row[0], transaction_type="expense", account=row[3], fingerprint=fingerprint
+            ))
+            db.session.commit()
+            taken.append(fingerprint)
+
+    first = threading.Thread(target=add, args=(True,))
+    first.start()
+    first_has_lock.wait(5)
+    second = threading.Thread(target=add, args=(False,))
+    second.start()
+    first.join()
+    second.join()
+
+    assert sorted(value.split(":")[1] for value in taken) == ["0", "1"]
+    assert fingerprints(user) == ["0", "1"]
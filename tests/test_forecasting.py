@@ -0,0 +1,61 @@
+from datetime import date, timedelta
+
+import forecasting
+import rollups
+from models import db, Expense, ForecastState, Job
+
+
+def add_expenses(user, days, amount=40):
+    db.session.add_all(
+        Expense(
+            user_id=user.id, amount=amount, category="Food", description="lunch",
+            date=day, transaction_type="expense", account="Cash"
+        )
+        for day in days
+    )
+    db.session.commit()
+    rollups.rebuild(user.id)
+
+
+def forecast_jobs(user):
+    return Job.query.filter_by(user_id=user.id, kind="update_forecast").count()
+
+
+def test_fits_complete_days_only(user):
+    today = date.today()
+    add_expenses(user, [today - timedelta(days=n) for n in range(40, -1, -1)])
+
+    assert forecasting.update(user.id) == "fitted 40 days"
+    assert ForecastState.query.filter_by(user_id=user.id).one().fitted_through == today - timedelta(days=1)
+
+    # More spending today is not folded in, and doesn't force a refit.
+    add_expenses(user, [today], amount=500)
+    assert forecasting.update(user.id) == "up to date"
+
+
+def test_extends_over_quiet_days(user):
+    today = date.today()
+    add_expenses(user, [today - timedelta(days=n) for n in range(40, 5, -1)])
+    assert forecasting.update(user.id) == "fitted 40 days"
+
+    # As if the last job ran four days ago; nothing was spent since.
+    row = ForecastState.query.filter_by(user_id=user.id).one()
+    row.fitted_through = today - timedelta(days=4)
+    db.session.commit()
+    assert forecasting.update(user.id) == "extended by 3 days"
+
+
+def test_only_expense_writes_refresh_the_forecast(client, user):
+    client.get("/dashboard")
+    forecasting.update(user.id)
+    before = forecast_jobs(user)
+
+    client.post("/set_budget", data={"limit": "5000"})
+    client.get("/dashboard")
+    assert forecast_jobs(user) == before
+
+    client.post("/add_expense", data={
+        "amount": "50", "description": "coffee", "date": date.today().isoformat(),
+        "transaction_type": "expense",
+    })
+    assert forecast_jobs(user) == before + 1
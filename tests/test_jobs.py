@@ -0,0 +1,82 @@
+import os
+from datetime import datetime, timedelta
+
+import jobs
+from models import db, Job
+
+
+def running_job(user, started_minutes_ago, kind="rebuild_rollups", **payload):
+    job = Job(
+        user_id=user.id, kind=kind, status="running", payload=jobs._encode(payload),
+        started_at=datetime.now() - timedelta(minutes=started_minutes_ago)
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def test_startup_fails_jobs_left_running_by_a_dead_worker(app, user):
+    upload = jobs.job_path(".csv")
+    open(upload, "w").close()
+    lost = running_job(user, 120, kind="import_csv", path=upload)
+    live = running_job(user, 1)
+
+    assert jobs.fail_stale() == 1
+
+    db.session.expire_all()
+    assert lost.status == "failed" and lost.finished_at is not None
+    assert live.status == "running"
+    assert not os.path.exists(upload)
+
+
+def test_status_page_stops_refreshing_stale_and_finished_jobs(client, user):
+    live = running_job(user, 1)
+    lost = running_job(user, 120)
+
+    assert b"location.reload" in client.get(f"/jobs/{live.id}/status").data
+    assert b"location.reload" not in client.get(f"/jobs/{lost.id}/status").data
+    assert client.get(f"/jobs/{lost.id}").json["stale"] is True
+
+    live.status = "done"
+    db.session.commit()
+    assert b"location.reload" not in client.get(f"/jobs/{live.id}/status").data
+
+
+def finished_pdf(user, finished_hours_ago=0, **payload):
+    path = jobs.job_path(".pdf")
+    open(path, "wb").close()
+    job = Job(
+        user_id=user.id, kind="dashboard_pdf", status="done", payload=jobs._encode(payload),
+        result_path=path, finished_at=datetime.now() - timedelta(hours=finished_hours_ago)
+    )
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def test_newer_statement_replaces_the_older_versions_file(app, user):
+    older = finished_pdf(user, version=1, period="All time")
+    other_range = finished_pdf(user, version=1, period="September 2026", since="2026-09-01")
+    expired = finished_pdf(user, finished_hours_ago=48, version=1, period="August 2026")
+    paths = [older.result_path, other_range.result_path, expired.result_path]
+
+    newer = jobs.enqueue_cached("dashboard_pdf", user.id, version=2, period="All time")
+
+    db.session.expire_all()
+    newer = db.session.get(Job, newer.id)
+    assert newer.status == "done" and os.path.exists(newer.result_path)
+    assert [os.path.exists(path) for path in paths] == [False, True, False]
+    assert older.result_path is None and expired.result_path is None
+    assert other_range.result_path == paths[1]
+
+
+def test_startup_sweep_removes_expired_files(app, user):
+    expired = finished_pdf(user, finished_hours_ago=48, version=1)
+    recent = finished_pdf(user, version=1, period="September 2026")
+    path = expired.result_path
+
+    jobs.prune_expired()
+
+    db.session.expire_all()
+    assert not os.path.exists(path) and expired.result_path is None
+    assert os.path.exists(recent.result_path)
@@ -0,0 +1,26 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import metrics
+from models import db
+
+
+def test_failed_statement_leaves_no_start_time_behind(app):
+    with db.engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+
+        assert conn.info["statement_started"] == []
+
+
+def test_unhandled_errors_are_counted_as_500(client, monkeypatch):
+    def broken():
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(metrics, "render", broken)
+    with pytest.raises(RuntimeError):
+        client.get("/metrics")
+
+    assert metrics._stats[("prometheus_metrics", "GET")].responses.get(500) == 1
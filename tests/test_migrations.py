@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+from sqlalchemy import create_engine, inspect, text
+
+from conftest import ROOT, TMP
+from models import db
+import migrations
+
+BASELINE_TABLES = ("user", "event", "expense", "budget")
+
+
+def make_baseline(path):
+    """A database shaped like the old bare db.create_all() left it (version 1)."""
+    engine = create_engine(f"sqlite:///{path}")
+    db.metadata.create_all(engine, tables=[db.metadata.tables[name] for name in BASELINE_TABLES])
+
+    with engine.begin() as conn:
+        for name in BASELINE_TABLES:
+            for index in inspect(conn).get_indexes(name):
+                conn.execute(text(f'DROP INDEX "{index["name"]}"'))
+        conn.execute(text('ALTER TABLE "user" DROP COLUMN data_version'))
+        conn.execute(text('ALTER TABLE "user" DROP COLUMN insights_version'))
+        conn.execute(text("ALTER TABLE expense DROP COLUMN fingerprint"))
+    engine.dispose()
+
+
+def test_concurrent_startup_migrates_once(app):
+    path = os.path.join(TMP, "baseline.db")
+    make_baseline(path)
+
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", JOB_WORKERS="0")
+    workers = [
+        subprocess.Popen([sys.executable, "-c", "import app"], cwd=ROOT, env=env, stderr=subprocess.PIPE)
+        for _ in range(4)
+    ]
+    errors = [worker.communicate()[1].decode() for worker in workers]
+
+    assert [worker.returncode for worker in workers] == [0] * 4, "\n".join(errors)
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT version FROM schema_version")).scalar() == migrations.LATEST_VERSION
+        assert "data_version" in {column["name"] for column in inspect(conn).get_columns("user")}
+    engine.dispose()
@@ -0,0 +1,73 @@
+from datetime import date, timedelta
+
+import cache
+import forecasting
+import rollups
+from models import db, Budget, Event, Expense
+
+CATEGORIES = ["Food", "Transport", "Bills", "Shopping"]
+PAGES = [
+    "/dashboard",
+    "/expenses",
+    "/events",
+    "/event/{event_id}",
+    "/set_budget",
+    "/set_budget?mode=event&event_id={event_id}",
+]
+
+
+def seed(user, expenses, events=0, event=None):
+    """Add ``expenses`` expenses (every other one in an event) and ``events`` events."""
+    added = [Event(name=f"Event {n}", budget_limit=1000, created_by=user.id) for n in range(events)]
+    db.session.add_all(added)
+    db.session.flush()
+    pool = ([event] if event else []) + added
+
+    start = date(2026, 9, 1)
+    db.session.add_all(
+        Expense(
+            user_id=user.id,
+            event_id=pool[n % len(pool)].id if n % 2 else None,
+            amount=10 + n,
+            category=CATEGORIES[n % len(CATEGORIES)],
+            description=f"purchase {n}",
+            date=start - timedelta(days=n),
+            transaction_type="income" if n % 7 == 6 else "expense",
+            account="Cash",
+            receipt=f"receipt-{n}.png" if n % 3 == 0 else None,
+        )
+        for n in range(expenses)
+    )
+    cache.bump(user.id)
+    db.session.commit()
+    rollups.rebuild(user.id)
+    return pool[0]
+
+
+def statement_counts(client, event_id):
+    counts = {}
+    for page in PAGES:
+        path = page.format(event_id=event_id)
+        # Over its budget a view raises QueryBudgetExceeded under TESTING.
+        response = client.get(path)
+        assert response.status_code == 200, path
+        counts[path] = int(response.headers["X-Query-Count"])
+    return counts
+
+
+def test_page_statements_do_not_grow_with_rows(client, user):
+    event = seed(user, expenses=2, events=1)
+    db.session.add_all([
+        Budget(user_id=user.id, monthly_limit=5000, budget_type="personal"),
+        Budget(user_id=user.id, event_id=event.id, monthly_limit=800, budget_type="event"),
+    ])
+    db.session.commit()
+    # Both passes read a fresh forecast; a stale one adds the job enqueue.
+    forecasting.update(user.id)
+    few = statement_counts(client, event.id)
+
+    seed(user, expenses=120, events=12, event=event)
+    many = statement_counts(client, event.id)
+
+    assert Expense.query.filter_by(event_id=event.id).count() > 5
+    assert many == few